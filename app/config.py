@@ -30,4 +30,33 @@ if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
 # Buyurtmalar limiti (bitta mijoz uchun kutilayotgan buyurtmalar soni)
-MAX_USER_PENDING_ORDERS = 3 # Masalan 3 tagacha kutilayotgan buyurtma bo'lishi mumkin
\ No newline at end of file
+MAX_USER_PENDING_ORDERS = 3 # Masalan 3 tagacha kutilayotgan buyurtma bo'lishi mumkin
+
+# Xabarnomalar outbox dispetcheri
+# OUTBOX_DISPATCHER_ENABLED=0 bo'lsa, API ichida ishlamaydi (alohida worker: python -m app.utils.outbox)
+OUTBOX_DISPATCHER_ENABLED = os.getenv("OUTBOX_DISPATCHER_ENABLED", "1") == "1"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))  # soniya
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))  # Yuborilgan yozuvlar shuncha kun saqlanadi
+
+# Idempotency-Key (qayta yuborilgan so'rovlar uchun saqlangan javoblar)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+# Hisobotlar (finance/stats, kuryer va user statistikasi) uchun versiyali javob keshi
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "512"))
+
+# /finance/series/ bitta javobdagi bo'laklar soni chegarasi (kunlik - ~1 yil)
+FINANCE_SERIES_MAX_BUCKETS = int(os.getenv("FINANCE_SERIES_MAX_BUCKETS", "366"))
+
+# telegram_id -> kuryer/foydalanuvchi kesh (bot so'rovlarida bazaga qayta murojaat qilmaslik uchun)
+IDENTITY_CACHE_TTL_SECONDS = int(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "300"))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "10000"))
+
+# Foydalanuvchilar statistikasi user_counters jadvalidan o'qiladi (0 - har safar COUNT ... FILTER)
+USER_COUNTERS_ENABLED = os.getenv("USER_COUNTERS_ENABLED", "1") == "1"
+
+# Ombor qoldig'i nusxalari (inventory_snapshots) orasidagi interval
+INVENTORY_SNAPSHOT_INTERVAL_HOURS = float(os.getenv("INVENTORY_SNAPSHOT_INTERVAL_HOURS", "24"))
+INVENTORY_SNAPSHOTS_ENABLED = os.getenv("INVENTORY_SNAPSHOTS_ENABLED", "1") == "1"
@@ -2,10 +2,18 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import text # <--- Muhim import
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import os
 
-from app.database import engine, Base
-from app.routers import admin, users, products, couriers, orders, finance
+from app.database import engine, async_engine, Base, SessionLocal
+from app.routers import admin, users, products, couriers, orders, finance, exports
+from app.config import OUTBOX_DISPATCHER_ENABLED, INVENTORY_SNAPSHOTS_ENABLED
+from app.utils.outbox import run_dispatcher
+from app.utils.telegram import start_telegram_client, close_telegram_client
+from app.utils.idempotency import IdempotencyMiddleware
+from app.utils.rollups import ensure_rollups
+from app.utils.inventory import ensure_inventory_baseline, run_snapshot_loop
 
 # Papkani yaratish
 if not os.path.exists("static/images"):
@@ -44,10 +52,121 @@ def run_manual_migrations():
                 );
             """))
         except: pass
+
+        # 4. orders keyset sahifalash indekslari
+        try:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at, id);"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_courier_id_created_at_id ON orders (courier_id, created_at, id);"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_user_id_created_at_id ON orders (user_id, created_at, id);"))
+        except: pass
+
+        # 5. Status va sana oraliqlari bo'yicha filtrlar uchun indekslar
+        try:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_status_created_at ON orders (status, created_at);"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_courier_id_status_delivered_at ON orders (courier_id, status, delivered_at);"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_user_id_status ON orders (user_id, status);"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id);"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_salary_payments_paid_at ON salary_payments (paid_at);"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_expenses_created_at ON expenses (created_at);"))
+        except: pass
+
+        # 6. orders bonus xulosasi (denormalizatsiya) + eski buyurtmalar uchun to'ldirish
+        try:
+            conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS has_bonus BOOLEAN DEFAULT FALSE;"))
+            conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS bonus_description VARCHAR;"))
+            conn.execute(text("""
+                UPDATE orders SET has_bonus = TRUE, bonus_description = b.description
+                FROM (
+                    SELECT oi.order_id,
+                           string_agg(COALESCE(p.name, 'Noma''lum') || ' (' || oi.quantity || ')', ', ' ORDER BY oi.id) AS description
+                    FROM order_items oi
+                    LEFT JOIN products p ON p.id = oi.product_id
+                    WHERE oi.is_bonus
+                    GROUP BY oi.order_id
+                ) b
+                WHERE orders.id = b.order_id AND orders.has_bonus IS NOT TRUE;
+            """))
+        except: pass
+
+        # 7. users.phone_digits (telefon faqat raqamlar) + to'ldirish
+        try:
+            conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS phone_digits VARCHAR;"))
+            conn.execute(text("""
+                UPDATE users SET phone_digits = regexp_replace(COALESCE(phone, ''), '[^0-9]', '', 'g')
+                WHERE phone_digits IS NULL;
+            """))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_phone_digits_prefix ON users (phone_digits text_pattern_ops);"))
+        except: pass
+
+        # 8. Foydalanuvchi qidiruvi uchun pg_trgm GIN indekslari
+        # (extension yaratishga huquq bo'lmasa, savepoint bekor qilinadi va qidiruv ILIKE bilan ishlayveradi)
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin (name gin_trgm_ops);"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_phone_digits_trgm ON users USING gin (phone_digits gin_trgm_ops);"))
+        except: pass
+
+        # 9. orders.rolled_up - yig'indilarga qo'shilgan buyurtmalar (avval yetkazilganlar allaqachon hisoblangan)
+        try:
+            conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS rolled_up BOOLEAN DEFAULT FALSE;"))
+            conn.execute(text("UPDATE orders SET rolled_up = TRUE WHERE delivered_at IS NOT NULL AND rolled_up IS NOT TRUE;"))
+        except: pass
+
+        # 10. daily_product_sales: birinchi sotuv tartibi + mahsulotsiz qatorlar (product_id = 0) uchun FK olib tashlanadi
+        # first_seen bo'sh qatorlar ensure_rollups da qayta hisoblanadi
+        try:
+            conn.execute(text("ALTER TABLE daily_product_sales ADD COLUMN IF NOT EXISTS first_seen BIGINT;"))
+            conn.execute(text("ALTER TABLE daily_product_sales DROP CONSTRAINT IF EXISTS daily_product_sales_product_id_fkey;"))
+        except: pass
+
+        # 11. Qisqa (1-2 belgili) qidiruv so'rovlari uchun ism boshidan moslik indeksi
+        try:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_name_lower_prefix ON users (lower(name) text_pattern_ops);"))
+        except: pass
+
+        # 12. Kuryer yig'indilarida yetkazish vaqti (reyting jadvali faqat yig'indilardan o'qiydi)
+        # Ustunlar NULL bilan qo'shiladi - ensure_rollups ularni ko'rib qayta hisoblaydi
+        try:
+            for table in ("daily_courier_sales", "courier_stats"):
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS delivery_seconds FLOAT;"))
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS delivery_count INTEGER;"))
+        except: pass
         
         conn.commit()
 
 run_manual_migrations()
+
+# Kunlik savdo yig'indilari bo'sh bo'lsa (birinchi ishga tushirish) - buyurtmalardan to'ldirish
+with SessionLocal() as _session:
+    try:
+        ensure_rollups(_session)
+    except Exception as e:
+        print(f"Yig'indilarni to'ldirib bo'lmadi: {e}")
+    # Ombor jurnali uchun boshlang'ich qoldiq nusxasi
+    try:
+        ensure_inventory_baseline(_session)
+    except Exception as e:
+        print(f"Ombor nusxasini olib bo'lmadi: {e}")
+# =================================================================
+
+# ================= FON VAZIFALARI (startup / shutdown) =================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Telegram uchun umumiy keep-alive HTTP client
+    await start_telegram_client()
+    # Telegram xabarnomalari outbox dispetcheri (alohida worker ishlatilsa o'chirib qo'yiladi)
+    dispatcher = asyncio.create_task(run_dispatcher()) if OUTBOX_DISPATCHER_ENABLED else None
+    # Davriy ombor qoldig'i nusxalari
+    snapshots = asyncio.create_task(run_snapshot_loop()) if INVENTORY_SNAPSHOTS_ENABLED else None
+    yield
+    for task in (dispatcher, snapshots):
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await close_telegram_client()
+    await async_engine.dispose()
 # =================================================================
 
 # Taglar uchun tavsiflar (Swagger UI da ko'rinadi)
@@ -76,6 +195,10 @@ tags_metadata = [
         "name": "Finance & Analytics",
         "description": "Moliyaviy hisobotlar, foyda-zarar analizi va kuryerlarga oylik to'lash.",
     },
+    {
+        "name": "Exports",
+        "description": "Buxgalteriya uchun CSV/NDJSON eksport (buyurtmalar, oyliklar, xarajatlar) - oqim sifatida.",
+    },
 ]
 
 app = FastAPI(
@@ -92,11 +215,15 @@ app = FastAPI(
     Tizim 3 ta asosiy rol uchun mo'ljallangan: **Admin**, **Kuryer**, **Mijoz**.
     """,
     version="2.1.0",
-    openapi_tags=tags_metadata
+    openapi_tags=tags_metadata,
+    lifespan=lifespan
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Idempotency-Key: CORS dan oldin qo'shiladi, shunda saqlangan javoblar ham CORS headerlarini oladi
+app.add_middleware(IdempotencyMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -108,6 +235,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 app.include_router(admin.router)
@@ -116,6 +244,7 @@ app.include_router(products.router)
 app.include_router(couriers.router)
 app.include_router(orders.router)
 app.include_router(finance.router)
+app.include_router(exports.router)
 
 @app.get("/health")
 def health_check():
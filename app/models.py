@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Date, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Date, Boolean, JSON, Index, BigInteger
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -12,10 +12,17 @@ class User(Base):
     telegram_id = Column(String, unique=True, index=True)
     status = Column(String, default="active")
     user_type = Column(String, default="standard") # standard yoki maxsus
+    phone_digits = Column(String, nullable=True) # Faqat raqamlar (qidiruv uchun), app.utils.search.normalize_phone
     created_at = Column(DateTime, default=datetime.utcnow)
     
     orders = relationship("Order", back_populates="user")
 
+    # Trigram (pg_trgm) GIN indekslari main.py dagi migratsiyada yaratiladi (extension kerak),
+    # lower(name) text_pattern_ops (ix_users_name_lower_prefix) ham u yerda - ifoda indeksi
+    __table_args__ = (
+        Index("ix_users_phone_digits_prefix", "phone_digits", postgresql_ops={"phone_digits": "text_pattern_ops"}),
+    )
+
 class Courier(Base):
     __tablename__ = "couriers"
     id = Column(Integer, primary_key=True, index=True)
@@ -68,15 +75,33 @@ class Order(Base):
     rating_comment = Column(Text, nullable=True) # Izoh
 
     current_location = Column(String, nullable=True) # Buyurtma berilgandagi lokatsiya
+
+    # Bonus xulosasi (add_bonus_items yozadi) - admin ro'yxati items/products ni yuklamasligi uchun
+    has_bonus = Column(Boolean, default=False)
+    bonus_description = Column(String, nullable=True) # Masalan: "Suv (1), Non (2)"
+
+    # Kunlik yig'indilarga qo'shilganmi (apply_delivery buyurtmani faqat bir marta hisoblaydi)
+    rolled_up = Column(Boolean, default=False)
     
     user = relationship("User", back_populates="orders")
     courier = relationship("Courier", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    # Keyset sahifalash uchun: ORDER BY created_at DESC, id DESC
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_courier_id_created_at_id", "courier_id", "created_at", "id"),
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Status / sana filtrlari uchun
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_courier_id_status_delivered_at", "courier_id", "status", "delivered_at"),
+        Index("ix_orders_user_id_status", "user_id", "status"),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     
     quantity = Column(Integer, default=1)
@@ -101,7 +126,7 @@ class SalaryPayment(Base):
     start_date = Column(Date) # Qaysi sanadan
     end_date = Column(Date)   # Qaysi sanagacha hisoblandi
     
-    paid_at = Column(DateTime, default=datetime.utcnow) # To'langan vaqt
+    paid_at = Column(DateTime, default=datetime.utcnow, index=True) # To'langan vaqt
     note = Column(Text, nullable=True)
     
     courier = relationship("Courier", back_populates="salaries")
@@ -112,7 +137,7 @@ class Expense(Base):
     id = Column(Integer, primary_key=True, index=True)
     amount = Column(Float)
     note = Column(String) # Nima uchun?
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 class Admin(Base):
     __tablename__ = "admins"
@@ -132,4 +157,105 @@ class OrderPriceHistory(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     order = relationship("Order")
-    courier = relationship("Courier")
\ No newline at end of file
+    courier = relationship("Courier")
+
+# YANGI: Telegram xabarnomalari uchun outbox (buyurtma bilan bitta tranzaksiyada yoziladi)
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)  # app/utils/telegram.py dagi notify_* funksiya nomi
+    payload = Column(JSON)  # Funksiya argumentlari
+    
+    # Statuslar: "pending", "sent", "failed"
+    status = Column(String, default="pending")
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_notification_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
+# YANGI: Kunlik savdo yig'indilari (deliver/rate da tranzaksiya ichida yangilanadi)
+# Hisobotlar O(buyurtmalar) emas, O(kunlar) qator o'qiydi. Qayta hisoblash: python -m app.utils.rollups rebuild
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+    day = Column(Date, primary_key=True)  # delivered_at sanasi (UTC)
+    revenue = Column(Float, default=0.0)  # final_total_amount yig'indisi
+    cogs = Column(Float, default=0.0)     # buy_price * quantity
+    quantity = Column(Integer, default=0) # Sotilgan mahsulotlar soni (bonus ham)
+    order_count = Column(Integer, default=0)
+    rating_sum = Column(Integer, default=0)
+    rating_count = Column(Integer, default=0)
+
+class DailyProductSales(Base):
+    __tablename__ = "daily_product_sales"
+    day = Column(Date, primary_key=True)
+    # FK yo'q: mahsuloti yo'q (NULL) qatorlar DELETED_PRODUCT_ID (0) ostida yig'iladi
+    product_id = Column(Integer, primary_key=True)
+    revenue = Column(Float, default=0.0)  # sell_price * quantity
+    cogs = Column(Float, default=0.0)
+    quantity = Column(Integer, default=0)
+    first_seen = Column(BigInteger) # Birinchi sotuv: order_id * 2^32 + order_item_id (hisobotdagi tartib)
+
+class DailyCourierSales(Base):
+    __tablename__ = "daily_courier_sales"
+    day = Column(Date, primary_key=True)
+    courier_id = Column(Integer, ForeignKey("couriers.id"), primary_key=True)
+    revenue = Column(Float, default=0.0)
+    quantity = Column(Integer, default=0)
+    order_count = Column(Integer, default=0)
+    rating_sum = Column(Integer, default=0)
+    rating_count = Column(Integer, default=0)
+    delivery_seconds = Column(Float, default=0.0) # Biriktirishdan yetkazishgacha (assigned_at bor buyurtmalar)
+    delivery_count = Column(Integer, default=0)
+
+class CourierStat(Base):
+    # Kuryerning umumiy (sanasiz) ko'rsatkichlari - deliver/rate da yangilanadi
+    __tablename__ = "courier_stats"
+    courier_id = Column(Integer, ForeignKey("couriers.id"), primary_key=True)
+    delivered_count = Column(Integer, default=0)
+    money_collected = Column(Float, default=0.0)
+    rating_sum = Column(Integer, default=0)
+    rating_count = Column(Integer, default=0)
+    delivery_seconds = Column(Float, default=0.0)
+    delivery_count = Column(Integer, default=0)
+
+class UserCounter(Base):
+    # Foydalanuvchilar soni (total, active, blocked, standard, maxsus) - users.py dagi yozuvlarda yangilanadi
+    __tablename__ = "user_counters"
+    key = Column(String, primary_key=True)
+    value = Column(Integer, default=0)
+
+class InventoryMovement(Base):
+    # Ombor harakatlari jurnali (faqat qo'shiladi) - Product.stock o'zgarishi bilan bitta tranzaksiyada yoziladi
+    __tablename__ = "inventory_movements"
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    delta = Column(Integer, nullable=False)        # +kirim / -chiqim
+    reason = Column(String, nullable=False)        # initial, restock, adjustment, order, bonus
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+    stock_after = Column(Integer, nullable=True)   # O'zgarishdan keyingi qoldiq
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_inventory_movements_product_id_created_at", "product_id", "created_at"),
+        Index("ix_inventory_movements_created_at", "created_at"),
+    )
+
+class InventorySnapshot(Base):
+    # Davriy qoldiq nusxalari: nuqtadagi qoldiq = eng yaqin nusxa + undan keyingi harakatlar
+    __tablename__ = "inventory_snapshots"
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    taken_at = Column(DateTime, nullable=False)
+    stock = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_inventory_snapshots_product_id_taken_at", "product_id", "taken_at"),
+        Index("ix_inventory_snapshots_taken_at", "taken_at"),
+    )
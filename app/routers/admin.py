@@ -5,6 +5,9 @@ from app.database import SessionLocal
 from app.dependencies import require_admin
 from app.config import ADMIN_TELEGRAM_IDS, ADMIN_PASSWORD
 from app.schemas.admin import AdminCreate
+from app.utils.cache import report_cache
+from app.utils.identity import identity_cache
+from app.utils.catalog import catalog_cache
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -45,6 +48,14 @@ def factory_reset(db: Session = Depends(get_db), admin_id: str = Depends(require
     tables = [
         "order_items",
         "order_price_history",
+        "inventory_movements",
+        "inventory_snapshots",
+        "notification_outbox",
+        "daily_product_sales",
+        "daily_courier_sales",
+        "daily_sales",
+        "courier_stats",
+        "user_counters",
         "salary_payments",
         "expenses",
         "orders",
@@ -60,4 +71,7 @@ def factory_reset(db: Session = Depends(get_db), admin_id: str = Depends(require
             print(f"Error truncating {table}: {e}")
             
     db.commit()
+    report_cache.clear()
+    identity_cache.clear()
+    catalog_cache.invalidate()
     return {"status": "ok", "message": "Ma'lumotlar bazasi muvaffaqiyatli tozalandi!"}
\ No newline at end of file
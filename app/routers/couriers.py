@@ -1,13 +1,18 @@
-from typing import List
+from typing import List, Literal, Optional
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, Query
+from decimal import Decimal, InvalidOperation
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Numeric, func, select, tuple_, cast
 
 from app.database import SessionLocal
-from app.models import Courier, Order, User
-from app.schemas.courier import CourierCreate, CourierRead, CourierStats, CourierOrderSummary, CourierUpdate
+from app.models import Courier, User, DailyCourierSales, CourierStat
+from app.schemas.courier import CourierCreate, CourierRead, CourierStats, CourierOrderSummary, CourierUpdate, CourierLeaderboardRow
 from app.dependencies import require_admin
+from app.utils.dates import day_range
+from app.utils.pagination import encode_cursor, decode_cursor, NEXT_CURSOR_HEADER
+from app.utils.cache import report_cache, SALES, NAMES
+from app.utils.identity import get_courier_identity, invalidate_courier
 
 router = APIRouter(prefix="/couriers", tags=["Couriers"])
 
@@ -31,6 +36,8 @@ def create_courier(
     db_courier = Courier(**courier.model_dump())
     db.add(db_courier)
     db.commit()
+    report_cache.bump(NAMES)  # calculate-salary/all barcha kuryerlarni ro'yxatlaydi
+    invalidate_courier(db_courier.telegram_id)
     db.refresh(db_courier)
     return db_courier
 
@@ -62,36 +69,57 @@ def update_courier(
     if not db_courier:
         raise HTTPException(status_code=404, detail="Kuryer topilmadi")
     
+    previous_telegram_id = db_courier.telegram_id
     update_data = data.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_courier, key, value)
     
     db.commit()
+    report_cache.bump(NAMES)
+    invalidate_courier(previous_telegram_id, db_courier.telegram_id)
     db.refresh(db_courier)
     return db_courier
 
 # ... (Helper methods remain same)
 
 def get_courier_statistics(db: Session, courier: Courier, start_date: date = None, end_date: date = None):
-    # Faqat yetkazilgan buyurtmalarni olamiz
-    query = db.query(Order).filter(
-        Order.courier_id == courier.id,
-        Order.status == "yetkazildi"
+    # Natija keshlanadi (yetkazish/baholash va nom o'zgarganda eskiradi)
+    return report_cache.get_or_compute(
+        "couriers.stats", (courier.id, start_date, end_date), (SALES, NAMES),
+        lambda: compute_courier_statistics(db, courier, start_date, end_date),
+        end_date=end_date
     )
+
+def compute_courier_statistics(db: Session, courier: Courier, start_date: date = None, end_date: date = None):
+    if not start_date and not end_date:
+        # Sanasiz so'rov: tayyor courier_stats qatori (PK bo'yicha bitta o'qish)
+        stat = db.query(CourierStat).filter(CourierStat.courier_id == courier.id).first()
+        rating_count = stat.rating_count if stat else 0
+        avg_rating = stat.rating_sum / rating_count if rating_count else 0.0
+        return CourierStats(
+            courier_id=courier.id,
+            courier_name=courier.name,
+            total_delivered_orders=stat.delivered_count if stat else 0,
+            total_money_collected=stat.money_collected if stat else 0.0,
+            average_rating=round(avg_rating, 1)
+        )
     
-    if start_date:
-        query = query.filter(func.date(Order.delivered_at) >= start_date)
-    if end_date:
-        query = query.filter(func.date(Order.delivered_at) <= end_date)
-    
-    orders = query.order_by(Order.delivered_at.desc()).all()
+    # Sana oralig'i: kuryerning kunlik yig'indilari (daily_courier_sales) - buyurtmalar yuklanmaydi
+    totals = db.query(
+        func.coalesce(func.sum(DailyCourierSales.order_count), 0).label("orders"),
+        func.coalesce(func.sum(DailyCourierSales.revenue), 0.0).label("revenue"),
+        func.coalesce(func.sum(DailyCourierSales.rating_sum), 0).label("rating_sum"),
+        func.coalesce(func.sum(DailyCourierSales.rating_count), 0).label("rating_count")
+    ).filter(
+        DailyCourierSales.courier_id == courier.id,
+        *day_range(DailyCourierSales.day, start_date, end_date)
+    ).one()
     
-    total_count = len(orders)
-    total_money = sum(o.final_total_amount for o in orders)
+    total_count = totals.orders
+    total_money = totals.revenue
     
     # Rating hisoblash
-    rated_orders = [o.rating for o in orders if o.rating is not None]
-    avg_rating = sum(rated_orders) / len(rated_orders) if rated_orders else 0.0
+    avg_rating = totals.rating_sum / totals.rating_count if totals.rating_count else 0.0
     
     return CourierStats(
         courier_id=courier.id,
@@ -101,6 +129,116 @@ def get_courier_statistics(db: Session, courier: Courier, start_date: date = Non
         average_rating=round(avg_rating, 1)
     )
 
+# Reyting jadvali: saralash ustuni -> standart tartib
+LEADERBOARD_SORTS = {
+    "delivered": "desc",
+    "revenue": "desc",
+    "rating": "desc",
+    "delivery_time": "asc",
+}
+# Yetkazmagan kuryerning vaqti NULL - saralashda eng sekin deb hisoblanadi
+NO_DELIVERY_TIME = 10 ** 9
+
+@router.get("/leaderboard/", response_model=List[CourierLeaderboardRow], summary="Kuryerlar reytingi (Admin)")
+def get_couriers_leaderboard(
+    response: Response,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    sort_by: Literal["delivered", "revenue", "rating", "delivery_time"] = "delivered",
+    order: Optional[Literal["asc", "desc"]] = None,
+    limit: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Barcha kuryerlar ko'rsatkichlari bitta so'rovda.**
+    
+    - Yetkazilgan buyurtmalar, savdo, o'rtacha baho, baholar soni va o'rtacha yetkazish vaqti (daqiqa).
+    - **start_date**, **end_date**: yetkazilgan sana bo'yicha.
+    - **sort_by**: `delivered`, `revenue`, `rating` yoki `delivery_time`; **order**: `asc` / `desc`.
+    - Barcha saralashlar bitta manbadan: sanasiz - courier_stats, sana oralig'i - daily_courier_sales.
+    - Keyingi sahifa uchun `X-Next-Cursor` headeridagi qiymatni **cursor** ga yuboring.
+    """
+    order = order or LEADERBOARD_SORTS[sort_by]
+    
+    # Yig'indilar NUMERIC ga o'giriladi: saralash kaliti aniq (float yaxlitlashsiz) va cursor orqali
+    # o'zgarmasdan qaytadi - teng qiymatlar sahifalar orasida tushib qolmaydi yoki takrorlanmaydi
+    if not start_date and not end_date:
+        totals = select(
+            CourierStat.courier_id,
+            CourierStat.delivered_count.label("orders"),
+            cast(CourierStat.money_collected, Numeric).label("revenue"),
+            CourierStat.rating_sum,
+            CourierStat.rating_count,
+            cast(CourierStat.delivery_seconds, Numeric).label("delivery_seconds"),
+            CourierStat.delivery_count
+        ).subquery()
+    else:
+        totals = select(
+            DailyCourierSales.courier_id,
+            func.sum(DailyCourierSales.order_count).label("orders"),
+            func.sum(cast(DailyCourierSales.revenue, Numeric)).label("revenue"),
+            func.sum(DailyCourierSales.rating_sum).label("rating_sum"),
+            func.sum(DailyCourierSales.rating_count).label("rating_count"),
+            func.sum(cast(DailyCourierSales.delivery_seconds, Numeric)).label("delivery_seconds"),
+            func.sum(DailyCourierSales.delivery_count).label("delivery_count")
+        ).where(
+            *day_range(DailyCourierSales.day, start_date, end_date)
+        ).group_by(DailyCourierSales.courier_id).subquery()
+    
+    # LEFT JOIN: hali yetkazmagan kuryerlar ham 0 bilan chiqadi
+    stats = select(
+        Courier.id.label("courier_id"),
+        func.coalesce(Courier.name, "").label("courier_name"),
+        func.coalesce(totals.c.orders, 0).label("delivered_orders"),
+        func.coalesce(totals.c.revenue, 0).label("revenue"),
+        func.coalesce(cast(totals.c.rating_sum, Numeric) / func.nullif(totals.c.rating_count, 0), 0).label("average_rating"),
+        func.coalesce(totals.c.rating_count, 0).label("rating_count"),
+        (totals.c.delivery_seconds / func.nullif(totals.c.delivery_count, 0) / 60).label("avg_delivery_minutes")
+    ).outerjoin(totals, totals.c.courier_id == Courier.id).subquery()
+    
+    sort_key = {
+        "delivered": stats.c.delivered_orders,
+        "revenue": stats.c.revenue,
+        "rating": stats.c.average_rating,
+        "delivery_time": func.coalesce(stats.c.avg_delivery_minutes, NO_DELIVERY_TIME),
+    }[sort_by]
+    
+    query = select(stats, sort_key.label("sort_key"))
+    if cursor:
+        last_key, last_id = decode_cursor(cursor, 2)
+        try:
+            last_key, last_id = Decimal(str(last_key)), int(last_id)
+        except (TypeError, ValueError, InvalidOperation):
+            raise HTTPException(status_code=400, detail="Noto'g'ri cursor")
+        keyset = tuple_(sort_key, stats.c.courier_id)
+        query = query.where(keyset < (last_key, last_id) if order == "desc" else keyset > (last_key, last_id))
+    
+    if order == "desc":
+        query = query.order_by(sort_key.desc(), stats.c.courier_id.desc())
+    else:
+        query = query.order_by(sort_key.asc(), stats.c.courier_id.asc())
+    
+    rows = db.execute(query.limit(limit)).all()
+    
+    if len(rows) == limit:
+        # Decimal satr sifatida (encode_cursor default=str) - aniq qiymat
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].sort_key, rows[-1].courier_id)
+    
+    return [
+        CourierLeaderboardRow(
+            courier_id=row.courier_id,
+            courier_name=row.courier_name,
+            delivered_orders=row.delivered_orders,
+            revenue=float(row.revenue),
+            average_rating=round(float(row.average_rating), 2),
+            rating_count=row.rating_count,
+            avg_delivery_minutes=round(float(row.avg_delivery_minutes), 1) if row.avg_delivery_minutes is not None else None
+        )
+        for row in rows
+    ]
+
 # 3. Kuryer o'z tarixini ko'rishi (Telegram ID orqali)
 @router.get("/me/history/", response_model=CourierStats, summary="Kuryer o'z statistikasini ko'rishi")
 def get_my_history(
@@ -115,7 +253,7 @@ def get_my_history(
     - **average_rating**: O'rtacha reyting.
     - **history**: Bajarilgan buyurtmalar ro'yxati.
     """
-    courier = db.query(Courier).filter(Courier.telegram_id == telegram_id).first()
+    courier = get_courier_identity(db, telegram_id)
     if not courier:
         raise HTTPException(status_code=404, detail="Kuryer topilmadi")
     
@@ -148,7 +286,7 @@ def check_courier_exists(telegram_id: str, db: Session = Depends(get_db)):
     - Bazada bo'lsa: 200 OK qaytadi.
     - Bazada bo'lmasa: 404 Not Found qaytadi.
     """
-    courier = db.query(Courier).filter(Courier.telegram_id == telegram_id).first()
+    courier = get_courier_identity(db, telegram_id)
     if not courier:
         raise HTTPException(status_code=404, detail="Kuryer topilmadi. Iltimos, adminga murojaat qiling.")
     
@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Iterator, List, Literal, Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models import Order, OrderItem, User, Courier, Product, SalaryPayment, Expense
+from app.dependencies import require_admin
+from app.utils.dates import date_range
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+# Server tomonidagi cursor dan bir martada olinadigan qatorlar soni
+FETCH_SIZE = 1000
+# Shuncha qator yig'ilganda mijozga yuboriladi
+FLUSH_ROWS = 500
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_rows(stmt, columns: List[str], fmt: str) -> Iterator[str]:
+    """
+    So'rov natijasini qatorma-qator CSV/NDJSON ga aylantirib yuborish.
+
+    - Sessiya generator ichida ochiladi: javob oqimi tugaguncha yopilmaydi.
+    - `yield_per` server tomonidagi cursor (stream_results) ni yoqadi - xotira
+      oraliq uzunligiga bog'liq emas, faqat FETCH_SIZE qatorgacha saqlanadi.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        buffer.write("\ufeff")  # Excel UTF-8 ni to'g'ri o'qishi uchun BOM
+        writer.writerow(columns)
+
+    with SessionLocal() as db:
+        result = db.execute(stmt.execution_options(yield_per=FETCH_SIZE))
+        pending = 0
+        for row in result:
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False))
+                buffer.write("\n")
+            pending += 1
+            if pending >= FLUSH_ROWS:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+    yield buffer.getvalue()
+
+
+def export_response(stmt, columns: List[str], fmt: str, name: str) -> StreamingResponse:
+    filename = f"{name}_{datetime.utcnow():%Y%m%d_%H%M%S}.{fmt}"
+    return StreamingResponse(
+        stream_rows(stmt, columns, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/orders/", summary="Buyurtmalar va mahsulotlarini eksport qilish (Admin)")
+def export_orders(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    status: Optional[str] = None,
+    format: Literal["csv", "ndjson"] = "csv",
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Buxgalteriya uchun buyurtmalar eksporti.**
+
+    - Har bir qator = bitta buyurtma mahsuloti (mahsulotsiz buyurtma bitta bo'sh qator bilan).
+    - **start_date**, **end_date**: buyurtma yaratilgan sana bo'yicha.
+    - **format**: `csv` yoki `ndjson`.
+    - Javob oqim (stream) sifatida yuboriladi, oraliq uzunligi cheklanmagan.
+    """
+    columns = [
+        "order_id", "created_at", "status", "user_name", "user_phone", "courier_name",
+        "assigned_at", "delivered_at", "total_amount", "final_total_amount", "is_price_locked", "rating",
+        "item_id", "product_id", "product_name", "quantity", "buy_price", "sell_price", "is_bonus"
+    ]
+    stmt = (
+        select(
+            Order.id, Order.created_at, Order.status, User.name, User.phone, Courier.name,
+            Order.assigned_at, Order.delivered_at, Order.total_amount, Order.final_total_amount,
+            Order.is_price_locked, Order.rating,
+            OrderItem.id, OrderItem.product_id, Product.name, OrderItem.quantity,
+            OrderItem.buy_price, OrderItem.sell_price, OrderItem.is_bonus
+        )
+        .select_from(Order)
+        .outerjoin(User, User.id == Order.user_id)
+        .outerjoin(Courier, Courier.id == Order.courier_id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(*date_range(Order.created_at, start_date, end_date))
+        .order_by(Order.created_at, Order.id, OrderItem.id)
+    )
+    if status:
+        stmt = stmt.where(Order.status == status)
+
+    return export_response(stmt, columns, format, "orders")
+
+
+@router.get("/salaries/", summary="Oylik to'lovlarini eksport qilish (Admin)")
+def export_salaries(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    courier_id: Optional[int] = None,
+    format: Literal["csv", "ndjson"] = "csv",
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Oylik to'lovlari eksporti.**
+
+    - **start_date**, **end_date**: to'langan sana (paid_at) bo'yicha.
+    """
+    columns = ["id", "courier_id", "courier_name", "amount", "start_date", "end_date", "paid_at", "note"]
+    stmt = (
+        select(
+            SalaryPayment.id, SalaryPayment.courier_id, Courier.name, SalaryPayment.amount,
+            SalaryPayment.start_date, SalaryPayment.end_date, SalaryPayment.paid_at, SalaryPayment.note
+        )
+        .outerjoin(Courier, Courier.id == SalaryPayment.courier_id)
+        .where(*date_range(SalaryPayment.paid_at, start_date, end_date))
+        .order_by(SalaryPayment.paid_at, SalaryPayment.id)
+    )
+    if courier_id:
+        stmt = stmt.where(SalaryPayment.courier_id == courier_id)
+
+    return export_response(stmt, columns, format, "salaries")
+
+
+@router.get("/expenses/", summary="Xarajatlarni eksport qilish (Admin)")
+def export_expenses(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: Literal["csv", "ndjson"] = "csv",
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Xarajatlar eksporti.**
+
+    - **start_date**, **end_date**: kiritilgan sana (created_at) bo'yicha.
+    """
+    columns = ["id", "amount", "note", "created_at"]
+    stmt = (
+        select(Expense.id, Expense.amount, Expense.note, Expense.created_at)
+        .where(*date_range(Expense.created_at, start_date, end_date))
+        .order_by(Expense.created_at, Expense.id)
+    )
+
+    return export_response(stmt, columns, format, "expenses")
@@ -1,17 +1,24 @@
-from typing import List, Dict, Optional
+from typing import List, Literal, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
-from datetime import date
+from sqlalchemy import func, and_, insert, cast, Date, DateTime
+from datetime import date, datetime, timedelta
 
 from app.database import SessionLocal
-from app.models import Order, OrderItem, SalaryPayment, Expense, Courier, Product
+from app.models import (
+    SalaryPayment, Expense, Courier, Product,
+    DailySales, DailyProductSales, DailyCourierSales
+)
 from app.schemas.finance import (
     ProfitStats, SalaryCalculateRequest, SalaryCalculationResponse,
-    SalaryPaymentCreate, SalaryPaymentRead, 
-    ExpenseCreate, ExpenseRead, ProductPerformance
+    SalaryPaymentCreate, SalaryPaymentRead, SalaryBatchPaymentCreate,
+    ExpenseCreate, ExpenseRead, ProductPerformance, FinanceSeriesPoint
 )
 from app.dependencies import require_admin
+from app.utils.dates import date_range, day_range
+from app.utils.rollups import rebuild_rollups, DELETED_PRODUCT_ID
+from app.utils.cache import report_cache, SALES, FINANCE, NAMES
+from app.config import FINANCE_SERIES_MAX_BUCKETS
 
 router = APIRouter(prefix="/finance", tags=["Finance & Analytics"])
 
@@ -34,73 +41,66 @@ def get_analytics(
     
     - **start_date**, **end_date**: Filtrlash uchun sanalar.
     - Sof foyda, Yalpi daromad, Xarajatlar va Mahsulotlar kesimida statistika.
+    - Savdo ko'rsatkichlari kunlik yig'indi jadvallaridan o'qiladi (buyurtmalar qayta skanerlanmaydi).
+    - Javob keshlanadi; yopilgan davrlar hisoboti faqat o'tgan kunlar o'zgarganda qayta hisoblanadi.
     """
-    # 1. Yetkazilgan buyurtmalarni olamiz
-    query = db.query(Order).filter(Order.status == "yetkazildi")
-    
-    if start_date:
-        query = query.filter(func.date(Order.delivered_at) >= start_date)
-    if end_date:
-        query = query.filter(func.date(Order.delivered_at) <= end_date)
-    
-    orders = query.options(joinedload(Order.items).joinedload(OrderItem.product)).all()
+    return report_cache.get_or_compute(
+        "finance.stats", (start_date, end_date), (SALES, FINANCE, NAMES),
+        lambda: compute_analytics(db, start_date, end_date),
+        end_date=end_date
+    )
+
+def compute_analytics(db: Session, start_date: Optional[date], end_date: Optional[date]) -> ProfitStats:
+    # 1. Kunlik yig'indilardan (daily_sales) umumiy savdo va tannarx
+    days = day_range(DailySales.day, start_date, end_date)
     
-    # 2. Hisob-kitoblar uchun o'zgaruvchilar
-    total_revenue = 0.0
-    total_cogs = 0.0
-    sold_items_count = 0
+    totals = db.query(
+        func.coalesce(func.sum(DailySales.revenue), 0.0).label("revenue"),
+        func.coalesce(func.sum(DailySales.cogs), 0.0).label("cogs"),
+        func.coalesce(func.sum(DailySales.quantity), 0).label("qty")
+    ).filter(*days).one()
+    total_revenue = totals.revenue
     
-    # Mahsulotlar bo'yicha guruhlash
-    product_stats: Dict[int, dict] = {}
+    # 2. Mahsulotlar kesimida: soni, savdo va tannarx (daily_product_sales)
+    # Tartib - birinchi sotuv bo'yicha (buyurtmalar, ichida mahsulotlar), eski hisobot bilan bir xil
+    product_rows = db.query(
+        DailyProductSales.product_id,
+        Product.name,
+        func.coalesce(func.sum(DailyProductSales.quantity), 0).label("qty"),
+        func.coalesce(func.sum(DailyProductSales.revenue), 0.0).label("revenue"),
+        func.coalesce(func.sum(DailyProductSales.cogs), 0.0).label("cogs")
+    ).outerjoin(
+        Product, Product.id == DailyProductSales.product_id
+    ).filter(*day_range(DailyProductSales.day, start_date, end_date)).group_by(
+        DailyProductSales.product_id, Product.name
+    ).order_by(func.min(DailyProductSales.first_seen), DailyProductSales.product_id).all()
     
-    for order in orders:
-        total_revenue += order.final_total_amount
-        for item in order.items:
-            cog = item.buy_price * item.quantity
-            total_cogs += cog
-            sold_items_count += item.quantity
-            
-            # Mahsulot kesimida hisob
-            p_id = item.product_id
-            if p_id not in product_stats:
-                p_name = item.product.name if item.product else "O'chirilgan"
-                product_stats[p_id] = {
-                    "name": p_name,
-                    "qty": 0,
-                    "revenue": 0.0,
-                    "cogs": 0.0
-                }
-            
-            product_stats[p_id]["qty"] += item.quantity
-            product_stats[p_id]["revenue"] += (item.sell_price * item.quantity)
-            product_stats[p_id]["cogs"] += cog
+    total_cogs = totals.cogs
+    sold_items_count = totals.qty
 
     # 3. ProductPerformance ro'yxatini shakllantirish
     breakdown_list = []
-    for pid, data in product_stats.items():
-        gross = data["revenue"] - data["cogs"]
-        margin = (gross / data["revenue"] * 100) if data["revenue"] > 0 else 0.0
+    for row in product_rows:
+        gross = row.revenue - row.cogs
+        margin = (gross / row.revenue * 100) if row.revenue > 0 else 0.0
         
         breakdown_list.append(ProductPerformance(
-            product_id=pid,
-            product_name=data["name"],
-            sold_quantity=data["qty"],
-            total_revenue=data["revenue"],
-            total_cogs=data["cogs"],
+            product_id=row.product_id if row.product_id != DELETED_PRODUCT_ID else None,
+            product_name=row.name if row.name is not None else "O'chirilgan",
+            sold_quantity=row.qty,
+            total_revenue=row.revenue,
+            total_cogs=row.cogs,
             gross_profit=gross,
             margin_percent=round(margin, 2)
         ))
     
     # 4. Chiqimlar (Oylik va Boshqa xarajatlar)
-    salary_query = db.query(func.sum(SalaryPayment.amount))
-    expense_query = db.query(func.sum(Expense.amount))
-    
-    if start_date:
-        salary_query = salary_query.filter(func.date(SalaryPayment.paid_at) >= start_date)
-        expense_query = expense_query.filter(func.date(Expense.created_at) >= start_date)
-    if end_date:
-        salary_query = salary_query.filter(func.date(SalaryPayment.paid_at) <= end_date)
-        expense_query = expense_query.filter(func.date(Expense.created_at) <= end_date)
+    salary_query = db.query(func.sum(SalaryPayment.amount)).filter(
+        *date_range(SalaryPayment.paid_at, start_date, end_date)
+    )
+    expense_query = db.query(func.sum(Expense.amount)).filter(
+        *date_range(Expense.created_at, start_date, end_date)
+    )
 
     total_salaries = salary_query.scalar() or 0.0
     total_expenses = expense_query.scalar() or 0.0
@@ -119,6 +119,125 @@ def get_analytics(
         products_breakdown=breakdown_list
     )
 
+def bucket_start(day: date, bucket: str) -> date:
+    """Postgres date_trunc bilan bir xil: hafta dushanbadan, oy 1-sanadan boshlanadi"""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day + timedelta(days=7)
+    if bucket == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+def bucket_count(start_date: date, end_date: date, bucket: str) -> int:
+    """[start_date, end_date] oralig'idagi bo'laklar soni (compute_series qaytaradigan nuqtalar)"""
+    if bucket == "month":
+        return (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+    if bucket == "week":
+        return (bucket_start(end_date, bucket) - bucket_start(start_date, bucket)).days // 7 + 1
+    return (end_date - start_date).days + 1
+
+def truncated(bucket: str, column):
+    # Date ustuni aniq TIMESTAMP ga o'giriladi (timestamptz va sessiya vaqt zonasi aralashmasligi uchun)
+    return cast(func.date_trunc(bucket, cast(column, DateTime)), Date)
+
+@router.get("/series/", response_model=List[FinanceSeriesPoint], summary="Vaqt bo'yicha daromad/foyda grafigi")
+def get_finance_series(
+    start_date: date,
+    end_date: date,
+    bucket: Literal["day", "week", "month"] = "day",
+    db: Session = Depends(get_db),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Grafiklar uchun kun/hafta/oy kesimidagi moliyaviy ko'rsatkichlar.**
+    
+    - **bucket**: `day`, `week` (dushanbadan) yoki `month`.
+    - Savdo, xarajat va oyliklar har biri bitta `date_trunc` + GROUP BY so'rovi bilan hisoblanadi.
+    - Ma'lumot bo'lmagan bo'laklar ham 0 bilan qaytadi (grafik uzilmasligi uchun).
+    - Bo'laklar soni `FINANCE_SERIES_MAX_BUCKETS` dan oshsa - 400 (kattaroq **bucket** tanlang).
+    """
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date start_date dan oldin bo'lishi mumkin emas")
+    if bucket_count(start_date, end_date, bucket) > FINANCE_SERIES_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Oraliq juda katta: {bucket} bo'yicha {FINANCE_SERIES_MAX_BUCKETS} tadan ko'p nuqta. Kattaroq bucket tanlang"
+        )
+    
+    return report_cache.get_or_compute(
+        "finance.series", (start_date, end_date, bucket), (SALES, FINANCE),
+        lambda: compute_series(db, start_date, end_date, bucket),
+        end_date=end_date
+    )
+
+def compute_series(db: Session, start_date: date, end_date: date, bucket: str) -> List[FinanceSeriesPoint]:
+    # 1. Savdo (daily_sales yig'indilaridan)
+    period = truncated(bucket, DailySales.day).label("period")
+    sales = {
+        row.period: row for row in db.query(
+            period,
+            func.sum(DailySales.revenue).label("revenue"),
+            func.sum(DailySales.cogs).label("cogs"),
+            func.sum(DailySales.order_count).label("orders"),
+            func.sum(DailySales.quantity).label("qty")
+        ).filter(*day_range(DailySales.day, start_date, end_date)).group_by(period).all()
+    }
+    
+    # 2. Oyliklar va xarajatlar (o'sha bo'laklar bo'yicha)
+    salary_period = truncated(bucket, SalaryPayment.paid_at).label("period")
+    salaries = dict(
+        db.query(salary_period, func.sum(SalaryPayment.amount))
+        .filter(*date_range(SalaryPayment.paid_at, start_date, end_date))
+        .group_by(salary_period).all()
+    )
+    expense_period = truncated(bucket, Expense.created_at).label("period")
+    expenses = dict(
+        db.query(expense_period, func.sum(Expense.amount))
+        .filter(*date_range(Expense.created_at, start_date, end_date))
+        .group_by(expense_period).all()
+    )
+    
+    # 3. Barcha bo'laklarni (bo'shlarini ham) tartib bilan yig'ish
+    points = []
+    current = bucket_start(start_date, bucket)
+    while current <= end_date:
+        row = sales.get(current)
+        revenue = (row.revenue or 0.0) if row else 0.0
+        cogs = (row.cogs or 0.0) if row else 0.0
+        total_salaries = salaries.get(current) or 0.0
+        total_expenses = expenses.get(current) or 0.0
+        points.append(FinanceSeriesPoint(
+            period_start=current,
+            revenue=revenue,
+            cogs=cogs,
+            gross_profit=revenue - cogs,
+            orders_count=(row.orders or 0) if row else 0,
+            items_count=(row.qty or 0) if row else 0,
+            total_salaries=total_salaries,
+            total_expenses=total_expenses,
+            net_profit=revenue - cogs - total_salaries - total_expenses
+        ))
+        current = next_bucket(current, bucket)
+    return points
+
+@router.post("/rollups/rebuild/", summary="Kunlik savdo yig'indilarini qayta hisoblash (Admin)")
+def rebuild_sales_rollups(db: Session = Depends(get_db), admin_id: str = Depends(require_admin)):
+    """
+    **Kunlik yig'indi jadvallarini buyurtmalardan noldan qayta hisoblash.**
+    
+    - Qo'lda ma'lumot tuzatilgandan keyin yoki shubha bo'lganda ishlatiladi.
+    - Hisoblash vaqtida yangi yetkazish/baholash so'rovlari kutib turadi.
+    """
+    rebuild_rollups(db)
+    report_cache.clear()
+    return {"status": "ok", "message": "Yig'indilar qayta hisoblandi"}
+
 @router.get("/calculate-salary/", response_model=SalaryCalculationResponse, summary="Kuryer oyligini hisoblash (Saqlamasdan)")
 def calculate_salary(
     courier_id: int,
@@ -132,30 +251,86 @@ def calculate_salary(
     
     Bu endpoint bazaga saqlamaydi, faqat hisoblab javob qaytaradi.
     """
+    return report_cache.get_or_compute(
+        "finance.calculate_salary", (courier_id, start_date, end_date), (SALES, NAMES),
+        lambda: compute_salary(db, courier_id, start_date, end_date),
+        end_date=end_date
+    )
+
+def compute_salary(db: Session, courier_id: int, start_date: date, end_date: date) -> SalaryCalculationResponse:
     courier = db.query(Courier).filter(Courier.id == courier_id).first()
     if not courier:
         raise HTTPException(status_code=404, detail="Kuryer topilmadi")
         
-    orders = db.query(Order).filter(
-        Order.courier_id == courier_id,
-        Order.status == "yetkazildi",
-        func.date(Order.delivered_at) >= start_date,
-        func.date(Order.delivered_at) <= end_date
-    ).options(joinedload(Order.items)).all()
-    
-    total_sales = sum(order.final_total_amount for order in orders)
-    items_count = sum(sum(item.quantity for item in order.items) for order in orders)
+    # Kuryerning kunlik yig'indilari (daily_courier_sales)
+    totals = db.query(
+        func.coalesce(func.sum(DailyCourierSales.revenue), 0.0).label("revenue"),
+        func.coalesce(func.sum(DailyCourierSales.order_count), 0).label("orders"),
+        func.coalesce(func.sum(DailyCourierSales.quantity), 0).label("qty")
+    ).filter(
+        DailyCourierSales.courier_id == courier_id,
+        *day_range(DailyCourierSales.day, start_date, end_date)
+    ).one()
     
     return SalaryCalculationResponse(
         courier_id=courier_id,
         courier_name=courier.name,
-        total_sales=total_sales,
-        orders_count=len(orders),
-        items_count=items_count,
+        total_sales=totals.revenue,
+        orders_count=totals.orders,
+        items_count=totals.qty,
         start_date=start_date,
         end_date=end_date
     )
 
+@router.get("/calculate-salary/all/", response_model=List[SalaryCalculationResponse], summary="Barcha kuryerlar oyligini hisoblash (Saqlamasdan)")
+def calculate_salary_all(
+    start_date: date,
+    end_date: date,
+    db: Session = Depends(get_db),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Oy yakunida barcha kuryerlar uchun hisob-kitob.**
+    
+    - Bitta GROUP BY so'rovi (couriers LEFT JOIN daily_courier_sales).
+    - Savdosi bo'lmagan kuryerlar ham 0 qiymatlar bilan qaytadi.
+    - To'lovlarni saqlash uchun: **POST /finance/pay-salary/batch/**.
+    """
+    return report_cache.get_or_compute(
+        "finance.calculate_salary_all", (start_date, end_date), (SALES, NAMES),
+        lambda: compute_salary_all(db, start_date, end_date),
+        end_date=end_date
+    )
+
+def compute_salary_all(db: Session, start_date: date, end_date: date) -> List[SalaryCalculationResponse]:
+    # Sana sharti JOIN ichida: aks holda savdosi yo'q kuryerlar tushib qoladi
+    rows = db.query(
+        Courier.id,
+        Courier.name,
+        func.coalesce(func.sum(DailyCourierSales.revenue), 0.0).label("revenue"),
+        func.coalesce(func.sum(DailyCourierSales.order_count), 0).label("orders"),
+        func.coalesce(func.sum(DailyCourierSales.quantity), 0).label("qty")
+    ).outerjoin(
+        DailyCourierSales,
+        and_(
+            DailyCourierSales.courier_id == Courier.id,
+            *day_range(DailyCourierSales.day, start_date, end_date)
+        )
+    ).group_by(Courier.id, Courier.name).order_by(Courier.id).all()
+    
+    return [
+        SalaryCalculationResponse(
+            courier_id=row.id,
+            courier_name=row.name,
+            total_sales=row.revenue,
+            orders_count=row.orders,
+            items_count=row.qty,
+            start_date=start_date,
+            end_date=end_date
+        )
+        for row in rows
+    ]
+
 @router.post("/pay-salary/", response_model=SalaryPaymentRead, summary="Oylik to'lovini saqlash")
 def pay_courier_salary(
     data: SalaryPaymentCreate,
@@ -181,10 +356,56 @@ def pay_courier_salary(
     db.add(payment)
     db.commit()
     db.refresh(payment)
+    report_cache.bump(FINANCE, payment.paid_at.date())
     
     payment.courier_name = courier.name 
     return payment
 
+@router.post("/pay-salary/batch/", response_model=List[SalaryPaymentRead], summary="Bir nechta kuryerga oylik to'lovini saqlash")
+def pay_courier_salary_batch(
+    data: SalaryBatchPaymentCreate,
+    db: Session = Depends(get_db),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Oy yakunidagi barcha to'lovlarni bitta tranzaksiyada saqlash.**
+    
+    - Hammasi yoki hech narsa: biror kuryer topilmasa, hech qaysi to'lov saqlanmaydi.
+    - Summalar **/finance/calculate-salary/all/** natijasi asosida frontendda hisoblanadi.
+    """
+    if not data.payments:
+        raise HTTPException(status_code=400, detail="To'lovlar ro'yxati bo'sh")
+    
+    courier_ids = {item.courier_id for item in data.payments}
+    couriers = {c.id: c for c in db.query(Courier).filter(Courier.id.in_(courier_ids)).all()}
+    missing = sorted(courier_ids - couriers.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Kuryer topilmadi: {', '.join(map(str, missing))}")
+    
+    # Bitta ko'p qatorli INSERT ... RETURNING (har bir qator uchun alohida refresh shart emas)
+    payments = db.scalars(
+        insert(SalaryPayment).returning(SalaryPayment),
+        [
+            {
+                "courier_id": item.courier_id,
+                "amount": item.amount,
+                "percentage": 0.0, # Removed feature
+                "start_date": data.start_date,
+                "end_date": data.end_date
+            }
+            for item in data.payments
+        ]
+    ).all()
+    # Javob commit dan oldin yig'iladi (commit obyektlarni expire qiladi)
+    result = []
+    for payment in payments:
+        payment.courier_name = couriers[payment.courier_id].name
+        result.append(SalaryPaymentRead.model_validate(payment))
+    db.commit()
+    report_cache.bump(FINANCE, datetime.utcnow().date())
+    
+    return result
+
 @router.get("/salaries/", response_model=List[SalaryPaymentRead], summary="Barcha oylik to'lovlari ro'yxati (Admin)")
 def get_salary_payments(
     courier_id: Optional[int] = None,
@@ -222,8 +443,10 @@ def delete_salary_payment(
     if not payment:
         raise HTTPException(status_code=404, detail="To'lov topilmadi")
     
+    paid_day = payment.paid_at.date() if payment.paid_at else None
     db.delete(payment)
     db.commit()
+    report_cache.bump(FINANCE, paid_day)
     return {"status": "ok", "message": "Oylik to'lovi muvaffaqiyatli o'chirildi"}
 
 @router.post("/expenses/", response_model=ExpenseRead, summary="Yangi xarajat qo'shish")
@@ -241,6 +464,7 @@ def create_expense(
     db.add(expense)
     db.commit()
     db.refresh(expense)
+    report_cache.bump(FINANCE, expense.created_at.date())
     return expense
 
 @router.get("/expenses/", response_model=List[ExpenseRead], summary="Barcha xarajatlar ro'yxati")
@@ -263,6 +487,8 @@ def delete_expense(
     if not expense:
         raise HTTPException(status_code=404, detail="Xarajat topilmadi")
     
+    expense_day = expense.created_at.date() if expense.created_at else None
     db.delete(expense)
     db.commit()
+    report_cache.bump(FINANCE, expense_day)
     return {"status": "ok", "message": "Xarajat muvaffaqiyatli o'chirildi"}
\ No newline at end of file
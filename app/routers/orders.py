@@ -1,17 +1,24 @@
+import asyncio
+import json
 from typing import List, Optional
 from datetime import datetime, date
-from sqlalchemy import func
-from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import SessionLocal
-from app.models import Order, User, Product, Courier, OrderItem, OrderPriceHistory
+from app.database import SessionLocal, get_async_db
+from app.models import Order, User, Courier, OrderItem, OrderPriceHistory
 from app.schemas.order import (
     OrderCreate, OrderRead, OrderList, OrderAssign, OrderAccept, OrderItemRead, OrderRate, BonusItemCreate, OrderPriceUpdate,
     OrderDeliver, OrderBonus, OrderLock, OrderCourierHistory, OrderStatusResponse
 )
 from app.dependencies import require_admin
+from app.utils.dates import date_range
 from app.config import MAX_USER_PENDING_ORDERS
+from app.utils.stock import reserve_stock
+from app.utils.pagination import paginate_orders, next_orders_cursor, NEXT_CURSOR_HEADER
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
@@ -22,6 +29,22 @@ def get_db():
     finally:
         db.close()
 
+async def load_order(db: AsyncSession, order_id: int, with_items: bool = False) -> Optional[Order]:
+    """
+    Buyurtmani user va courier bilan (kerak bo'lsa items + product bilan ham) yuklash.
+
+    Async sessiyada lazy load ishlamaydi, shuning uchun javobda kerak bo'ladigan
+    hamma narsa oldindan joinedload qilinadi.
+    """
+    options = [joinedload(Order.user), joinedload(Order.courier)]
+    if with_items:
+        options.append(joinedload(Order.items).joinedload(OrderItem.product))
+    result = await db.execute(
+        select(Order).options(*options).where(Order.id == order_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.unique().scalar_one_or_none()
+
 # Helper function
 def format_order_response(order: Order) -> OrderRead:
     items_data = []
@@ -72,16 +95,7 @@ def format_order_response(order: Order) -> OrderRead:
     )
 
 def format_order_list_response(order: Order) -> OrderList:
-    bonus_list = []
-    has_bonus = False
-    for item in order.items:
-        if item.is_bonus:
-            has_bonus = True
-            p_name = item.product.name if item.product else "Noma'lum"
-            bonus_list.append(f"{p_name} ({item.quantity})")
-    
-    bonus_desc = ", ".join(bonus_list) if bonus_list else None
-
+    # Bonus xulosasi orders jadvalida saqlanadi (items va products yuklanmaydi)
     return OrderList(
         id=order.id,
         current_location=order.current_location,
@@ -97,24 +111,22 @@ def format_order_list_response(order: Order) -> OrderList:
         base_total_amount=order.base_total_amount,
         final_total_amount=order.final_total_amount,
         is_price_locked=order.is_price_locked,
-        has_bonus=has_bonus,
-        bonus_description=bonus_desc
+        has_bonus=bool(order.has_bonus),
+        bonus_description=order.bonus_description
     )
 
-from app.utils.telegram import (
-    notify_admins_new_order, 
-    notify_courier_assigned, 
-    notify_user_courier_assigned,
-    notify_user_courier_accepted,
-    notify_user_delivered,
-    notify_admin_delivered
-)
+from app.utils.outbox import enqueue_notification, wake_dispatcher
+from app.utils.events import order_events
+from app.utils.rollups import apply_delivery, apply_rating
+from app.utils.cache import report_cache, SALES
+from app.utils.identity import get_courier_identity, aget_courier_identity, get_user_identity
+from app.utils.inventory import record_reservation, ORDER, BONUS
 
 # ... (Imports qoladi)
 
 # 1. CREATE ORDER (Ombor logikasi bilan)
 @router.post("/", response_model=OrderStatusResponse, status_code=201, summary="Yangi buyurtma yaratish")
-async def create_order(order_in: OrderCreate, db: Session = Depends(get_db)):
+async def create_order(order_in: OrderCreate, db: AsyncSession = Depends(get_async_db)):
     """
     **Foydalanuvchi tomonidan yangi buyurtma yaratish.**
     
@@ -123,23 +135,25 @@ async def create_order(order_in: OrderCreate, db: Session = Depends(get_db)):
     
     Tizim avtomatik ravishda:
     1. Foydalanuvchini topadi.
-    2. Mahsulotlar omborda yetarli ekanligini tekshiradi (hozircha pass).
-    3. Ombor qoldig'ini kamaytiradi.
+    2. Mahsulotlar omborda yetarli ekanligini tekshiradi (yetmasa 400 qaytaradi).
+    3. Ombor qoldig'ini atomar kamaytiradi.
     4. Umumiy summani hisoblaydi.
     5. Adminga xabar yuboradi.
     
     Javob:
     - Muvaffaqiyatli bo'lsa: {"status": "ok", "message": "Buyurtma qabul qilindi"}
     """
-    user = db.query(User).filter(User.telegram_id == order_in.telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == order_in.telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="Foydalanuvchi topilmadi")
     
     # LIMIT TEKSHIRUVI: Foydalanuvchining faol buyurtmalari sonini tekshiramiz
-    active_orders_count = db.query(Order).filter(
-        Order.user_id == user.id,
-        Order.status.in_(["kutilmoqda", "kuryerda"])
-    ).count()
+    active_orders_count = await db.scalar(
+        select(func.count(Order.id)).where(
+            Order.user_id == user.id,
+            Order.status.in_(["kutilmoqda", "kuryerda"])
+        )
+    )
     
     if active_orders_count >= MAX_USER_PENDING_ORDERS:
         raise HTTPException(
@@ -147,73 +161,69 @@ async def create_order(order_in: OrderCreate, db: Session = Depends(get_db)):
             detail=f"Sizda {active_orders_count} ta faol buyurtma bor. Yangi buyurtma berish uchun avvalgi buyurtmalaringiz yetkazilishini kuting."
         )
     
-    # Order yaratamiz
+    # Ombor bitta shartli UPDATE ... RETURNING bilan band qilinadi (narxlar ham shu so'rovdan keladi)
+    reservation = await reserve_stock(db, [(item.product_id, item.quantity) for item in order_in.items])
+    if not reservation.ok:
+        raise HTTPException(status_code=400, detail=reservation.shortage_message())
+
+    # Order va uning mahsulotlari bitta tranzaksiyada yoziladi
     db_order = Order(
         user_id=user.id,
         status="kutilmoqda", 
-        total_amount=0.0,
         delivery_time=order_in.delivery_time,
         current_location=order_in.current_location
     )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
     
     total_price = 0.0
     
     for item in order_in.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if not product:
+        product = reservation.products.get(item.product_id)
+        if not product or item.quantity <= 0:
             continue
         
-        # OMBOR TEKSHIRUVI (soddalashtirilgan)
-        if product.stock < item.quantity:
-            pass 
-            # raise HTTPException(status_code=400, detail=f"{product.name} yetarli emas")
-
-        product.stock -= item.quantity
-        
-        db_item = OrderItem(
-            order_id=db_order.id,
+        # OrderItem lar relationship orqali qo'shiladi -> flush paytida bitta batch INSERT
+        db_order.items.append(OrderItem(
             product_id=product.id,
             quantity=item.quantity,
             buy_price=product.buy_price,   
             sell_price=product.sell_price  
-        )
-        db.add(db_item)
+        ))
         total_price += (product.sell_price * item.quantity)
     
     db_order.total_amount = total_price
     db_order.base_total_amount = total_price
     db_order.final_total_amount = total_price
-    db.commit()
-    db.refresh(db_order)
-    
-    # --- NOTIFICATION START ---
-    try:
-        order_data = {
-            "id": db_order.id,
-            "user_name": user.name,
-            "user_phone": user.phone,
-            "user_address": user.address,
-            "total_amount": total_price
-        }
-        await notify_admins_new_order(order_data)
-    except Exception as e:
-        print(f"Notification Error: {e}")
-    # --- NOTIFICATION END ---
+    db.add(db_order)
+    await db.flush()
+    # Ombor harakatlari jurnali (shu tranzaksiyada)
+    record_reservation(db, reservation, ORDER, order_id=db_order.id)
+    
+    # --- NOTIFICATION (outbox, buyurtma bilan bitta tranzaksiyada) ---
+    order_data = {
+        "id": db_order.id,
+        "user_name": user.name,
+        "user_phone": user.phone,
+        "user_address": user.address,
+        "total_amount": total_price
+    }
+    enqueue_notification(db, "notify_admins_new_order", order_data=order_data)
+    await db.commit()
+    wake_dispatcher()
+    order_events.publish("created", db_order, total_amount=total_price)
 
     return OrderStatusResponse(status="ok", message="Buyurtma muvaffaqiyatli yaratildi")
 
 # Admin uchun GET
 @router.get("/admin/", response_model=List[OrderList], summary="Barcha buyurtmalarni olish (Admin)")
 def get_orders_admin(
+    response: Response,
     status: Optional[str] = None, 
     courier_id: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     limit: int = 5, 
     offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     admin_id: str = Depends(require_admin)
 ):
@@ -222,6 +232,7 @@ def get_orders_admin(
     
     - Faqat qisqacha ma'lumot (OrderList) qaytaradi.
     - Status bo'yicha filtrlash mumkin.
+    - **cursor**: Keyset sahifalash (keyingi sahifa cursori `X-Next-Cursor` headerida qaytadi).
     """
     query = db.query(Order).options(
         joinedload(Order.user),
@@ -242,21 +253,23 @@ def get_orders_admin(
     if courier_id:
         query = query.filter(Order.courier_id == courier_id)
         
-    if start_date:
-        query = query.filter(func.date(Order.created_at) >= start_date)
-    if end_date:
-        query = query.filter(func.date(Order.created_at) <= end_date)
+    query = query.filter(*date_range(Order.created_at, start_date, end_date))
     
-    orders = query.order_by(Order.created_at.desc()).offset(offset).limit(limit).all()
+    orders = paginate_orders(query, cursor, limit, offset).all()
+    next_cursor = next_orders_cursor(orders, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [format_order_list_response(o) for o in orders]
 
 # Kuryer uchun GET
 @router.get("/courier/", response_model=List[OrderRead], summary="Kuryerning o'z buyurtmalarini olish")
 def get_orders_courier(
+    response: Response,
     telegram_id: str,
     status: str = None,
     limit: int = 5,
     offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -264,8 +277,9 @@ def get_orders_courier(
     
     - **telegram_id**: Kuryerning Telegram ID si (Majburiy).
     - To'liq ma'lumot (OrderRead) qaytaradi.
+    - **cursor**: Keyset sahifalash (keyingi sahifa cursori `X-Next-Cursor` headerida qaytadi).
     """
-    courier = db.query(Courier).filter(Courier.telegram_id == telegram_id).first()
+    courier = get_courier_identity(db, telegram_id)
     if not courier:
         raise HTTPException(status_code=404, detail="Kuryer topilmadi")
     
@@ -284,16 +298,21 @@ def get_orders_courier(
         db_status = status_map.get(status.lower().strip(), status)
         query = query.filter(Order.status == db_status)
         
-    orders = query.order_by(Order.created_at.desc()).offset(offset).limit(limit).all()
+    orders = paginate_orders(query, cursor, limit, offset).all()
+    next_cursor = next_orders_cursor(orders, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [format_order_response(o) for o in orders]
 
 # User uchun GET
 @router.get("/user/", response_model=List[OrderRead], summary="Foydalanuvchining o'z buyurtmalarini olish")
 def get_orders_user(
+    response: Response,
     telegram_id: str,
     status: str = None,
     limit: int = 5,
     offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -301,8 +320,9 @@ def get_orders_user(
     
     - **telegram_id**: Foydalanuvchining Telegram ID si (Majburiy).
     - To'liq ma'lumot (OrderRead) qaytaradi.
+    - **cursor**: Keyset sahifalash (keyingi sahifa cursori `X-Next-Cursor` headerida qaytadi).
     """
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = get_user_identity(db, telegram_id)
     if not user:
         raise HTTPException(status_code=404, detail="Foydalanuvchi topilmadi")
     
@@ -321,133 +341,187 @@ def get_orders_user(
         db_status = status_map.get(status.lower().strip(), status)
         query = query.filter(Order.status == db_status)
         
-    orders = query.order_by(Order.created_at.desc()).offset(offset).limit(limit).all()
+    orders = paginate_orders(query, cursor, limit, offset).all()
+    next_cursor = next_orders_cursor(orders, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [format_order_response(o) for o in orders]
 
+# Real-time hodisalar (SSE)
+@router.get("/events/", summary="Buyurtma hodisalari oqimi (SSE)")
+async def stream_order_events(
+    request: Request,
+    courier_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Buyurtma hodisalarini real vaqtda olish (Server-Sent Events).**
+    
+    - Hodisalar: created, assigned, accepted, bonus_added, price_updated, locked, delivered, rated.
+    - **courier_id** / **user_id**: Faqat shu kuryer yoki mijozga tegishli hodisalar.
+    - Har bir hodisada `order_id` va yangi `status` bor - tafsilotlar faqat kerak bo'lganda so'raladi.
+    """
+    async def event_stream():
+        subscription = order_events.subscribe(courier_id=courier_id, user_id=user_id)
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Proxy lar ulanishni uzmasligi uchun keep-alive izoh
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            order_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # 2. Assign Courier
 @router.patch("/{order_id}/assign/", response_model=OrderStatusResponse, summary="Kuryer biriktirish (Admin)")
-async def assign_courier(order_id: int, data: OrderAssign, db: Session = Depends(get_db)):
+async def assign_courier(order_id: int, data: OrderAssign, db: AsyncSession = Depends(get_async_db)):
     """
     **Buyurtmani kuryerga biriktirish.**
     
     - Faqat **Admin** foydalanishi kerak (Frontendda tekshiriladi).
     - Kuryerga va Mijozga Telegram orqali xabar boradi.
     """
-    order = db.query(Order).options(joinedload(Order.user)).filter(Order.id == order_id).first()
+    order = await load_order(db, order_id)
     if not order: raise HTTPException(status_code=404, detail="Topilmadi")
     
-    courier = db.query(Courier).filter(Courier.id == data.courier_id).first()
+    # Yetkazilgan buyurtma kuryer yig'indilariga yozilgan - kuryerni almashtirib bo'lmaydi
+    if order.status == "yetkazildi" or order.rolled_up:
+        raise HTTPException(status_code=400, detail="Yetkazilgan buyurtmaga kuryer biriktirib bo'lmaydi")
+    
+    courier = await db.get(Courier, data.courier_id)
     if not courier: raise HTTPException(status_code=404, detail="Kuryer yo'q")
     
+    previous_courier_id = order.courier_id
     order.courier_id = data.courier_id
     order.assigned_at = datetime.utcnow()
-    db.commit()
-    db.refresh(order)
     
-    # --- NOTIFICATION START ---
-    try:
-        # Kuryerga xabar
-        order_data = {
-            "id": order.id,
-            "user_address": order.user.address,
-            "user_phone": order.user.phone
-        }
-        if courier.telegram_id:
-            await notify_courier_assigned(courier.telegram_id, order_data)
-        
-        # Userga xabar (Admin ko'rdi)
-        if order.user.telegram_id:
-            await notify_user_courier_assigned(order.user.telegram_id, order.id)
-            
-    except Exception as e:
-        print(f"Notification Error: {e}")
-    # --- NOTIFICATION END ---
+    # --- NOTIFICATION (outbox) ---
+    # Kuryerga xabar
+    order_data = {
+        "id": order.id,
+        "user_address": order.user.address,
+        "user_phone": order.user.phone
+    }
+    if courier.telegram_id:
+        enqueue_notification(db, "notify_courier_assigned", courier_telegram_id=courier.telegram_id, order_data=order_data)
+    
+    # Userga xabar (Admin ko'rdi)
+    if order.user.telegram_id:
+        enqueue_notification(db, "notify_user_courier_assigned", user_telegram_id=order.user.telegram_id, order_id=order.id)
+    
+    await db.commit()
+    wake_dispatcher()
+    order_events.publish("assigned", order, previous_courier_id=previous_courier_id)
     
     return OrderStatusResponse(status="ok", message="Kuryer muvaffaqiyatli biriktirildi")
 
 # 3. Accept (Kuryerda)
 @router.patch("/{order_id}/accept/", response_model=OrderStatusResponse, summary="Buyurtmani qabul qilish (Kuryer)")
-async def accept_order(order_id: int, data: OrderAccept, db: Session = Depends(get_db)):
+async def accept_order(order_id: int, data: OrderAccept, db: AsyncSession = Depends(get_async_db)):
     """
     **Kuryer buyurtmani qabul qilishi.**
     
     - **delivery_time**: Yetkazib berish vaqti matn ko'rinishida (masalan: "30 daqiqa").
     - Status **kuryerda** ga o'zgaraadi.
     - Mijozga xabar yuboriladi.
+    - Yetkazilgan buyurtmani qayta qabul qilib bo'lmaydi.
     """
-    order = db.query(Order).options(joinedload(Order.user), joinedload(Order.courier)).filter(Order.id == order_id).first()
+    # deliver_order bilan bir xil qulf: qabul va yetkazish bir-birini kutadi
+    await db.execute(select(Order.id).where(Order.id == order_id).with_for_update())
+    order = await load_order(db, order_id)
     if not order: raise HTTPException(status_code=404, detail="Topilmadi")
     
-    courier = db.query(Courier).filter(Courier.telegram_id == data.courier_telegram_id).first()
+    courier = await aget_courier_identity(db, data.courier_telegram_id)
     if not courier or order.courier_id != courier.id:
         raise HTTPException(status_code=403, detail="Faqat biriktirilgan kuryer buyurtmani qabul qila oladi")
 
+    if order.status == "yetkazildi" or order.rolled_up:
+        raise HTTPException(status_code=400, detail="Yetkazilgan buyurtmani qayta qabul qilib bo'lmaydi")
+
     order.status = "kuryerda" 
     order.delivery_time = data.delivery_time
     order.accepted_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(order)
+    # --- NOTIFICATION (outbox) ---
+    if order.user.telegram_id:
+        c_name = order.courier.name if order.courier else "Kuryer"
+        enqueue_notification(
+            db, "notify_user_courier_accepted",
+            user_telegram_id=order.user.telegram_id,
+            order_id=order.id,
+            delivery_time=data.delivery_time,
+            courier_info=c_name
+        )
     
-    # --- NOTIFICATION START ---
-    try:
-        if order.user.telegram_id:
-            c_name = order.courier.name if order.courier else "Kuryer"
-            await notify_user_courier_accepted(
-                order.user.telegram_id, 
-                order.id, 
-                data.delivery_time, 
-                c_name
-            )
-    except Exception as e:
-        print(f"Notification Error: {e}")
-    # --- NOTIFICATION END ---
+    await db.commit()
+    wake_dispatcher()
+    order_events.publish("accepted", order, delivery_time=order.delivery_time)
 
     return OrderStatusResponse(status="ok", message="Buyurtma qabul qilindi")
 
 # 4. Deliver (Yetkazildi)
 @router.patch("/{order_id}/deliver/", response_model=OrderStatusResponse, summary="Buyurtmani yetkazildi deb belgilash")
-async def deliver_order(order_id: int, data: OrderDeliver, db: Session = Depends(get_db)):
+async def deliver_order(order_id: int, data: OrderDeliver, db: AsyncSession = Depends(get_async_db)):
     """
     **Buyurtma yetkazib berilganda ishlatiladi.**
     
     - Status **yetkazildi** ga o'zgaradi.
     - **delivered_at** vaqti belgilanadi.
     - Admin va Mijozga xabar boradi.
+    - Kunlik savdo yig'indilari shu tranzaksiyada yangilanadi; qayta chaqiruv hech narsani o'zgartirmaydi.
     """
-    order = db.query(Order).options(joinedload(Order.user), joinedload(Order.courier)).filter(Order.id == order_id).first()
+    # Qatorni qulflaymiz: parallel so'rovlar buyurtmani ikki marta hisoblamasligi uchun
+    await db.execute(select(Order.id).where(Order.id == order_id).with_for_update())
+    order = await load_order(db, order_id)
     if not order: raise HTTPException(status_code=404, detail="Topilmadi")
     
-    courier = db.query(Courier).filter(Courier.telegram_id == data.courier_telegram_id).first()
+    courier = await aget_courier_identity(db, data.courier_telegram_id)
     if not courier or order.courier_id != courier.id:
         raise HTTPException(status_code=403, detail="Faqat biriktirilgan kuryer yetkazildi deb belgilay oladi")
 
+    if order.status == "yetkazildi" or order.rolled_up:
+        # Avval yetkazilib, keyin qayta "qabul" qilingan eski buyurtmalar: status tiklanadi, yig'indilarga tegilmaydi
+        if order.status != "yetkazildi":
+            order.status = "yetkazildi"
+            await db.commit()
+        return OrderStatusResponse(status="ok", message="Buyurtma allaqachon yetkazilgan")
+
     if not order.is_price_locked:
         raise HTTPException(status_code=400, detail="Buyurtmani yetkazildi deb belgilashdan avval narxni bloklash (lock-price) shart")
 
     order.status = "yetkazildi" 
     order.delivered_at = datetime.utcnow()
+    await db.flush()
+    await apply_delivery(db, order)
     
-    db.commit()
-    db.refresh(order)
-
-    # --- NOTIFICATION START ---
-    try:
-        if order.user.telegram_id:
-            await notify_user_delivered(order.user.telegram_id, order.id)
-        
-        c_name = order.courier.name if order.courier else "Kuryer"
-        await notify_admin_delivered(order.id, c_name)
-
-    except Exception as e:
-        print(f"Notification Error: {e}")
-    # --- NOTIFICATION END ---
+    # --- NOTIFICATION (outbox) ---
+    if order.user.telegram_id:
+        enqueue_notification(db, "notify_user_delivered", user_telegram_id=order.user.telegram_id, order_id=order.id)
+    
+    c_name = order.courier.name if order.courier else "Kuryer"
+    enqueue_notification(db, "notify_admin_delivered", order_id=order.id, courier_name=c_name)
+    
+    await db.commit()
+    report_cache.bump(SALES, order.delivered_at.date())
+    wake_dispatcher()
+    order_events.publish("delivered", order)
     
     return OrderStatusResponse(status="ok", message="Buyurtma yetkazildi")
 
 # 4.5. Rate Order (Baho berish)
 @router.post("/{order_id}/rate/", response_model=OrderStatusResponse, summary="Buyurtmani baholash")
-async def rate_order(order_id: int, data: OrderRate, db: Session = Depends(get_db)):
+async def rate_order(order_id: int, data: OrderRate, db: AsyncSession = Depends(get_async_db)):
     """
     **Mijoz tomonidan kuryer xizmatini baholash.**
     
@@ -455,7 +529,7 @@ async def rate_order(order_id: int, data: OrderRate, db: Session = Depends(get_d
     - **comment**: Ixtiyoriy izoh.
     - Faqat **yetkazildi** statusidagi buyurtmalar uchun ishlaydi.
     """
-    order = db.query(Order).options(joinedload(Order.user), joinedload(Order.courier)).filter(Order.id == order_id).first()
+    order = await db.get(Order, order_id, with_for_update=True)
     if not order: raise HTTPException(status_code=404, detail="Buyurtma topilmadi")
     
     if order.status != "yetkazildi":
@@ -464,11 +538,14 @@ async def rate_order(order_id: int, data: OrderRate, db: Session = Depends(get_d
     if data.rating < 1 or data.rating > 5:
         raise HTTPException(status_code=400, detail="Baho 1 va 5 oralig'ida bo'lishi kerak")
         
+    previous_rating = order.rating
     order.rating = data.rating
     order.rating_comment = data.comment
+    await apply_rating(db, order, previous_rating)
     
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    report_cache.bump(SALES, order.delivered_at.date() if order.delivered_at else None)
+    order_events.publish("rated", order, rating=order.rating)
     
     return OrderStatusResponse(status="ok", message="Baho muvaffaqiyatli saqlandi")
 
@@ -476,17 +553,13 @@ async def rate_order(order_id: int, data: OrderRate, db: Session = Depends(get_d
 
 # 4.6 Get One Order
 @router.get("/{order_id}/", response_model=OrderRead, summary="Bitta buyurtma haqida ma'lumot")
-def get_order_by_id(order_id: int, db: Session = Depends(get_db)):
+async def get_order_by_id(order_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     **ID orqali buyurtma tafsilotlarini olish.**
     
     Agar buyurtma topilmasa 404 xatolik qaytaradi.
     """
-    order = db.query(Order).options(
-        joinedload(Order.items).joinedload(OrderItem.product),
-        joinedload(Order.user),
-        joinedload(Order.courier)
-    ).filter(Order.id == order_id).first()
+    order = await load_order(db, order_id, with_items=True)
     
     if not order:
         raise HTTPException(status_code=404, detail="Buyurtma topilmadi")
@@ -495,33 +568,35 @@ def get_order_by_id(order_id: int, db: Session = Depends(get_db)):
 
 # 4.7 Add Bonus Items
 @router.post("/{order_id}/bonus/", response_model=OrderRead, summary="Bonus (tekin) mahsulot qo'shish")
-async def add_bonus_items(order_id: int, data: OrderBonus, db: Session = Depends(get_db)):
+async def add_bonus_items(order_id: int, data: OrderBonus, db: AsyncSession = Depends(get_async_db)):
     """
     **Kuryer tomonidan buyurtmaga bonus qo'shish.**
     
     - Faqat **kuryerda** statusida ishlaydi.
     - Mahsulot **narxi 0** deb hisoblanadi (tekin).
-    - Ombor qoldig'i kamayadi, lekin umumiy savdo summasi o'zgarmaydi.
+    - Ombor qoldig'i atomar kamayadi, lekin umumiy savdo summasi o'zgarmaydi.
     """
-    order = db.query(Order).options(joinedload(Order.user), joinedload(Order.courier)).filter(Order.id == order_id).first()
+    order = await load_order(db, order_id)
     if not order: raise HTTPException(status_code=404, detail="Buyurtma topilmadi")
     
-    courier = db.query(Courier).filter(Courier.telegram_id == data.courier_telegram_id).first()
+    courier = await aget_courier_identity(db, data.courier_telegram_id)
     if not courier or order.courier_id != courier.id:
         raise HTTPException(status_code=403, detail="Faqat biriktirilgan kuryer bonus qo'shishi mumkin")
 
     if order.status != "kuryerda":
         raise HTTPException(status_code=400, detail="Faqat kuryerdagi buyurtmalarga bonus qo'shish mumkin")
     
+    reservation = await reserve_stock(db, [(item.product_id, item.quantity) for item in data.items])
+    if not reservation.ok:
+        raise HTTPException(status_code=400, detail=reservation.shortage_message())
+    
+    bonus_list = [order.bonus_description] if order.bonus_description else []
     for item in data.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if not product:
+        product = reservation.products.get(item.product_id)
+        if not product or item.quantity <= 0:
             continue
-            
-        if product.stock < item.quantity:
-             raise HTTPException(status_code=400, detail=f"{product.name} yetarli emas (Mavjud: {product.stock})")
         
-        product.stock -= item.quantity
+        bonus_list.append(f"{product.name} ({item.quantity})")
         
         db_item = OrderItem(
             order_id=order.id,
@@ -533,13 +608,21 @@ async def add_bonus_items(order_id: int, data: OrderBonus, db: Session = Depends
         )
         db.add(db_item)
     
-    db.commit()
-    db.refresh(order)
+    record_reservation(db, reservation, BONUS, order_id=order.id)
+    
+    # Admin ro'yxati uchun bonus xulosasini yangilaymiz
+    if bonus_list:
+        order.has_bonus = True
+        order.bonus_description = ", ".join(bonus_list)
+    
+    await db.commit()
+    order = await load_order(db, order_id, with_items=True)
+    order_events.publish("bonus_added", order, bonus_description=order.bonus_description)
     
     return format_order_response(order)
 
 @router.patch("/{order_id}/update-price/", response_model=OrderRead, summary="Buyurtma narxini o'zgartirish (Kuryer)")
-async def update_order_price(order_id: int, data: OrderPriceUpdate, db: Session = Depends(get_db)):
+async def update_order_price(order_id: int, data: OrderPriceUpdate, db: AsyncSession = Depends(get_async_db)):
     """
     **Kuryer tomonidan buyurtma narxini o'zgartirish.**
     
@@ -547,13 +630,13 @@ async def update_order_price(order_id: int, data: OrderPriceUpdate, db: Session
     - Narx bloklanmagan (locked) bo'lishi kerak.
     - Har bir o'zgarish loglanadi.
     """
-    order = db.query(Order).options(joinedload(Order.user), joinedload(Order.courier)).filter(Order.id == order_id).first()
+    order = await load_order(db, order_id, with_items=True)
     if not order: raise HTTPException(status_code=404, detail="Buyurtma topilmadi")
     
     if order.is_price_locked:
         raise HTTPException(status_code=400, detail="Narx bloklangan, uni o'zgartirib bo'lmaydi")
     
-    courier = db.query(Courier).filter(Courier.telegram_id == data.courier_telegram_id).first()
+    courier = await aget_courier_identity(db, data.courier_telegram_id)
     if not courier or order.courier_id != courier.id:
         raise HTTPException(status_code=403, detail="Faqat biriktirilgan kuryer narxni o'zgartira oladi")
     
@@ -567,40 +650,43 @@ async def update_order_price(order_id: int, data: OrderPriceUpdate, db: Session
     db.add(history)
     
     order.final_total_amount = data.new_price
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    order_events.publish("price_updated", order, final_total_amount=order.final_total_amount)
     
     return format_order_response(order)
 
 @router.patch("/{order_id}/lock-price/", response_model=OrderRead, summary="Buyurtma narxini bloklash (Kuryer)")
-async def lock_order_price(order_id: int, data: OrderLock, db: Session = Depends(get_db)):
+async def lock_order_price(order_id: int, data: OrderLock, db: AsyncSession = Depends(get_async_db)):
     """
     **Kuryer tomonidan buyurtma narxini yakuniy deb bloklash.**
     
     - Bloklangandan keyin narxni o'zgartirib bo'lmaydi.
     - Bu narx moliya tizimi uchun asosiy manba hisoblanadi.
     """
-    order = db.query(Order).options(joinedload(Order.user), joinedload(Order.courier)).filter(Order.id == order_id).first()
+    order = await load_order(db, order_id, with_items=True)
     if not order: raise HTTPException(status_code=404, detail="Buyurtma topilmadi")
     
-    courier = db.query(Courier).filter(Courier.telegram_id == data.courier_telegram_id).first()
+    courier = await aget_courier_identity(db, data.courier_telegram_id)
     if not courier or order.courier_id != courier.id:
         raise HTTPException(status_code=403, detail="Faqat biriktirilgan kuryer narxni bloklay oladi")
     
     order.is_price_locked = True
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    report_cache.bump(SALES, datetime.utcnow().date())
+    order_events.publish("locked", order, final_total_amount=order.final_total_amount)
     
     return format_order_response(order)
 
 @router.get("/courier/{courier_id}/history/", response_model=List[OrderCourierHistory], summary="Kuryer buyurtmalar tarixi (Admin)")
 def get_courier_orders_history(
     courier_id: int,
+    response: Response,
     status: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     limit: int = 10,
     offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     admin_id: str = Depends(require_admin)
 ):
@@ -613,18 +699,20 @@ def get_courier_orders_history(
     - delivered_at
     - rating
     - rating_comment
+    
+    **cursor** berilsa keyset sahifalash ishlaydi (keyingi cursor `X-Next-Cursor` headerida).
     """
     query = db.query(Order).options(joinedload(Order.user)).filter(Order.courier_id == courier_id)
     
     if status:
         query = query.filter(Order.status == status)
         
-    if start_date:
-        query = query.filter(func.date(Order.created_at) >= start_date)
-    if end_date:
-        query = query.filter(func.date(Order.created_at) <= end_date)
+    query = query.filter(*date_range(Order.created_at, start_date, end_date))
         
-    orders = query.order_by(Order.created_at.desc()).offset(offset).limit(limit).all()
+    orders = paginate_orders(query, cursor, limit, offset).all()
+    next_cursor = next_orders_cursor(orders, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     return [
         OrderCourierHistory(
@@ -1,12 +1,21 @@
+from datetime import date, datetime, timedelta
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, Response
 from sqlalchemy.orm import Session
 # from app.utils.google_drive import upload_file_to_drive # Endi kerak emas
 
 from app.database import SessionLocal
 from app.models import Product
-from app.schemas.product import ProductUserRead, ProductAdminRead, ProductStockUpdate
+from app.schemas.product import (
+    ProductUserRead, ProductAdminRead, ProductStockUpdate,
+    ProductStockAt, InventoryReport, InventoryReportRow, ProductBulkResult
+)
 from app.dependencies import require_admin
+from app.utils.cache import report_cache, NAMES
+from app.utils.catalog import catalog_cache
+from app.utils.inventory import record_movement, stock_at, movement_totals, INITIAL, RESTOCK, ADJUSTMENT
+from app.utils.dates import day_start
+from app.utils.product_import import run_bulk
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
@@ -46,7 +55,10 @@ def create_product(
             image=image # To'g'ridan-to'g'ri URL ni yozamiz
         )
         db.add(db_product)
+        db.flush()
+        record_movement(db, db_product.id, stock, INITIAL, stock_after=stock)
         db.commit()
+        catalog_cache.invalidate()
         db.refresh(db_product)
         return db_product
     except Exception as e:
@@ -72,20 +84,25 @@ def update_product(
     
     - Faqat yuborilgan maydonlar o'zgaradi.
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    # Qator qulflanadi: qoldiq farqi (adjustment) parallel buyurtmalar bilan to'g'ri hisoblanishi uchun
+    product = db.query(Product).filter(Product.id == product_id).with_for_update().first()
     if not product:
         raise HTTPException(status_code=404, detail="Mahsulot topilmadi")
 
     if name: product.name = name
     if buy_price is not None: product.buy_price = buy_price
     if sell_price is not None: product.sell_price = sell_price
-    if stock is not None: product.stock = stock
+    if stock is not None:
+        record_movement(db, product.id, stock - (product.stock or 0), ADJUSTMENT, stock_after=stock)
+        product.stock = stock
     if status: product.status = status
 
     if image:
         product.image = image # To'g'ridan-to'g'ri yangilaymiz
 
     db.commit()
+    catalog_cache.invalidate()
+    if name: report_cache.bump(NAMES)  # Hisobotlardagi mahsulot nomi
     db.refresh(product)
     return product
 
@@ -103,7 +120,7 @@ def add_product_stock(
     - **quantity**: Qo'shilayotgan tovar soni.
     - Avtomatik ravishda eski qoldiqqa qo'shiladi.
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.query(Product).filter(Product.id == product_id).with_for_update().first()
     if not product:
         raise HTTPException(status_code=404, detail="Mahsulot topilmadi")
     
@@ -111,19 +128,61 @@ def add_product_stock(
         raise HTTPException(status_code=400, detail="Miqdor musbat bo'lishi kerak")
 
     product.stock += stock_update.quantity
+    record_movement(db, product.id, stock_update.quantity, RESTOCK, stock_after=product.stock)
     db.commit()
+    catalog_cache.invalidate()
     db.refresh(product)
     return product
 
+# BULK (CSV / JSON)
+@router.post("/admin/bulk/", response_model=ProductBulkResult, summary="Mahsulotlarni ommaviy yaratish/yangilash (Admin)")
+def bulk_upsert_products(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Mavsum oldidan narxlar va prihodlarni bitta fayl bilan kiritish.**
+    
+    - **file**: CSV (sarlavha: id,name,buy_price,sell_price,quantity,image,status) yoki JSON (obyektlar ro'yxati).
+    - `id` bo'lsa - faqat yuborilgan maydonlar o'zgaradi, `quantity` qoldiqqa **qo'shiladi** (prihod).
+    - `id` bo'lmasa - yangi mahsulot (`name`, `buy_price`, `sell_price` majburiy), `quantity` - boshlang'ich qoldiq.
+    - Hammasi bitta tranzaksiyada; har bir qator natijasi `rows` da (`created`, `updated`, `unchanged`, `error`).
+    """
+    try:
+        result, names_changed = run_bulk(db, file.file, file.filename or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Faylni o'qib bo'lmadi: {e}")
+    except Exception as e:
+        print(f"Database Error: {e}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database xatosi: {str(e)}")
+
+    if result.created or result.updated:
+        catalog_cache.invalidate()
+    if names_changed:
+        report_cache.bump(NAMES)  # Hisobotlardagi mahsulot nomi
+    return result
+
 # GET (List)
 @router.get("/", response_model=List[ProductUserRead], summary="Mahsulotlar ro'yxati (Katalog)")
-def get_products(db: Session = Depends(get_db)):
+def get_products(request: Request, db: Session = Depends(get_db)):
     """
     **Aktiv statusdagi barcha mahsulotlarni olish (Faqat Userlar uchun).**
     
     - Faqat `name`, `price`, `image` qaytadi.
+    - Javob xotiradagi tayyor nusxadan beriladi (mahsulot o'zgargandagina qayta quriladi).
+    - `ETag` qaytadi: `If-None-Match` bilan so'ralsa va katalog o'zgarmagan bo'lsa - **304**.
     """
-    return db.query(Product).filter(Product.status == "active").all()
+    snapshot = catalog_cache.get(db)
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and snapshot.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 # GET (Admin List)
 @router.get("/admin/", response_model=List[ProductAdminRead], summary="Mahsulotlar ro'yxati (Admin)")
@@ -136,6 +195,62 @@ def get_admin_products(
     """
     return db.query(Product).all()
 
+# GET (Inventory report)
+@router.get("/admin/inventory/report/", response_model=InventoryReport, summary="Ombor harakatlari hisoboti (Admin)")
+def get_inventory_report(
+    start_date: date,
+    end_date: date,
+    db: Session = Depends(get_db),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Davr boshidagi va oxiridagi qoldiq hamda sabab bo'yicha harakatlar (Admin).**
+    
+    - Qoldiqlar eng yaqin nusxa + undan keyingi harakatlardan hisoblanadi (butun tarix qayta o'qilmaydi).
+    - `movements`: `order`, `bonus`, `restock`, `adjustment`, `initial` bo'yicha jami o'zgarish.
+    """
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date start_date dan oldin bo'lishi mumkin emas")
+
+    start = day_start(start_date)
+    end = day_start(end_date + timedelta(days=1))
+    opening = stock_at(db, start)
+    closing = stock_at(db, end)
+    totals = movement_totals(db, start, end)
+
+    rows = []
+    for product in db.query(Product).order_by(Product.id).all():
+        rows.append(InventoryReportRow(
+            product_id=product.id,
+            name=product.name,
+            opening_stock=opening.get(product.id, (0, None))[0],
+            movements=totals.get(product.id, {}),
+            closing_stock=closing.get(product.id, (0, None))[0],
+            current_stock=product.stock or 0
+        ))
+    return InventoryReport(start_date=start_date, end_date=end_date, products=rows)
+
+# GET (Stock at)
+@router.get("/admin/{product_id}/stock-at/", response_model=ProductStockAt, summary="Berilgan vaqtdagi qoldiq (Admin)")
+def get_product_stock_at(
+    product_id: int,
+    at: datetime = Query(..., description="Vaqt (UTC)"),
+    db: Session = Depends(get_db),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Mahsulotning berilgan vaqtdagi qoldig'i (Admin).**
+    
+    - Eng yaqin nusxa + undan keyingi harakatlar orqali hisoblanadi.
+    """
+    if at.tzinfo is not None:
+        at = at.replace(tzinfo=None) - (at.utcoffset() or timedelta(0))
+    result = stock_at(db, at, product_id=product_id)
+    if product_id not in result:
+        raise HTTPException(status_code=404, detail="Mahsulot topilmadi")
+    stock, snapshot_taken_at = result[product_id]
+    return ProductStockAt(product_id=product_id, at=at, stock=stock, snapshot_taken_at=snapshot_taken_at)
+
 # GET (Detail)
 @router.get("/{product_id}/", response_model=ProductUserRead, summary="Mahsulot tafsilotlari")
 def get_product_by_id(product_id: int, db: Session = Depends(get_db)):
@@ -180,6 +295,7 @@ def delete_product(product_id: int, db: Session = Depends(get_db), admin_id: str
     # DB status
     product.status = "deleted"
     db.commit()
+    catalog_cache.invalidate()
     return {"message": "O'chirildi"}
 
 
@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, status
+from sqlalchemy import exists, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app.models import User
-from app.schemas.user import UserCreate, UserRead, UserUpdate, UserShort, UserStats
+from app.schemas.user import UserCreate, UserRead, UserUpdate, UserShort, UserStats, UserImportResult
 from app.dependencies import require_admin # Admin tekshiruvi
+from app.utils.cache import report_cache, USERS
+from app.utils.identity import get_user_identity, invalidate_user
+from app.utils.search import normalize_phone, search_users as run_user_search
+from app.utils.user_counters import (
+    count_users, read_user_counters, recompute_user_counters, adjust_user_counters,
+    transition_deltas, created_user_deltas
+)
+from app.utils.user_import import run_import
+from app.config import USER_COUNTERS_ENABLED
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -21,16 +32,58 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     **Yangi foydalanuvchi yaratish (Bot /start).**
     
     Agar foydalanuvchi avvaldan bor bo'lsa, eskisini qaytaradi.
+    - Bitta so'rov: `WITH ins AS (INSERT ... ON CONFLICT (telegram_id) DO NOTHING RETURNING *)`
+      `SELECT * FROM ins UNION ALL SELECT * FROM users WHERE telegram_id = :tid AND NOT EXISTS (SELECT 1 FROM ins)`.
+    - Mavjud foydalanuvchi qayta yozilmaydi (dead tuple / WAL yo'q).
+    - Parallel /start bosilganda ham xato bermaydi (ikkinchisi mavjud yozuvni oladi).
     """
-    db_user = db.query(User).filter(User.telegram_id == user.telegram_id).first()
-    if db_user:
-        return db_user # Agar bor bo'lsa, o'shani qaytarib beramiz
-        
-    new_user = User(**user.model_dump())
-    db.add(new_user)
+    users = User.__table__
+    ins = pg_insert(User).values(
+        **user.model_dump(), phone_digits=normalize_phone(user.phone)
+    ).on_conflict_do_nothing(index_elements=[User.telegram_id]).returning(*users.c).cte("ins")
+    stmt = select(*ins.c, literal(True).label("inserted")).union_all(
+        select(*users.c, literal(False).label("inserted")).where(
+            User.telegram_id == user.telegram_id,
+            ~exists(select(ins.c.id))
+        )
+    )
+    
+    row = db.execute(stmt).first()
+    if row is None:
+        # Parallel /start: konflikt qilgan qator so'rov snapshotidan keyin commit bo'lgan -
+        # yangi snapshot bilan qayta yuborilganda u ko'rinadi
+        row = db.execute(stmt).one()
+    if not row.inserted:
+        return row._mapping
+    
+    adjust_user_counters(db, created_user_deltas(row))
     db.commit()
-    db.refresh(new_user)
-    return new_user
+    report_cache.bump(USERS)
+    invalidate_user(row.telegram_id)
+    return row._mapping
+
+@router.post("/import/", response_model=UserImportResult, summary="Foydalanuvchilarni fayldan import qilish (Admin)")
+def import_users_file(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    **Eski tizimdan mijozlar bazasini ko'chirish.**
+    
+    - **file**: CSV (sarlavha: telegram_id,name,phone,address[,user_type]) yoki JSON (obyektlar ro'yxati).
+    - Partiyalab `INSERT ... ON CONFLICT DO NOTHING` bilan bitta tranzaksiyada yoziladi.
+    - Bazada bor telegram_id lar o'zgarmaydi; noto'g'ri qatorlar `errors` da qaytadi.
+    """
+    try:
+        result = run_import(db, file.file, file.filename or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Faylni o'qib bo'lmadi: {e}")
+    
+    if result.inserted:
+        recompute_user_counters(db)
+        report_cache.bump(USERS)
+    return result
 
 # 2. Get My Profile (Telegram ID orqali)
 @router.get("/me/{telegram_id}/", response_model=UserRead, summary="Mening profilim")
@@ -38,7 +91,7 @@ def get_my_profile(telegram_id: str, db: Session = Depends(get_db)):
     """
     **Telegram ID orqali foydalanuvchi ma'lumotlarini olish.**
     """
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = get_user_identity(db, telegram_id)
     if not user:
         raise HTTPException(status_code=404, detail="Foydalanuvchi topilmadi")
     
@@ -65,10 +118,13 @@ def update_my_profile(telegram_id: str, user_update: UserUpdate, db: Session = D
 
     # Kelgan ma'lumotlarni yangilash
     if user_update.name: db_user.name = user_update.name
-    if user_update.phone: db_user.phone = user_update.phone
+    if user_update.phone:
+        db_user.phone = user_update.phone
+        db_user.phone_digits = normalize_phone(user_update.phone)
     if user_update.address: db_user.address = user_update.address
     
     db.commit()
+    invalidate_user(db_user.telegram_id)
     db.refresh(db_user)
     return db_user
 
@@ -78,12 +134,15 @@ def block_user(user_id: int, db: Session = Depends(get_db), admin_id: str = Depe
     """
     **Foydalanuvchini qora ro'yxatga olish.**
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.query(User).filter(User.id == user_id).with_for_update().first()
     if not user:
         raise HTTPException(status_code=404, detail="Foydalanuvchi topilmadi")
     
+    adjust_user_counters(db, transition_deltas(user.status, "blocked"))
     user.status = "blocked"
     db.commit()
+    report_cache.bump(USERS)
+    invalidate_user(user.telegram_id)
     return {"message": f"Foydalanuvchi {user.name} bloklandi"}
 
 # 5. Userni blokdan chiqarish (Faqat Admin)
@@ -92,12 +151,15 @@ def unblock_user(user_id: int, db: Session = Depends(get_db), admin_id: str = De
     """
     **Foydalanuvchini faollashtirish.**
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.query(User).filter(User.id == user_id).with_for_update().first()
     if not user:
         raise HTTPException(status_code=404, detail="Foydalanuvchi topilmadi")
     
+    adjust_user_counters(db, transition_deltas(user.status, "active"))
     user.status = "active"
     db.commit()
+    report_cache.bump(USERS)
+    invalidate_user(user.telegram_id)
     return {"message": f"Foydalanuvchi {user.name} faollashtirildi"}
 
 @router.get("/", response_model=list[UserRead], summary="Barcha foydalanuvchilar (Admin)")
@@ -128,6 +190,8 @@ def get_all_users(
 @router.get("/search/", response_model=list[UserRead], summary="Foydalanuvchilarni qidirish (Admin)")
 def search_users(
     query: str, 
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db), 
     admin_id: str = Depends(require_admin)
 ):
@@ -135,11 +199,11 @@ def search_users(
     **Foydalanuvchilarni ismi yoki telefoni orqali qidirish.**
     
     Barcha user ma'lumotlarini qaytaradi.
+    - Telefon istalgan formatda yozilishi mumkin ("+998 90 123", "90123"); 3 va undan ko'p raqam
+      istalgan qismi bo'yicha, 1-2 raqam esa boshidan topiladi (ism uchun ham xuddi shunday).
+    - Natijalar mosligi bo'yicha tartiblanadi; **limit** / **offset** bilan sahifalanadi.
     """
-    users = db.query(User).filter(
-        (User.name.ilike(f"%{query}%")) | (User.phone.ilike(f"%{query}%"))
-    ).limit(10).all()
-    return users
+    return run_user_search(db, query, limit=limit, offset=offset)
 
 @router.get("/stats/", response_model=UserStats, summary="Foydalanuvchilar statistikasi (Admin)")
 def get_user_stats(
@@ -154,18 +218,18 @@ def get_user_stats(
     - active_count: Faol
     - blocked_count: Bloklangan
     """
-    total = db.query(User).count()
-    active = db.query(User).filter(User.status == "active").count()
-    blocked = db.query(User).filter(User.status == "blocked").count()
-    standard = db.query(User).filter(User.user_type == "standard").count()
-    maxsus = db.query(User).filter(User.user_type == "maxsus").count()
+    return report_cache.get_or_compute("users.stats", (), (USERS,), lambda: compute_user_stats(db))
+
+def compute_user_stats(db: Session) -> UserStats:
+    # O(1): tayyor hisoblagichlar; o'chirilgan bo'lsa - bitta COUNT(*) FILTER so'rovi
+    counts = read_user_counters(db) if USER_COUNTERS_ENABLED else count_users(db)
     
     return UserStats(
-        total_count=total,
-        active_count=active,
-        blocked_count=blocked,
-        standard_count=standard,
-        maxsus_count=maxsus
+        total_count=counts["total"],
+        active_count=counts["active"],
+        blocked_count=counts["blocked"],
+        standard_count=counts["standard"],
+        maxsus_count=counts["maxsus"]
     )
 
 @router.get("/{user_id}/", response_model=UserRead, summary="Bitta foydalanuvchi ma'lumotlari (Admin)")
@@ -187,12 +251,15 @@ def set_user_standard(user_id: int, db: Session = Depends(get_db), admin_id: str
     """
     **Foydalanuvchi turini 'standard' (oddiy) qilish.**
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.query(User).filter(User.id == user_id).with_for_update().first()
     if not user:
         raise HTTPException(status_code=404, detail="Foydalanuvchi topilmadi")
     
+    adjust_user_counters(db, transition_deltas(user.user_type, "standard"))
     user.user_type = "standard"
     db.commit()
+    report_cache.bump(USERS)
+    invalidate_user(user.telegram_id)
     db.refresh(user)
     return user
 
@@ -201,12 +268,15 @@ def set_user_maxsus(user_id: int, db: Session = Depends(get_db), admin_id: str =
     """
     **Foydalanuvchi turini 'maxsus' (maxsus) qilish.**
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.query(User).filter(User.id == user_id).with_for_update().first()
     if not user:
         raise HTTPException(status_code=404, detail="Foydalanuvchi topilmadi")
     
+    adjust_user_counters(db, transition_deltas(user.user_type, "maxsus"))
     user.user_type = "maxsus"
     db.commit()
+    report_cache.bump(USERS)
+    invalidate_user(user.telegram_id)
     db.refresh(user)
     return user
 
@@ -47,4 +47,13 @@ class CourierStats(BaseModel):
     
     total_delivered_orders: int # Nechta buyurtma yetkazdi
     total_money_collected: float # Qancha summa yig'di (savdo)
-    average_rating: float = 0.0 # O'rtacha baho
\ No newline at end of file
+    average_rating: float = 0.0 # O'rtacha baho
+
+class CourierLeaderboardRow(BaseModel):
+    courier_id: int
+    courier_name: str
+    delivered_orders: int
+    revenue: float
+    average_rating: float = 0.0
+    rating_count: int = 0
+    avg_delivery_minutes: Optional[float] = None # Biriktirishdan yetkazishgacha o'rtacha vaqt
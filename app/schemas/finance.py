@@ -24,6 +24,15 @@ class SalaryPaymentCreate(BaseModel):
     start_date: date
     end_date: date
 
+class SalaryBatchItem(BaseModel):
+    courier_id: int
+    amount: float
+
+class SalaryBatchPaymentCreate(BaseModel):
+    start_date: date
+    end_date: date
+    payments: List[SalaryBatchItem]
+
 class SalaryPaymentRead(BaseModel):
     id: int
     courier_name: str
@@ -51,7 +60,7 @@ class ExpenseRead(ExpenseCreate):
 
 # Har bir mahsulot bo'yicha hisobot
 class ProductPerformance(BaseModel):
-    product_id: int
+    product_id: Optional[int]  # None - mahsuloti o'chirilgan qatorlar
     product_name: str
     sold_quantity: int      # Nechta sotildi
     total_revenue: float    # Jami savdo (Sotish narxi * soni)
@@ -74,4 +83,15 @@ class ProfitStats(BaseModel):
     sold_items_count: int
     
     # Mahsulotlar kesimida
-    products_breakdown: List[ProductPerformance]
\ No newline at end of file
+    products_breakdown: List[ProductPerformance]
+# Grafiklar uchun vaqt bo'yicha qatorlar (kun / hafta / oy)
+class FinanceSeriesPoint(BaseModel):
+    period_start: date      # Bo'lak boshi (hafta - dushanba, oy - 1-sana)
+    revenue: float
+    cogs: float
+    gross_profit: float
+    orders_count: int
+    items_count: int
+    total_salaries: float
+    total_expenses: float
+    net_profit: float
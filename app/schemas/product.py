@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
+from datetime import date, datetime
 
 class ProductBase(BaseModel):
     name: str
@@ -42,3 +43,44 @@ class ProductAdminRead(ProductBase):
 class ProductStockUpdate(BaseModel):
     quantity: int
 
+class ProductStockAt(BaseModel):
+    product_id: int
+    at: datetime
+    stock: int
+    snapshot_taken_at: Optional[datetime] = None  # Hisob uchun ishlatilgan nusxa
+
+class InventoryReportRow(BaseModel):
+    product_id: int
+    name: str
+    opening_stock: int               # start_date boshidagi qoldiq
+    movements: Dict[str, int] = {}   # Sabab bo'yicha: {"order": -12, "restock": 50, ...}
+    closing_stock: int               # end_date oxiridagi qoldiq
+    current_stock: int
+
+class InventoryReport(BaseModel):
+    start_date: date
+    end_date: date
+    products: List[InventoryReportRow]
+
+class ProductBulkRow(BaseModel):
+    id: Optional[int] = None          # Bo'lsa - mavjud mahsulot yangilanadi, bo'lmasa - yangisi yaratiladi
+    name: Optional[str] = None
+    buy_price: Optional[float] = None
+    sell_price: Optional[float] = None
+    quantity: Optional[int] = None    # Yangi mahsulot: boshlang'ich qoldiq; mavjud: prihod (qo'shiladi)
+    image: Optional[str] = None
+    status: Optional[str] = None
+
+class ProductBulkRowResult(BaseModel):
+    row: int                          # Fayldagi qator raqami (1 dan)
+    result: str                       # created | updated | unchanged | error
+    product_id: Optional[int] = None
+    message: Optional[str] = None
+
+class ProductBulkResult(BaseModel):
+    received: int
+    created: int
+    updated: int
+    unchanged: int
+    failed: int
+    rows: List[ProductBulkRowResult]
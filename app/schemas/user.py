@@ -47,4 +47,10 @@ class UserListResponse(BaseModel):
     standard_count: int
     maxsus_count: int
     limit: int
-    users: List[UserRead]
\ No newline at end of file
+    users: List[UserRead]
+
+class UserImportResult(BaseModel):
+    received: int            # Fayldagi qatorlar soni
+    inserted: int            # Yangi qo'shilganlar
+    skipped_existing: int    # telegram_id bazada (yoki faylda) avvaldan bor
+    errors: List[str] = []   # Noto'g'ri qatorlar ("3-qator: ...")
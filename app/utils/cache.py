@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Iterable, Optional
+
+from app.config import REPORT_CACHE_MAX_ENTRIES
+
+# Domenlar: hisobotlar qaysi ma'lumotlarga bog'liqligini bildiradi
+SALES = "sales"        # Yetkazish, baholash, narx bloklash, yig'indilarni qayta hisoblash
+FINANCE = "finance"    # Xarajatlar va oylik to'lovlari
+USERS = "users"        # Foydalanuvchilar soni/holati
+NAMES = "names"        # Hisobotda ko'rinadigan mahsulot/kuryer nomlari
+
+
+class ReportCache:
+    """
+    Hisobot javoblari uchun versiyali LRU kesh (jarayon ichida).
+
+    Har bir domen uchun ikkita hisoblagich bor:
+    - `live`: domendagi har qanday yozuvda oshadi.
+    - `history`: faqat o'tgan kunlarga ta'sir qiladigan yozuvda oshadi
+      (baho, o'chirish, qayta hisoblash). Bugungi yetkazish/xarajat uni o'zgartirmaydi.
+
+    end_date bugundan oldin bo'lgan (yopilgan) davr hisobotlari `history` versiyasi
+    bilan saqlanadi, shuning uchun kundalik ish ularni keshdan chiqarmaydi.
+    Eskirgan versiyadagi yozuvlar o'qilmaydi va LRU bo'yicha chiqib ketadi.
+
+    Sinxron endpointlar threadpool da ishlaydi - shuning uchun threading.Lock.
+    API bitta jarayonda ishlaydi (railway.json); yozuvlar boshqa jarayondan
+    qilinsa (masalan CLI orqali rebuild), `clear()` yoki restart kerak.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._live: dict = {}
+        self._history: dict = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def bump(self, domain: str, day: Optional[date] = None):
+        """
+        Domen versiyasini oshirish. `day` - yozuv ta'sir qilgan kun (UTC).
+
+        `day` berilmasa yoki bugundan oldingi kun bo'lsa, yopilgan davrlar ham eskiradi.
+        """
+        with self._lock:
+            self._live[domain] = self._live.get(domain, 0) + 1
+            if day is None or day < datetime.utcnow().date():
+                self._history[domain] = self._history.get(domain, 0) + 1
+
+    def clear(self):
+        """Barcha domenlarni eskirtirish (factory reset, qayta hisoblash)"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def _versions(self, domains: Iterable[str], end_date: Optional[date]) -> tuple:
+        closed = end_date is not None and end_date < datetime.utcnow().date()
+        counters = self._history if closed else self._live
+        return ("history" if closed else "live", self._epoch) + tuple(counters.get(d, 0) for d in domains)
+
+    def get_or_compute(
+        self,
+        name: str,
+        params: tuple,
+        domains: Iterable[str],
+        compute: Callable,
+        end_date: Optional[date] = None
+    ):
+        """
+        Keshdan olish yoki `compute()` ni chaqirib saqlash.
+
+        Versiyalar hisoblashdan OLDIN olinadi: hisoblash davomida yozuv bo'lsa,
+        natija eski versiya kaliti bilan saqlanadi va keyingi so'rov uni ishlatmaydi.
+        """
+        domains = tuple(domains)
+        with self._lock:
+            key = (name, params, self._versions(domains, end_date))
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+report_cache = ReportCache(REPORT_CACHE_MAX_ENTRIES)
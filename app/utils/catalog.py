@@ -0,0 +1,65 @@
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from app.models import Product
+from app.schemas.product import ProductUserRead
+
+_catalog_adapter = TypeAdapter(List[ProductUserRead])
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    body: bytes   # Tayyor JSON (har so'rovda Pydantic qayta ishlamaydi)
+    etag: str     # Kontent xeshi: o'zgarishsiz qayta qurilsa ham ETag o'zgarmaydi
+
+
+class CatalogCache:
+    """
+    Foydalanuvchi katalogi (GET /products/) uchun xotiradagi tayyor nusxa.
+
+    - Mahsulot yaratish/tahrirlash/prihod/o'chirishda `invalidate()` chaqiriladi,
+      nusxa keyingi so'rovda bir marta qayta quriladi.
+    - Qurish vaqtida invalidate bo'lsa, versiya mos kelmaydi va keyingi so'rov yana quradi.
+    """
+
+    def __init__(self):
+        self._version = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+
+        with self._lock:
+            version = self._version
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+
+        products = db.query(Product).filter(Product.status == "active").order_by(Product.id).all()
+        body = _catalog_adapter.dump_json(_catalog_adapter.validate_python(products, from_attributes=True))
+        snapshot = CatalogSnapshot(
+            version=version,
+            body=body,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        )
+
+        with self._lock:
+            if version == self._version:
+                self._snapshot = snapshot
+        return snapshot
+
+
+catalog_cache = CatalogCache()
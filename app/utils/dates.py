@@ -0,0 +1,32 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+
+def day_start(day: date) -> datetime:
+    """Kun boshi (00:00:00)"""
+    return datetime.combine(day, time.min)
+
+
+def date_range(column, start_date: Optional[date] = None, end_date: Optional[date] = None) -> list:
+    """
+    Sana oralig'i uchun indeksga mos shartlar: [start_date 00:00, end_date + 1 kun 00:00).
+
+    `func.date(column) BETWEEN ...` ustunni funksiyaga o'raydi va indeksdan foydalanib bo'lmaydi,
+    yarim ochiq oraliq esa xuddi shu natijani indeks orqali beradi.
+    """
+    conditions = []
+    if start_date:
+        conditions.append(column >= day_start(start_date))
+    if end_date:
+        conditions.append(column < day_start(end_date + timedelta(days=1)))
+    return conditions
+
+
+def day_range(column, start_date: Optional[date] = None, end_date: Optional[date] = None) -> list:
+    """Date (kun) ustunlari uchun yopiq oraliq: start_date <= column <= end_date"""
+    conditions = []
+    if start_date:
+        conditions.append(column >= start_date)
+    if end_date:
+        conditions.append(column <= end_date)
+    return conditions
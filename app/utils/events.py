@@ -0,0 +1,70 @@
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Optional
+
+
+class OrderEventSubscription:
+    """Bitta SSE ulanishi: filtr + chegaralangan navbat"""
+    QUEUE_SIZE = 100
+
+    def __init__(self, courier_id: Optional[int] = None, user_id: Optional[int] = None):
+        self.courier_id = courier_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+
+    def matches(self, event: dict) -> bool:
+        if self.courier_id is not None and self.courier_id not in (event.get("courier_id"), event.get("previous_courier_id")):
+            return False
+        if self.user_id is not None and event.get("user_id") != self.user_id:
+            return False
+        return True
+
+    def offer(self, event: dict):
+        if not self.matches(event):
+            return
+        # Sekin mijoz boshqalarni to'xtatmasligi uchun eng eski hodisa tashlab yuboriladi
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+
+class OrderEventBroker:
+    """
+    Buyurtma hodisalarini obunachilarga tarqatish (jarayon ichida).
+
+    Hodisalar orders.py dagi o'sha endpointlardan commit dan keyin yuboriladi.
+    Event loop ichidan chaqiriladi.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, courier_id: Optional[int] = None, user_id: Optional[int] = None) -> OrderEventSubscription:
+        subscription = OrderEventSubscription(courier_id=courier_id, user_id=user_id)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: OrderEventSubscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, event_type: str, order, **extra):
+        event = {
+            "id": next(self._ids),
+            "event": event_type,
+            "order_id": order.id,
+            "status": order.status,
+            "user_id": order.user_id,
+            "courier_id": order.courier_id,
+            "at": datetime.utcnow().isoformat(),
+            **extra
+        }
+        for subscription in list(self._subscribers):
+            subscription.offer(event)
+
+
+order_events = OrderEventBroker()
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+from app.config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+MAX_KEY_LENGTH = 255
+
+
+class CachedResponse:
+    __slots__ = ("status_code", "headers", "body", "body_hash", "expires_at")
+
+    def __init__(self, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes, body_hash: str, expires_at: float):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.body_hash = body_hash
+        self.expires_at = expires_at
+
+    async def replay(self, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.headers + [(REPLAYED_HEADER.lower().encode(), b"true")]
+        })
+        await send({"type": "http.response.body", "body": self.body})
+
+
+class IdempotencyStore:
+    """
+    Idempotency kalitlari uchun ixcham xotira ombori.
+
+    - TTL tugagan yozuvlar o'qishda va yozishda tozalanadi.
+    - `max_entries` dan oshsa eng eskisi chiqarib tashlanadi (LRU).
+    - Bir xil kalit bilan parallel kelgan so'rovlar navbat bilan bajariladi,
+      ikkinchisi birinchisining saqlangan javobini oladi.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._locks: dict = {}  # kalit -> [asyncio.Lock, foydalanuvchilar soni]
+
+    def _evict_expired(self, now: float):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self._entries.pop(key)
+
+    def get(self, key) -> Optional[CachedResponse]:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._entries.pop(key, None)
+            return None
+        return entry
+
+    def set(self, key, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes, body_hash: str):
+        now = time.monotonic()
+        self._evict_expired(now)
+        self._entries[key] = CachedResponse(status_code, headers, body, body_hash, now + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lock_for(self, key) -> asyncio.Lock:
+        """Kalit qulfini olish; har bir chaqiruv keyin `release_lock` bilan yopilishi kerak"""
+        holder = self._locks.get(key)
+        if holder is None:
+            holder = self._locks[key] = [asyncio.Lock(), 0]
+        holder[1] += 1  # Qulfni ushlab turgan va kutayotganlar soni
+        return holder[0]
+
+    def release_lock(self, key):
+        # Kutayotgan so'rov bor ekan qulf o'chirilmaydi - aks holda keyingi so'rov yangi qulf olib, u bilan parallel ishlaydi
+        holder = self._locks[key]
+        holder[1] -= 1
+        if holder[1] == 0:
+            del self._locks[key]
+
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES)
+
+
+async def _send_json(send, status_code: int, detail: str):
+    response = JSONResponse(status_code=status_code, content={"detail": detail})
+    await send({"type": "http.response.start", "status": response.status_code, "headers": response.raw_headers})
+    await send({"type": "http.response.body", "body": response.body})
+
+
+class IdempotencyMiddleware:
+    """
+    `Idempotency-Key` headeri bor o'zgartiruvchi so'rovlar (POST/PUT/PATCH/DELETE) uchun.
+
+    Kalit + method + path + X-Telegram-ID bo'yicha birinchi muvaffaqiyatli (2xx) javob va so'rov
+    tanasining xeshi saqlanadi. Takroriy so'rovga javob bazaga tegmasdan qaytariladi; shu kalit
+    boshqa tana bilan kelsa - 422. Xato javoblar saqlanmaydi - shu kalit bilan qayta urinish mumkin.
+
+    Sof ASGI middleware: kaliti yo'q so'rovlar (GET, SSE /orders/events/, /exports/ oqimlari)
+    hech qanday qayta ishlashsiz to'g'ridan-to'g'ri ilovaga uzatiladi.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, "Idempotency-Key juda uzun")
+            return
+
+        key = (idempotency_key, scope["method"], scope["path"], headers.get("X-Telegram-ID", ""))
+        body = await _read_body(receive)
+        # Query parametrlari ham so'rovning bir qismi (masalan ?start_date=...)
+        body_hash = hashlib.sha256(scope.get("query_string", b"") + b"\n" + body).hexdigest()
+
+        lock = idempotency_store.lock_for(key)
+        try:
+            # Parallel dublikat birinchi so'rov tugashini kutadi va uning javobini oladi
+            async with lock:
+                cached = idempotency_store.get(key)
+                if cached:
+                    if cached.body_hash != body_hash:
+                        await _send_json(send, 422, "Bu Idempotency-Key boshqa so'rov tanasi bilan ishlatilgan")
+                        return
+                    await cached.replay(send)
+                    return
+
+                await self._call_and_store(scope, receive, send, key, body, body_hash)
+        finally:
+            idempotency_store.release_lock(key)
+
+    async def _call_and_store(self, scope, receive, send, key, body: bytes, body_hash: str):
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()  # http.disconnect
+
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            # Javob mijozga darhol uzatiladi, 2xx bo'lsa nusxasi saqlanadi
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False) and 200 <= start.get("status", 0) < 300:
+                    idempotency_store.set(key, start["status"], list(start.get("headers", [])), b"".join(chunks), body_hash)
+            await send(message)
+
+        await self.app(scope, replay_body, capture)
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Courier, User
+from app.config import IDENTITY_CACHE_TTL_SECONDS, IDENTITY_CACHE_MAX_ENTRIES
+
+
+@dataclass(frozen=True)
+class CourierIdentity:
+    """Kuryer haqida bot yo'llari uchun yetarli ma'lumot"""
+    id: int
+    telegram_id: str
+    name: str
+    status: str
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    """Foydalanuvchi haqida ma'lumot (UserRead maydonlari bilan bir xil)"""
+    id: int
+    telegram_id: str
+    name: str
+    phone: str
+    address: str
+    status: str
+    user_type: str
+
+
+class IdentityCache:
+    """
+    telegram_id -> kuryer/foydalanuvchi kesh (TTL + LRU, jarayon ichida).
+
+    - Faqat topilgan yozuvlar saqlanadi (yo'q telegram_id keyingi safar yana bazadan qidiriladi).
+    - Yozuvchi endpointlar commit dan keyin `invalidate_*` chaqiradi; TTL esa boshqa
+      jarayonlardagi o'zgarishlar uchun zaxira.
+    - Sinxron endpointlar threadpool da ishlaydi - shuning uchun threading.Lock.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache(IDENTITY_CACHE_TTL_SECONDS, IDENTITY_CACHE_MAX_ENTRIES)
+
+
+def _courier_identity(courier: Courier) -> CourierIdentity:
+    return CourierIdentity(id=courier.id, telegram_id=courier.telegram_id, name=courier.name, status=courier.status)
+
+
+def _user_identity(user: User) -> UserIdentity:
+    return UserIdentity(
+        id=user.id, telegram_id=user.telegram_id, name=user.name, phone=user.phone,
+        address=user.address, status=user.status, user_type=user.user_type
+    )
+
+
+def get_courier_identity(db: Session, telegram_id: str) -> Optional[CourierIdentity]:
+    key = ("courier", str(telegram_id))
+    identity = identity_cache.get(key)
+    if identity is None:
+        courier = db.query(Courier).filter(Courier.telegram_id == telegram_id).first()
+        if not courier:
+            return None
+        identity = _courier_identity(courier)
+        identity_cache.set(key, identity)
+    return identity
+
+
+async def aget_courier_identity(db: AsyncSession, telegram_id: str) -> Optional[CourierIdentity]:
+    key = ("courier", str(telegram_id))
+    identity = identity_cache.get(key)
+    if identity is None:
+        courier = await db.scalar(select(Courier).where(Courier.telegram_id == telegram_id))
+        if not courier:
+            return None
+        identity = _courier_identity(courier)
+        identity_cache.set(key, identity)
+    return identity
+
+
+def get_user_identity(db: Session, telegram_id: str) -> Optional[UserIdentity]:
+    key = ("user", str(telegram_id))
+    identity = identity_cache.get(key)
+    if identity is None:
+        user = db.query(User).filter(User.telegram_id == telegram_id).first()
+        if not user:
+            return None
+        identity = _user_identity(user)
+        identity_cache.set(key, identity)
+    return identity
+
+
+def invalidate_courier(*telegram_ids: Optional[str]):
+    for telegram_id in telegram_ids:
+        if telegram_id:
+            identity_cache.invalidate(("courier", str(telegram_id)))
+
+
+def invalidate_user(*telegram_ids: Optional[str]):
+    for telegram_id in telegram_ids:
+        if telegram_id:
+            identity_cache.invalidate(("user", str(telegram_id)))
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import SessionLocal
+from app.models import InventoryMovement
+from app.config import INVENTORY_SNAPSHOT_INTERVAL_HOURS
+from app.utils.stock import StockReservation
+
+logger = logging.getLogger(__name__)
+
+# Harakat turlari
+INITIAL = "initial"        # Mahsulot yaratilgandagi qoldiq
+RESTOCK = "restock"        # Prihod (add-stock)
+ADJUSTMENT = "adjustment"  # Admin qoldiqni qo'lda o'zgartirgan
+ORDER = "order"            # Buyurtma
+BONUS = "bonus"            # Kuryer bonusi
+
+
+def record_movement(
+    db: Union[Session, AsyncSession],
+    product_id: int,
+    delta: int,
+    reason: str,
+    stock_after: Optional[int] = None,
+    order_id: Optional[int] = None
+):
+    """
+    Harakatni sessiyaga qo'shish - qoldiq o'zgarishi bilan bitta tranzaksiyada commit bo'ladi.
+
+    Qoldiq UPDATE dan KEYIN chaqiring: created_at flush paytida qo'yiladi va qator qulfi
+    olingandan keyingi vaqtni bildiradi (nusxalar bilan mos kelishi uchun).
+    """
+    if not delta:
+        return
+    db.add(InventoryMovement(
+        product_id=product_id, delta=delta, reason=reason, stock_after=stock_after, order_id=order_id
+    ))
+
+
+def record_reservation(db: AsyncSession, reservation: StockReservation, reason: str, order_id: Optional[int] = None):
+    """reserve_stock natijasidagi har bir mahsulot uchun chiqim harakati"""
+    for product_id, quantity in reservation.quantities.items():
+        product = reservation.products.get(product_id)
+        record_movement(
+            db, product_id, -quantity, reason,
+            stock_after=product.stock if product else None, order_id=order_id
+        )
+
+
+def take_snapshot(db: Session) -> datetime:
+    """
+    Barcha mahsulotlar qoldig'ini nusxalash.
+
+    Mahsulot qatorlari FOR SHARE bilan qulflanadi: tugallanmagan qoldiq o'zgarishlari
+    commit bo'lishini kutamiz, keyingilari esa nusxadan keyin boshlanadi. Shuning uchun
+    `taken_at` gacha bo'lgan barcha harakatlar nusxa qoldig'iga kirgan bo'ladi.
+    """
+    db.execute(text("SELECT id FROM products ORDER BY id FOR SHARE;"))
+    taken_at = datetime.utcnow()
+    db.execute(text("""
+        INSERT INTO inventory_snapshots (product_id, taken_at, stock)
+        SELECT id, :taken_at, COALESCE(stock, 0) FROM products;
+    """), {"taken_at": taken_at})
+    db.commit()
+    return taken_at
+
+
+def latest_snapshot_at(db: Session) -> Optional[datetime]:
+    return db.execute(text("SELECT MAX(taken_at) FROM inventory_snapshots;")).scalar()
+
+
+def ensure_inventory_baseline(db: Session):
+    """Birinchi ishga tushirishda boshlang'ich nusxa (jurnaldan oldingi qoldiqlar shu nusxada)"""
+    if latest_snapshot_at(db) is None:
+        take_snapshot(db)
+
+
+def _snapshot_if_due() -> bool:
+    with SessionLocal() as db:
+        latest = latest_snapshot_at(db)
+        if latest and datetime.utcnow() - latest < timedelta(hours=INVENTORY_SNAPSHOT_INTERVAL_HOURS):
+            return False
+        take_snapshot(db)
+        return True
+
+
+async def run_snapshot_loop():
+    """Davriy nusxa olish sikli (lifespan ichida). Restartlar keraksiz nusxa yaratmaydi."""
+    logger.info("Ombor nusxalari sikli ishga tushdi")
+    while True:
+        try:
+            await asyncio.to_thread(_snapshot_if_due)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ombor nusxasini olib bo'lmadi: {e}")
+        # Soatiga bir marta tekshiramiz (interval qisqa bo'lsa - tezroq)
+        await asyncio.sleep(min(3600, INVENTORY_SNAPSHOT_INTERVAL_HOURS * 3600))
+
+
+# `at` paytidagi qoldiq (created_at < at harakatlar kiradi - movement_totals bilan chegara bir xil):
+# eng yaqin oldingi nusxa + (nusxa, at) harakatlari. Oldingi nusxa bo'lmasa (at baseline dan oldin) -
+# keyingi nusxadan [at, nusxa] harakatlari ayiriladi.
+_STOCK_AT_SQL = """
+    WITH before AS (
+        SELECT DISTINCT ON (product_id) product_id, taken_at, stock
+        FROM inventory_snapshots
+        WHERE taken_at <= :at {product_filter}
+        ORDER BY product_id, taken_at DESC
+    ),
+    after AS (
+        SELECT DISTINCT ON (product_id) product_id, taken_at, stock
+        FROM inventory_snapshots
+        WHERE taken_at > :at {product_filter}
+        ORDER BY product_id, taken_at ASC
+    )
+    SELECT p.id AS product_id,
+           CASE
+               WHEN b.product_id IS NOT NULL THEN b.stock + COALESCE((
+                   SELECT SUM(m.delta) FROM inventory_movements m
+                   WHERE m.product_id = p.id AND m.created_at > b.taken_at AND m.created_at < :at
+               ), 0)
+               WHEN a.product_id IS NOT NULL THEN a.stock - COALESCE((
+                   SELECT SUM(m.delta) FROM inventory_movements m
+                   WHERE m.product_id = p.id AND m.created_at >= :at AND m.created_at <= a.taken_at
+               ), 0)
+               ELSE COALESCE((
+                   SELECT SUM(m.delta) FROM inventory_movements m
+                   WHERE m.product_id = p.id AND m.created_at < :at
+               ), 0)
+           END AS stock,
+           COALESCE(b.taken_at, a.taken_at) AS snapshot_taken_at
+    FROM products p
+    LEFT JOIN before b ON b.product_id = p.id
+    LEFT JOIN after a ON a.product_id = p.id
+    WHERE TRUE {outer_filter}
+"""
+
+
+def stock_at(db: Session, at: datetime, product_id: Optional[int] = None) -> Dict[int, Tuple[int, Optional[datetime]]]:
+    """
+    Berilgan vaqtdagi qoldiq: product_id -> (qoldiq, ishlatilgan nusxa vaqti).
+
+    Barcha harakatlar emas, faqat eng yaqin nusxadan keyingi kichik qism yig'iladi
+    ((product_id, created_at) indeksi orqali).
+    """
+    params = {"at": at}
+    product_filter = outer_filter = ""
+    if product_id is not None:
+        params["product_id"] = product_id
+        product_filter = "AND product_id = :product_id"
+        outer_filter = "AND p.id = :product_id"
+
+    rows = db.execute(
+        text(_STOCK_AT_SQL.format(product_filter=product_filter, outer_filter=outer_filter)), params
+    ).all()
+    return {row.product_id: (int(row.stock), row.snapshot_taken_at) for row in rows}
+
+
+def movement_totals(db: Session, start: datetime, end: datetime) -> Dict[int, Dict[str, int]]:
+    """[start, end) oralig'idagi harakatlar: product_id -> {reason: SUM(delta)}"""
+    rows = db.execute(text("""
+        SELECT product_id, reason, SUM(delta) AS total
+        FROM inventory_movements
+        WHERE created_at >= :start AND created_at < :end
+        GROUP BY product_id, reason;
+    """), {"start": start, "end": end}).all()
+    totals: Dict[int, Dict[str, int]] = {}
+    for row in rows:
+        totals.setdefault(row.product_id, {})[row.reason] = int(row.total)
+    return totals
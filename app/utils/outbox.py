@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Union
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import NotificationOutbox
+from app.config import OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETENTION_DAYS
+from app.utils.telegram import (
+    ADMIN_IDS,
+    TelegramNotConfigured,
+    notify_admins_new_order,
+    notify_courier_assigned,
+    notify_user_courier_assigned,
+    notify_user_courier_accepted,
+    notify_user_delivered,
+    notify_admin_delivered
+)
+
+logger = logging.getLogger(__name__)
+
+# Outbox dagi `kind` -> yuboruvchi funksiya
+NOTIFIERS = {
+    func.__name__: func for func in (
+        notify_admins_new_order,
+        notify_courier_assigned,
+        notify_user_courier_assigned,
+        notify_user_courier_accepted,
+        notify_user_delivered,
+        notify_admin_delivered,
+    )
+}
+
+# Barcha adminlarga ketadigan xabarlar: har bir admin chati uchun alohida yozuv, shunda bitta
+# chatdagi xato faqat o'sha chatga qayta yuborishga olib keladi (boshqa adminlarga takror ketmaydi)
+ADMIN_FANOUT_KINDS = {"notify_admins_new_order", "notify_admin_delivered"}
+
+# Yuborilgan yozuvlarni tozalash: soatiga bir marta, bitta DELETE da shuncha qatordan oshmasdan
+PRUNE_INTERVAL = timedelta(hours=1)
+PRUNE_BATCH_SIZE = 5000
+
+# Olingan yozuv shu vaqt ichida yuborilmasa (masalan jarayon o'chib qolsa), qayta navbatga tushadi
+CLAIM_LEASE = timedelta(seconds=60)
+
+_wakeup = asyncio.Event()
+
+
+def enqueue_notification(db: Union[Session, AsyncSession], kind: str, **payload):
+    """
+    Xabarnomani outbox ga qo'shish.
+
+    Chaqiruvchi sessiyaga qo'shiladi, ya'ni buyurtma o'zgarishi bilan bitta
+    tranzaksiyada commit bo'ladi. Commit dan keyin `wake_dispatcher()` chaqiring.
+    """
+    if kind not in NOTIFIERS:
+        raise ValueError(f"Noma'lum xabarnoma turi: {kind}")
+    if kind in ADMIN_FANOUT_KINDS:
+        db.add_all([NotificationOutbox(kind=kind, payload={**payload, "admin_id": admin_id}) for admin_id in ADMIN_IDS])
+        return
+    db.add(NotificationOutbox(kind=kind, payload=payload))
+
+
+def wake_dispatcher():
+    """Dispetcherni poll intervalini kutmasdan uyg'otish (event loop ichidan chaqiriladi)"""
+    _wakeup.set()
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    # 10s, 20s, 40s, ... maksimum 30 daqiqa
+    return timedelta(seconds=min(10 * 2 ** max(attempts - 1, 0), 1800))
+
+
+async def _claim_batch(limit: int):
+    """Navbatdagi yozuvlarni band qilish (bir nechta worker bo'lsa ham bitta yozuv bitta workerga tushadi)"""
+    async with AsyncSessionLocal() as db:
+        now = datetime.utcnow()
+        due_ids = (
+            select(NotificationOutbox.id)
+            .where(NotificationOutbox.status == "pending", NotificationOutbox.next_attempt_at <= now)
+            .order_by(NotificationOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        rows = (await db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(due_ids))
+            .values(next_attempt_at=now + CLAIM_LEASE, attempts=NotificationOutbox.attempts + 1)
+            .returning(NotificationOutbox.id, NotificationOutbox.kind, NotificationOutbox.payload, NotificationOutbox.attempts)
+        )).all()
+        await db.commit()
+        return rows
+
+
+async def _record_results(results):
+    """Yuborish natijalarini bitta tranzaksiyada saqlash"""
+    now = datetime.utcnow()
+    changes = []
+    for row_id, attempts, ok, error, terminal in results:
+        if ok:
+            changes.append({"id": row_id, "status": "sent", "sent_at": now, "last_error": None})
+        elif terminal or attempts >= OUTBOX_MAX_ATTEMPTS:
+            changes.append({"id": row_id, "status": "failed", "last_error": error})
+        else:
+            changes.append({"id": row_id, "next_attempt_at": now + _retry_delay(attempts), "last_error": error})
+
+    async with AsyncSessionLocal() as db:
+        # PK bo'yicha bulk UPDATE (SQLAlchemy ustunlar to'plami bo'yicha executemany ga guruhlaydi)
+        await db.execute(update(NotificationOutbox), changes)
+        await db.commit()
+
+
+async def _deliver(row):
+    """(id, attempts, ok, xato, terminal) - terminal bo'lsa qayta urinilmaydi"""
+    try:
+        ok = await NOTIFIERS[row.kind](**(row.payload or {}))
+        return row.id, row.attempts, bool(ok), None if ok else "Telegram xabarni qabul qilmadi", False
+    except TelegramNotConfigured as e:
+        logger.error(f"Outbox #{row.id} ({row.kind}) yuborilmaydi: {e}")
+        return row.id, row.attempts, False, str(e), True
+    except Exception as e:
+        logger.error(f"Outbox #{row.id} ({row.kind}) yuborilmadi: {e}")
+        return row.id, row.attempts, False, str(e), False
+
+
+async def dispatch_once(limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Bitta partiyani parallel yuborish. Yuborilgan yozuvlar sonini qaytaradi."""
+    rows = await _claim_batch(limit)
+    if not rows:
+        return 0
+    results = await asyncio.gather(*(_deliver(row) for row in rows))
+    await _record_results(results)
+    return len(rows)
+
+
+async def prune_sent(retention_days: int = OUTBOX_RETENTION_DAYS) -> int:
+    """`retention_days` kundan eski yuborilgan yozuvlarni partiyalab o'chirish. O'chirilganlar sonini qaytaradi."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    removed = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            old_ids = (
+                select(NotificationOutbox.id)
+                .where(NotificationOutbox.status == "sent", NotificationOutbox.sent_at < cutoff)
+                .limit(PRUNE_BATCH_SIZE)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                delete(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(old_ids))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            removed += result.rowcount
+            if result.rowcount < PRUNE_BATCH_SIZE:
+                return removed
+
+
+async def run_dispatcher():
+    """Outbox ni doimiy bo'shatib turuvchi sikl (API ichida yoki alohida worker sifatida)"""
+    logger.info("Outbox dispetcheri ishga tushdi")
+    next_prune = datetime.utcnow()
+    while True:
+        try:
+            processed = await dispatch_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Outbox dispetcher xatosi: {e}")
+            processed = 0
+
+        if datetime.utcnow() >= next_prune:
+            next_prune = datetime.utcnow() + PRUNE_INTERVAL
+            try:
+                removed = await prune_sent()
+                if removed:
+                    logger.info(f"Outbox: {removed} ta eski yuborilgan yozuv o'chirildi")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox tozalash xatosi: {e}")
+
+        # Partiya to'la bo'lsa darhol davom etamiz, aks holda yangi xabar yoki poll intervalni kutamiz
+        if processed >= OUTBOX_BATCH_SIZE:
+            continue
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+if __name__ == "__main__":
+    # Alohida worker: python -m app.utils.outbox
+    asyncio.run(run_dispatcher())
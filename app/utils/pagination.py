@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+from app.models import Order
+
+# Keyingi sahifa cursori shu header orqali qaytariladi (javob tanasi o'zgarmaydi)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """Qiymatlarni shaffof bo'lmagan (opaque) cursor satriga aylantirish"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Cursorni qayta ochish. Buzilgan cursor uchun 400 qaytaradi."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError
+        return values
+    except Exception:
+        raise HTTPException(status_code=400, detail="Noto'g'ri cursor")
+
+
+def paginate_orders(query, cursor: Optional[str], limit: int, offset: int):
+    """
+    Buyurtmalarni (created_at, id) bo'yicha kamayish tartibida sahifalash.
+
+    - cursor berilsa: keyset rejimi, `WHERE (created_at, id) < (:c, :id)` (offset e'tiborga olinmaydi)
+    - cursor berilmasa: eski OFFSET rejimi (admin panel uchun)
+    - ORDER BY har doim OFFSET/LIMIT dan oldin qo'yiladi (Query.order_by() keyin chaqirilsa xato beradi)
+    """
+    query = query.order_by(Order.created_at.desc(), Order.id.desc())
+    if cursor:
+        created_at, order_id = decode_cursor(cursor, 2)
+        try:
+            created_at = datetime.fromisoformat(created_at)
+            order_id = int(order_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Noto'g'ri cursor")
+        query = query.filter(tuple_(Order.created_at, Order.id) < (created_at, order_id))
+    else:
+        query = query.offset(offset)
+
+    return query.limit(limit)
+
+
+def next_orders_cursor(orders: List[Order], limit: int) -> Optional[str]:
+    """Sahifa to'la bo'lsa, oxirgi buyurtmadan keyingi sahifa cursorini yasash"""
+    if not orders or len(orders) < limit:
+        return None
+    last = orders[-1]
+    return encode_cursor(last.created_at.isoformat(), last.id)
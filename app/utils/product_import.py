@@ -0,0 +1,147 @@
+from typing import BinaryIO, Dict, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.models import Product, InventoryMovement
+from app.schemas.product import ProductBulkRow, ProductBulkRowResult, ProductBulkResult
+from app.utils.inventory import INITIAL, RESTOCK
+from app.utils.user_import import read_rows
+
+# Bitta INSERT dagi qatorlar soni
+BULK_BATCH_SIZE = 1000
+
+CREATED, UPDATED, UNCHANGED, ERROR = "created", "updated", "unchanged", "error"
+
+# Mavjud mahsulotda yangilanadigan maydonlar (quantity alohida - qoldiqqa qo'shiladi)
+UPDATE_FIELDS = ("name", "buy_price", "sell_price", "image", "status")
+
+
+def parse_products(file: BinaryIO, filename: str) -> Tuple[List[Tuple[int, ProductBulkRow]], List[ProductBulkRowResult]]:
+    """
+    Fayldagi qatorlarni tekshirish.
+
+    Qaytaradi: ([(qator raqami, qator)], xato qatorlar). Bo'sh CSV katakchalari
+    "yuborilmagan" deb hisoblanadi.
+    """
+    rows, errors = [], []
+    for number, raw in enumerate(read_rows(file, filename), start=1):
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError("obyekt kutilgan")
+            fields = {k: v.strip() if isinstance(v, str) else v for k, v in raw.items() if k}
+            row = ProductBulkRow(**{k: v for k, v in fields.items() if v not in (None, "")})
+            _check_row(row)
+        except (ValidationError, ValueError, TypeError) as e:
+            errors.append(ProductBulkRowResult(row=number, result=ERROR, message=str(e)))
+            continue
+        rows.append((number, row))
+    return rows, errors
+
+
+def _check_row(row: ProductBulkRow):
+    if row.id is None:
+        missing = [field for field in ("name", "buy_price", "sell_price") if getattr(row, field) is None]
+        if missing:
+            raise ValueError(f"yangi mahsulot uchun majburiy: {', '.join(missing)}")
+    for field in ("buy_price", "sell_price", "quantity"):
+        value = getattr(row, field)
+        if value is not None and value < 0:
+            raise ValueError(f"{field} manfiy bo'lishi mumkin emas")
+
+
+def apply_products(db: Session, rows: List[Tuple[int, ProductBulkRow]]) -> Tuple[List[ProductBulkRowResult], bool]:
+    """
+    Yaratish, narx o'zgartirish va prihodlarni bitta tranzaksiyada qo'llash.
+
+    - Yangilanadigan mahsulotlar bitta `SELECT ... FOR UPDATE` bilan qulflanadi
+      (parallel buyurtmalar qoldig'i yo'qolmasligi uchun).
+    - UPDATE lar executemany, INSERT lar partiyalab `RETURNING id` bilan,
+      ombor harakatlari bitta INSERT bilan yoziladi.
+
+    Qaytaradi: (qator natijalari, mahsulot nomlari o'zgardimi).
+    """
+    results: List[ProductBulkRowResult] = []
+    ids = sorted({row.id for _, row in rows if row.id is not None})
+    locked: Dict[int, Tuple[int, str]] = {}
+    if ids:
+        locked = {
+            product_id: (stock or 0, name)
+            for product_id, stock, name in db.query(Product.id, Product.stock, Product.name)
+            .filter(Product.id.in_(ids))
+            .order_by(Product.id)
+            .with_for_update()
+        }
+
+    updates, movements, creates = [], [], []
+    names_changed = False
+    seen = set()
+    for number, row in rows:
+        if row.id is None:
+            creates.append((number, row))
+            continue
+        if row.id in seen:
+            results.append(ProductBulkRowResult(row=number, result=ERROR, product_id=row.id, message="Faylda takrorlangan id"))
+            continue
+        seen.add(row.id)
+        if row.id not in locked:
+            results.append(ProductBulkRowResult(row=number, result=ERROR, product_id=row.id, message="Mahsulot topilmadi"))
+            continue
+
+        stock, name = locked[row.id]
+        values = {field: getattr(row, field) for field in UPDATE_FIELDS if getattr(row, field) is not None}
+        if row.quantity:
+            values["stock"] = stock + row.quantity
+            movements.append({
+                "product_id": row.id, "delta": row.quantity, "reason": RESTOCK, "stock_after": values["stock"]
+            })
+        if not values:
+            results.append(ProductBulkRowResult(row=number, result=UNCHANGED, product_id=row.id))
+            continue
+        if "name" in values and values["name"] != name:
+            names_changed = True
+        updates.append({"id": row.id, **values})
+        results.append(ProductBulkRowResult(row=number, result=UPDATED, product_id=row.id))
+
+    if updates:
+        db.execute(update(Product), updates)
+
+    for start in range(0, len(creates), BULK_BATCH_SIZE):
+        batch = creates[start:start + BULK_BATCH_SIZE]
+        new_ids = db.scalars(
+            insert(Product).returning(Product.id, sort_by_parameter_order=True),
+            [
+                {
+                    "name": row.name, "buy_price": row.buy_price, "sell_price": row.sell_price,
+                    "stock": row.quantity or 0, "image": row.image, "status": row.status or "active"
+                }
+                for _, row in batch
+            ]
+        ).all()
+        for (number, row), product_id in zip(batch, new_ids):
+            if row.quantity:
+                movements.append({
+                    "product_id": product_id, "delta": row.quantity, "reason": INITIAL, "stock_after": row.quantity
+                })
+            results.append(ProductBulkRowResult(row=number, result=CREATED, product_id=product_id))
+
+    if movements:
+        db.execute(insert(InventoryMovement), movements)
+    db.commit()
+    return results, names_changed
+
+
+def run_bulk(db: Session, file: BinaryIO, filename: str) -> Tuple[ProductBulkResult, bool]:
+    rows, errors = parse_products(file, filename)
+    results, names_changed = apply_products(db, rows) if rows else ([], False)
+    results = sorted(errors + results, key=lambda r: r.row)
+    counts = {result: sum(1 for r in results if r.result == result) for result in (CREATED, UPDATED, UNCHANGED, ERROR)}
+    return ProductBulkResult(
+        received=len(results),
+        created=counts[CREATED],
+        updated=counts[UPDATED],
+        unchanged=counts[UNCHANGED],
+        failed=counts[ERROR],
+        rows=results
+    ), names_changed
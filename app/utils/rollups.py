@@ -0,0 +1,247 @@
+import sys
+from typing import Optional
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Order, OrderItem, DailySales, DailyProductSales, DailyCourierSales, CourierStat
+
+ROLLUP_TABLES = ["daily_sales", "daily_product_sales", "daily_courier_sales", "courier_stats"]
+
+# Mahsuloti yo'q (product_id NULL) order_items - hisobotda "O'chirilgan" qatori
+DELETED_PRODUCT_ID = 0
+# daily_product_sales.first_seen = order_id * FIRST_SEEN_SHIFT + order_item_id:
+# eski hisobotdagi tartib (buyurtmalar, ichida mahsulotlar) bitta BIGINT bilan MIN orqali saqlanadi
+FIRST_SEEN_SHIFT = 2 ** 32
+
+
+async def _upsert(db: AsyncSession, model, rows: list, keys: list, additive: list, least: tuple = ()):
+    """INSERT ... ON CONFLICT (keys) DO UPDATE SET col = col + excluded.col (least: col = LEAST(col, excluded.col))"""
+    if not rows:
+        return
+    stmt = pg_insert(model).values(rows)
+    set_ = {col: getattr(model, col) + getattr(stmt.excluded, col) for col in additive}
+    set_.update({col: func.least(getattr(model, col), getattr(stmt.excluded, col)) for col in least})
+    stmt = stmt.on_conflict_do_update(index_elements=keys, set_=set_)
+    await db.execute(stmt)
+
+
+async def apply_delivery(db: AsyncSession, order: Order) -> bool:
+    """
+    Yetkazilgan buyurtmani kunlik yig'indilarga qo'shish.
+
+    Buyurtma bilan bitta tranzaksiyada chaqiriladi (commit chaqiruvchida).
+    Har bir buyurtma faqat bir marta qo'shiladi: `rolled_up` bayrog'i shartli UPDATE bilan
+    olinadi, allaqachon hisoblangan buyurtma uchun hech narsa o'zgarmaydi va False qaytadi.
+    """
+    claimed = (await db.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.rolled_up.is_not(True))
+        .values(rolled_up=True)
+        .returning(Order.id)
+    )).first()
+    if claimed is None:
+        return False
+
+    day = order.delivered_at.date()
+    revenue = order.final_total_amount or 0.0
+
+    product_rows = (await db.execute(
+        select(
+            OrderItem.product_id,
+            func.sum(OrderItem.quantity).label("quantity"),
+            func.sum(OrderItem.sell_price * OrderItem.quantity).label("revenue"),
+            func.sum(OrderItem.buy_price * OrderItem.quantity).label("cogs"),
+            func.min(OrderItem.id).label("first_item_id")
+        ).where(OrderItem.order_id == order.id).group_by(OrderItem.product_id)
+    )).all()
+
+    quantity = sum(row.quantity or 0 for row in product_rows)
+    cogs = sum(row.cogs or 0.0 for row in product_rows)
+    rating_sum = order.rating or 0
+    rating_count = 1 if order.rating is not None else 0
+    # Reyting jadvalidagi o'rtacha yetkazish vaqti: faqat kuryerga biriktirilgan vaqti ma'lum buyurtmalar
+    delivery_seconds = (order.delivered_at - order.assigned_at).total_seconds() if order.assigned_at else 0.0
+    delivery_count = 1 if order.assigned_at else 0
+
+    await _upsert(db, DailySales, [{
+        "day": day, "revenue": revenue, "cogs": cogs, "quantity": quantity,
+        "order_count": 1, "rating_sum": rating_sum, "rating_count": rating_count
+    }], ["day"], ["revenue", "cogs", "quantity", "order_count", "rating_sum", "rating_count"])
+
+    await _upsert(db, DailyProductSales, [
+        {
+            "day": day,
+            "product_id": row.product_id if row.product_id is not None else DELETED_PRODUCT_ID,
+            "revenue": row.revenue or 0.0, "cogs": row.cogs or 0.0, "quantity": row.quantity or 0,
+            "first_seen": order.id * FIRST_SEEN_SHIFT + row.first_item_id
+        }
+        for row in product_rows
+    ], ["day", "product_id"], ["revenue", "cogs", "quantity"], least=("first_seen",))
+
+    if order.courier_id:
+        await _upsert(db, DailyCourierSales, [{
+            "day": day, "courier_id": order.courier_id, "revenue": revenue, "quantity": quantity,
+            "order_count": 1, "rating_sum": rating_sum, "rating_count": rating_count,
+            "delivery_seconds": delivery_seconds, "delivery_count": delivery_count
+        }], ["day", "courier_id"], [
+            "revenue", "quantity", "order_count", "rating_sum", "rating_count", "delivery_seconds", "delivery_count"
+        ])
+
+        await _upsert(db, CourierStat, [{
+            "courier_id": order.courier_id, "delivered_count": 1, "money_collected": revenue,
+            "rating_sum": rating_sum, "rating_count": rating_count,
+            "delivery_seconds": delivery_seconds, "delivery_count": delivery_count
+        }], ["courier_id"], [
+            "delivered_count", "money_collected", "rating_sum", "rating_count", "delivery_seconds", "delivery_count"
+        ])
+    return True
+
+
+async def apply_rating(db: AsyncSession, order: Order, previous_rating: Optional[int]):
+    """Baho qo'yilganda (yoki o'zgartirilganda) reyting yig'indilarini yangilash"""
+    if not order.rolled_up or order.delivered_at is None:
+        return
+    day = order.delivered_at.date()
+    rating_delta = (order.rating or 0) - (previous_rating or 0)
+    count_delta = (1 if order.rating is not None else 0) - (1 if previous_rating is not None else 0)
+    if not rating_delta and not count_delta:
+        return
+
+    await _upsert(db, DailySales, [{
+        "day": day, "revenue": 0.0, "cogs": 0.0, "quantity": 0,
+        "order_count": 0, "rating_sum": rating_delta, "rating_count": count_delta
+    }], ["day"], ["rating_sum", "rating_count"])
+
+    if order.courier_id:
+        await _upsert(db, DailyCourierSales, [{
+            "day": day, "courier_id": order.courier_id, "revenue": 0.0, "quantity": 0,
+            "order_count": 0, "rating_sum": rating_delta, "rating_count": count_delta,
+            "delivery_seconds": 0.0, "delivery_count": 0
+        }], ["day", "courier_id"], ["rating_sum", "rating_count"])
+
+        await _upsert(db, CourierStat, [{
+            "courier_id": order.courier_id, "delivered_count": 0, "money_collected": 0.0,
+            "rating_sum": rating_delta, "rating_count": count_delta,
+            "delivery_seconds": 0.0, "delivery_count": 0
+        }], ["courier_id"], ["rating_sum", "rating_count"])
+
+
+def rebuild_rollups(db: Session):
+    """
+    Barcha yig'indi jadvallarini orders/order_items dan noldan qayta hisoblash.
+
+    `rolled_up` buyurtmalar hisoblanadi - apply_delivery qo'shgan to'plam bilan aynan bir xil.
+
+    Jadvallar EXCLUSIVE rejimda qulflanadi: parallel deliver/rate tranzaksiyalari
+    qayta hisoblash tugashini kutadi va hech narsa ikki marta hisoblanmaydi.
+    """
+    db.execute(text(f"LOCK TABLE {', '.join(ROLLUP_TABLES)} IN EXCLUSIVE MODE;"))
+    for table in ROLLUP_TABLES:
+        db.execute(text(f"DELETE FROM {table};"))
+
+    db.execute(text("""
+        INSERT INTO daily_sales (day, revenue, cogs, quantity, order_count, rating_sum, rating_count)
+        SELECT o.day, o.revenue, COALESCE(i.cogs, 0), COALESCE(i.quantity, 0),
+               o.order_count, o.rating_sum, o.rating_count
+        FROM (
+            SELECT CAST(delivered_at AS DATE) AS day,
+                   SUM(COALESCE(final_total_amount, 0)) AS revenue,
+                   COUNT(*) AS order_count,
+                   COALESCE(SUM(rating), 0) AS rating_sum,
+                   COUNT(rating) AS rating_count
+            FROM orders
+            WHERE rolled_up AND delivered_at IS NOT NULL
+            GROUP BY 1
+        ) o
+        LEFT JOIN (
+            SELECT CAST(o.delivered_at AS DATE) AS day,
+                   SUM(oi.buy_price * oi.quantity) AS cogs,
+                   SUM(oi.quantity) AS quantity
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE o.rolled_up AND o.delivered_at IS NOT NULL
+            GROUP BY 1
+        ) i ON i.day = o.day;
+    """))
+
+    db.execute(text("""
+        INSERT INTO daily_product_sales (day, product_id, revenue, cogs, quantity, first_seen)
+        SELECT CAST(o.delivered_at AS DATE), COALESCE(oi.product_id, :deleted),
+               SUM(oi.sell_price * oi.quantity), SUM(oi.buy_price * oi.quantity), SUM(oi.quantity),
+               MIN(o.id * CAST(:shift AS BIGINT) + oi.id)
+        FROM order_items oi
+        JOIN orders o ON o.id = oi.order_id
+        WHERE o.rolled_up AND o.delivered_at IS NOT NULL
+        GROUP BY 1, 2;
+    """), {"deleted": DELETED_PRODUCT_ID, "shift": FIRST_SEEN_SHIFT})
+
+    db.execute(text("""
+        INSERT INTO daily_courier_sales (day, courier_id, revenue, quantity, order_count, rating_sum, rating_count,
+                                         delivery_seconds, delivery_count)
+        SELECT o.day, o.courier_id, o.revenue, COALESCE(i.quantity, 0),
+               o.order_count, o.rating_sum, o.rating_count, o.delivery_seconds, o.delivery_count
+        FROM (
+            SELECT CAST(delivered_at AS DATE) AS day, courier_id,
+                   SUM(COALESCE(final_total_amount, 0)) AS revenue,
+                   COUNT(*) AS order_count,
+                   COALESCE(SUM(rating), 0) AS rating_sum,
+                   COUNT(rating) AS rating_count,
+                   COALESCE(SUM(EXTRACT(EPOCH FROM delivered_at - assigned_at)), 0) AS delivery_seconds,
+                   COUNT(assigned_at) AS delivery_count
+            FROM orders
+            WHERE rolled_up AND delivered_at IS NOT NULL AND courier_id IS NOT NULL
+            GROUP BY 1, 2
+        ) o
+        LEFT JOIN (
+            SELECT CAST(o.delivered_at AS DATE) AS day, o.courier_id, SUM(oi.quantity) AS quantity
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE o.rolled_up AND o.delivered_at IS NOT NULL AND o.courier_id IS NOT NULL
+            GROUP BY 1, 2
+        ) i ON i.day = o.day AND i.courier_id = o.courier_id;
+    """))
+
+    # Sanasiz umumiy ko'rsatkichlar - kunlik kuryer yig'indilaridan
+    db.execute(text("""
+        INSERT INTO courier_stats (courier_id, delivered_count, money_collected, rating_sum, rating_count,
+                                   delivery_seconds, delivery_count)
+        SELECT courier_id, SUM(order_count), SUM(revenue), SUM(rating_sum), SUM(rating_count),
+               SUM(delivery_seconds), SUM(delivery_count)
+        FROM daily_courier_sales
+        GROUP BY courier_id;
+    """))
+    db.commit()
+
+
+def ensure_rollups(db: Session):
+    """
+    Yig'indilar bo'sh, lekin manba ma'lumot bor bo'lsa (birinchi deploy yoki yangi jadval) - qayta hisoblash
+    """
+    has_delivered = db.query(Order.id).filter(Order.rolled_up.is_(True)).first() is not None
+    if not has_delivered:
+        return
+    missing_daily = db.query(DailySales.day).first() is None
+    missing_courier_stats = (
+        db.query(CourierStat.courier_id).first() is None
+        and db.query(DailyCourierSales.day).first() is not None
+    )
+    # 10-migratsiyadan oldingi qatorlar: tartib yo'q va mahsulotsiz qatorlar tushib qolgan
+    missing_first_seen = db.query(DailyProductSales.day).filter(DailyProductSales.first_seen.is_(None)).first() is not None
+    # 12-migratsiyadan oldingi kuryer qatorlari: yetkazish vaqti yo'q
+    missing_delivery_time = db.query(CourierStat.courier_id).filter(CourierStat.delivery_count.is_(None)).first() is not None
+    if missing_daily or missing_courier_stats or missing_first_seen or missing_delivery_time:
+        rebuild_rollups(db)
+
+
+if __name__ == "__main__":
+    # Qayta hisoblash: python -m app.utils.rollups rebuild
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        with SessionLocal() as session:
+            rebuild_rollups(session)
+        print("Yig'indi jadvallari qayta hisoblandi.")
+    else:
+        print("Foydalanish: python -m app.utils.rollups rebuild")
@@ -0,0 +1,93 @@
+import re
+from typing import List, Optional
+
+from sqlalchemy import case, func, or_, select, text, union
+from sqlalchemy.orm import Session
+
+from app.models import User
+
+_NON_DIGITS = re.compile(r"\D")
+
+_trgm_available: Optional[bool] = None
+
+# pg_trgm 3 belgidan qisqa naqshdan trigram ajrata olmaydi - qisqa so'rovlar faqat boshidan qidiriladi
+MIN_SUBSTRING_LENGTH = 3
+# Tartiblashdan oldin har bir nomzodlar to'plamidan olinadigan qatorlar soni
+SEARCH_CANDIDATES = 200
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """"+998 (90) 123-45-67" -> "998901234567" """
+    return _NON_DIGITS.sub("", phone or "")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def trgm_available(db: Session) -> bool:
+    """pg_trgm o'rnatilganmi (bir marta tekshiriladi)"""
+    global _trgm_available
+    if _trgm_available is None:
+        if db.bind.dialect.name != "postgresql":
+            _trgm_available = False
+        else:
+            _trgm_available = db.execute(
+                text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+            ).scalar()
+    return _trgm_available
+
+
+def search_users(db: Session, query: str, limit: int = 10, offset: int = 0) -> List[User]:
+    """Foydalanuvchilarni ism yoki telefon bo'yicha qidirish (qarang: search_users_query)"""
+    query = query.strip()
+    if not query:
+        return []
+    return search_users_query(db, query, limit, offset).all()
+
+
+def search_users_query(db: Session, query: str, limit: int = 10, offset: int = 0):
+    """
+    Qidiruv so'rovi (bo'sh bo'lmagan, strip qilingan `query` uchun).
+
+    - 3 va undan uzun so'rov: `name ILIKE '%q%'` / `phone_digits LIKE '%raqamlar%'` - pg_trgm GIN
+      indekslari (ix_users_name_trgm, ix_users_phone_digits_trgm) orqali.
+    - 1-2 belgili so'rov: faqat boshidan moslik - `lower(name) LIKE 'q%'` va `phone_digits LIKE 'q%'`,
+      btree indekslari (ix_users_name_lower_prefix, ix_users_phone_digits_prefix) orqali.
+      Trigram indeksi bunday qisqa naqshga yordam bermaydi va '%45%' butun jadvalni o'qiydi.
+    - Telefon: so'rovdagi raqamlar `phone_digits` bilan solishtiriladi, shuning uchun
+      "90 123", "+99890123" va "901-23" bir xil topiladi.
+    - Tartiblashdan oldin nomzodlar cheklanadi (boshidan va ichidan mos kelganlar, har biri
+      SEARCH_CANDIDATES tagacha) - mashhur ismda ham barcha mosliklar similarity bo'yicha saralanmaydi.
+    - Tartib: boshidan mos kelganlar, keyin o'xshashlik (similarity), keyin id.
+    - pg_trgm yo'q bo'lsa ham ishlaydi (indekssiz ILIKE, o'xshashliksiz tartib).
+    """
+    digits = normalize_phone(query)
+    prefix = [func.lower(User.name).like(f"{_escape_like(query.lower())}%", escape="\\")]
+    if digits:
+        prefix.append(User.phone_digits.like(f"{digits}%"))
+
+    substring = []
+    if len(query) >= MIN_SUBSTRING_LENGTH:
+        substring.append(User.name.ilike(f"%{_escape_like(query)}%", escape="\\"))
+    if len(digits) >= MIN_SUBSTRING_LENGTH:
+        substring.append(User.phone_digits.like(f"%{digits}%"))
+
+    cap = max(SEARCH_CANDIDATES, offset + limit)
+    candidate_sets = [select(User.id).where(or_(*prefix)).limit(cap)]
+    if substring:
+        candidate_sets.append(select(User.id).where(or_(*substring)).limit(cap))
+    candidates = union(*candidate_sets).subquery()
+
+    order_by = [case((or_(*prefix), 0), else_=1)]
+    if trgm_available(db):
+        order_by.append(func.similarity(User.name, query).desc())
+    order_by.append(User.id)
+
+    return (
+        db.query(User)
+        .filter(User.id.in_(select(candidates.c.id)))
+        .order_by(*order_by)
+        .offset(offset)
+        .limit(limit)
+    )
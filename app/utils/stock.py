@@ -0,0 +1,97 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import Integer, column, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Product
+
+
+@dataclass
+class StockShortage:
+    """Omborda yetmagan bitta mahsulot qatori"""
+    product_id: int
+    name: str
+    requested: int
+    available: int
+
+
+@dataclass
+class StockReservation:
+    """Savatni band qilish natijasi"""
+    products: Dict[int, object] = field(default_factory=dict)  # product_id -> (id, name, buy_price, sell_price, stock)
+    missing: List[int] = field(default_factory=list)           # Bazada yo'q mahsulotlar
+    short: List[StockShortage] = field(default_factory=list)   # Yetmagan mahsulotlar
+    quantities: Dict[int, int] = field(default_factory=dict)   # product_id -> band qilingan miqdor
+
+    @property
+    def ok(self) -> bool:
+        return not self.short
+
+    def shortage_message(self) -> str:
+        return ", ".join(f"{s.name} yetarli emas (Mavjud: {s.available})" for s in self.short)
+
+
+def _merge_lines(lines: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """Bir xil mahsulot qatorlarini qo'shib chiqadi, musbat bo'lmagan miqdorlar hisobga olinmaydi"""
+    wanted: Dict[int, int] = {}
+    for product_id, quantity in lines:
+        if quantity is None or quantity <= 0:
+            continue
+        wanted[product_id] = wanted.get(product_id, 0) + quantity
+    return wanted
+
+
+async def reserve_stock(db: AsyncSession, lines: Iterable[Tuple[int, int]]) -> StockReservation:
+    """
+    Butun savat uchun omborni atomar kamaytirish.
+
+    Bitta shartli so'rov ishlatiladi:
+        UPDATE products SET stock = stock - q FROM (VALUES ...) WHERE id = :id AND stock >= q RETURNING ...
+    Parallel buyurtmalar bir-birining o'zgarishini yo'qotmaydi (read-modify-write yo'q).
+    Hammasi yoki hech narsa: biror qator yetmasa, SAVEPOINT bekor qilinadi va
+    `short` ro'yxati qaytariladi. Tranzaksiyani commit qilish chaqiruvchining ishi.
+    """
+    wanted = _merge_lines(lines)
+    reservation = StockReservation()
+    if not wanted:
+        return reservation
+
+    # Qatorlarni id bo'yicha tartiblaymiz - parallel savatlar qulflarni bir xil tartibda oladi
+    basket = values(
+        column("product_id", Integer),
+        column("quantity", Integer),
+        name="basket"
+    ).data(sorted(wanted.items()))
+
+    stmt = (
+        update(Product)
+        .where(Product.id == basket.c.product_id, Product.stock >= basket.c.quantity)
+        .values(stock=Product.stock - basket.c.quantity)
+        .returning(Product.id, Product.name, Product.buy_price, Product.sell_price, Product.stock)
+        .execution_options(synchronize_session=False)
+    )
+
+    savepoint = await db.begin_nested()
+    reserved = {row.id: row for row in await db.execute(stmt)}
+
+    unreserved = [pid for pid in wanted if pid not in reserved]
+    if unreserved:
+        existing = (await db.execute(
+            select(Product.id, Product.name, Product.stock).where(Product.id.in_(unreserved))
+        )).all()
+        found = {row.id for row in existing}
+        reservation.missing = [pid for pid in unreserved if pid not in found]
+        reservation.short = [
+            StockShortage(product_id=row.id, name=row.name, requested=wanted[row.id], available=row.stock)
+            for row in existing
+        ]
+
+    if reservation.short:
+        await savepoint.rollback()
+        return reservation
+
+    await savepoint.commit()
+    reservation.products = reserved
+    reservation.quantities = wanted
+    return reservation
@@ -1,6 +1,10 @@
 import os
+import time
+import asyncio
 import httpx
 import logging
+from collections import OrderedDict
+from typing import Optional, Union
 from dotenv import load_dotenv
 
 # .env faylini qidirish (app/utils/telegram.py dan 2 qavat tepada)
@@ -37,6 +41,98 @@ try:
 except Exception:
     ADMIN_IDS = []
 
+# --- HTTP CLIENT VA LIMITLAR ---
+
+# Bir vaqtda ketayotgan so'rovlar soni (fan-out shu semafor bilan cheklanadi)
+TELEGRAM_MAX_CONCURRENCY = int(os.getenv("TELEGRAM_MAX_CONCURRENCY", "20"))
+# Telegram limitlari: bitta bot ~30 xabar/soniya, bitta chatga ~1 xabar/soniya
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_PER_CHAT_RATE = float(os.getenv("TELEGRAM_PER_CHAT_RATE", "1"))
+
+_client: Optional[httpx.AsyncClient] = None
+_send_semaphore = asyncio.Semaphore(TELEGRAM_MAX_CONCURRENCY)
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=10.0,
+        limits=httpx.Limits(
+            max_connections=TELEGRAM_MAX_CONCURRENCY,
+            max_keepalive_connections=TELEGRAM_MAX_CONCURRENCY,
+            keepalive_expiry=60.0
+        )
+    )
+
+async def start_telegram_client():
+    """Uzoq yashovchi (keep-alive) HTTP clientni ochish - app startup da chaqiriladi"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+
+async def close_telegram_client():
+    """HTTP clientni yopish - app shutdown da chaqiriladi"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Umumiy clientni olish (app tashqarisida, masalan botlarda, birinchi chaqiruvda yaratiladi)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+class TokenBucket:
+    """Oddiy token-bucket: soniyasiga `rate` ta, `capacity` tagacha burst"""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class BotRateLimiter:
+    """Bitta bot uchun global va har bir chat bo'yicha limit"""
+    MAX_TRACKED_CHATS = 10000
+
+    def __init__(self, global_rate: float, per_chat_rate: float):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.chats: OrderedDict = OrderedDict()
+
+    async def acquire(self, chat_id):
+        if chat_id is not None:
+            key = str(chat_id)
+            bucket = self.chats.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.per_chat_rate, 1)
+                self.chats[key] = bucket
+                if len(self.chats) > self.MAX_TRACKED_CHATS:
+                    self.chats.popitem(last=False)
+            else:
+                self.chats.move_to_end(key)
+            await bucket.acquire()
+        await self.global_bucket.acquire()
+
+_limiters: dict = {}
+
+def _get_limiter(token: str) -> BotRateLimiter:
+    limiter = _limiters.get(token)
+    if limiter is None:
+        limiter = _limiters[token] = BotRateLimiter(TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_RATE)
+    return limiter
+
 async def send_telegram_request(method: str, token: str, payload: dict):
     """Base Telegram API request helper"""
     if not token:
@@ -44,9 +140,10 @@ async def send_telegram_request(method: str, token: str, payload: dict):
         return None
         
     url = f"https://api.telegram.org/bot{token}/{method}"
-    async with httpx.AsyncClient() as client:
+    await _get_limiter(token).acquire(payload.get("chat_id"))
+    async with _send_semaphore:
         try:
-            response = await client.post(url, json=payload, timeout=10.0)
+            response = await get_http_client().post(url, json=payload)
             if response.status_code != 200:
                 logger.error(f"Telegram API Error ({method}): {response.text}")
             return response
@@ -54,7 +151,26 @@ async def send_telegram_request(method: str, token: str, payload: dict):
             logger.error(f"Telegram connection error in {method}: {e}")
             return None
 
-async def send_telegram_message(token: str, chat_id: str | int, text: str, reply_markup: dict = None):
+class TelegramNotConfigured(Exception):
+    """Bot tokeni sozlanmagan - qayta urinish foyda bermaydi (outbox yozuvi darhol failed bo'ladi)"""
+
+def require_token(token: str, name: str) -> str:
+    if not token:
+        raise TelegramNotConfigured(f"{name} tokeni sozlanmagan")
+    return token
+
+def _courier_user_bot() -> str:
+    return require_token(COURIER_USER_BOT_TOKEN, "COURIER_USER_BOT")
+
+def is_final_response(response) -> bool:
+    """Xabarni qayta yuborish shart emasmi (yuborildi yoki qayta urinish foyda bermaydigan 4xx xato)"""
+    if response is None:
+        return False
+    if response.status_code == 200:
+        return True
+    return 400 <= response.status_code < 500 and response.status_code != 429
+
+async def send_telegram_message(token: str, chat_id: Union[str, int], text: str, reply_markup: dict = None):
     """API orqali xabar yuborish"""
     payload = {
         "chat_id": chat_id,
@@ -65,7 +181,7 @@ async def send_telegram_message(token: str, chat_id: str | int, text: str, reply
         payload["reply_markup"] = reply_markup
     return await send_telegram_request("sendMessage", token, payload)
 
-async def delete_telegram_message(token: str, chat_id: str | int, message_id: int):
+async def delete_telegram_message(token: str, chat_id: Union[str, int], message_id: int):
     """Xabarni uchirish"""
     payload = {"chat_id": chat_id, "message_id": message_id}
     return await send_telegram_request("deleteMessage", token, payload)
@@ -85,35 +201,39 @@ def get_admin_headers(telegram_id: int = None):
 async def get_couriers():
     """Kuryerlar ro'yxatini backenddan olish"""
     url = f"{BACKEND_URL}/couriers/"
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=get_admin_headers())
-            if response.status_code == 200:
-                return response.json()
-            return []
-        except Exception as e:
-            logger.error(f"Error fetching couriers: {e}")
-            return []
+    try:
+        response = await get_http_client().get(url, headers=get_admin_headers())
+        if response.status_code == 200:
+            return response.json()
+        return []
+    except Exception as e:
+        logger.error(f"Error fetching couriers: {e}")
+        return []
 
 async def assign_order_to_courier(order_id: int, courier_id: int, admin_tg_id: int = None):
     """Buyurtmani kuryerga biriktirish (PATCH)"""
     url = f"{BACKEND_URL}/orders/{order_id}/assign/"
     payload = {"courier_id": courier_id}
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.patch(url, json=payload, headers=get_admin_headers(admin_tg_id))
-            return response
-        except Exception as e:
-            logger.error(f"Error assigning courier: {e}")
-            return None
+    try:
+        response = await get_http_client().patch(url, json=payload, headers=get_admin_headers(admin_tg_id))
+        return response
+    except Exception as e:
+        logger.error(f"Error assigning courier: {e}")
+        return None
 
 # --- NOTIFICATION HELPERS (Backend uchun) ---
 
-async def notify_admins_new_order(order_data: dict):
+def _admin_targets(admin_id):
+    """Outbox har bir admin uchun alohida yozuv qo'shadi; admin_id siz eski yozuvlar - barcha adminlarga"""
+    return [admin_id] if admin_id is not None else ADMIN_IDS
+
+async def notify_admins_new_order(order_data: dict, admin_id: int = None):
     """Yangi buyurtma tushganda admin-bot orqali xabar berish"""
+    token = require_token(ADMIN_BOT_TOKEN, "ADMIN_BOT")
+    user_name = order_data.get('user_name', "Noma'lum")
     msg = (
         f"🆕 <b>Yangi Buyurtma #{order_data['id']}</b>\n\n"
-        f"👤 Mijoz: {order_data.get('user_name', 'Noma\'lum')}\n"
+        f"👤 Mijoz: {user_name}\n"
         f"📞 Tel: {order_data.get('user_phone')}\n"
         f"📍 Manzil: {order_data.get('user_address')}\n"
         f"💰 Summa: {order_data.get('total_amount', 0):,} so'm\n"
@@ -126,8 +246,10 @@ async def notify_admins_new_order(order_data: dict):
         ]]
     }
 
-    for admin_id in ADMIN_IDS:
-        await send_telegram_message(ADMIN_BOT_TOKEN, admin_id, msg, reply_markup=kb)
+    responses = await asyncio.gather(*(
+        send_telegram_message(token, chat_id, msg, reply_markup=kb) for chat_id in _admin_targets(admin_id)
+    ))
+    return all(is_final_response(r) for r in responses)
 
 async def notify_courier_assigned(courier_telegram_id: str, order_data: dict):
     """Kuryerga xabar berish (courier-user-bot orqali)"""
@@ -144,12 +266,12 @@ async def notify_courier_assigned(courier_telegram_id: str, order_data: dict):
         ]]
     }
     
-    await send_telegram_message(COURIER_USER_BOT_TOKEN, courier_telegram_id, msg, reply_markup=kb)
+    return is_final_response(await send_telegram_message(_courier_user_bot(), courier_telegram_id, msg, reply_markup=kb))
 
 async def notify_user_courier_assigned(user_telegram_id: str, order_id: int):
     """Mijozga buyurtma kuryerga berilgani haqida (courier-user-bot orqali)"""
     msg = f"ℹ️ <b>Buyurtma #{order_id}</b> admin tomonidan tasdiqlandi va kuryer biriktirildi."
-    await send_telegram_message(COURIER_USER_BOT_TOKEN, user_telegram_id, msg)
+    return is_final_response(await send_telegram_message(_courier_user_bot(), user_telegram_id, msg))
 
 async def notify_user_courier_accepted(user_telegram_id: str, order_id: int, delivery_time: str, courier_info: str = None):
     """Mijozga kuryer yo'lga chiqqani haqida (courier-user-bot orqali)"""
@@ -159,15 +281,18 @@ async def notify_user_courier_accepted(user_telegram_id: str, order_id: int, del
         f"⏳ Yetkazish vaqti: {delivery_time}{c_info}\n\n"
         f"Bizni tanlaganingiz uchun rahmat!"
     )
-    await send_telegram_message(COURIER_USER_BOT_TOKEN, user_telegram_id, msg)
+    return is_final_response(await send_telegram_message(_courier_user_bot(), user_telegram_id, msg))
 
 async def notify_user_delivered(user_telegram_id: str, order_id: int):
     """Mijozga buyurtma yetkazilgani haqida"""
     msg = f"✅ <b>Buyurtma #{order_id} yetkazib berildi!</b>\n Katta rahmat! 😋"
-    await send_telegram_message(COURIER_USER_BOT_TOKEN, user_telegram_id, msg)
+    return is_final_response(await send_telegram_message(_courier_user_bot(), user_telegram_id, msg))
 
-async def notify_admin_delivered(order_id: int, courier_name: str):
+async def notify_admin_delivered(order_id: int, courier_name: str, admin_id: int = None):
     """Adminga buyurtma bitgani haqida (admin-bot orqali)"""
+    token = require_token(ADMIN_BOT_TOKEN, "ADMIN_BOT")
     msg = f"🏁 <b>Order #{order_id} yetkazildi.</b>\n🛵 Kuryer: {courier_name}"
-    for admin_id in ADMIN_IDS:
-        await send_telegram_message(ADMIN_BOT_TOKEN, admin_id, msg)
+    responses = await asyncio.gather(*(
+        send_telegram_message(token, chat_id, msg) for chat_id in _admin_targets(admin_id)
+    ))
+    return all(is_final_response(r) for r in responses)
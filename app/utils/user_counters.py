@@ -0,0 +1,81 @@
+from typing import Dict, Optional
+
+from sqlalchemy import func, text, update
+from sqlalchemy.orm import Session
+
+from app.models import User, UserCounter
+
+# Hisoblagich kalitlari: "total" + status qiymatlari + user_type qiymatlari
+STATUS_KEYS = ("active", "blocked")
+TYPE_KEYS = ("standard", "maxsus")
+COUNTER_KEYS = ("total",) + STATUS_KEYS + TYPE_KEYS
+
+
+def count_users(db: Session) -> Dict[str, int]:
+    """Barcha sonlar bitta o'tishda: COUNT(*) FILTER (WHERE ...)"""
+    row = db.query(
+        func.count(User.id).label("total"),
+        *[func.count(User.id).filter(User.status == key).label(key) for key in STATUS_KEYS],
+        *[func.count(User.id).filter(User.user_type == key).label(key) for key in TYPE_KEYS]
+    ).one()
+    return {key: getattr(row, key) for key in COUNTER_KEYS}
+
+
+def recompute_user_counters(db: Session) -> Dict[str, int]:
+    """
+    user_counters ni users jadvalidan qayta to'ldirish.
+
+    Jadval EXCLUSIVE rejimda qulflanadi - parallel yozuvlar tugashini kutadi.
+    """
+    db.execute(text("LOCK TABLE user_counters IN EXCLUSIVE MODE;"))
+    counts = count_users(db)
+    db.query(UserCounter).delete()
+    db.add_all([UserCounter(key=key, value=value) for key, value in counts.items()])
+    db.commit()
+    return counts
+
+
+def read_user_counters(db: Session) -> Dict[str, int]:
+    """Hisoblagichlarni o'qish; jadval bo'sh yoki to'liq bo'lmasa - qayta to'ldiriladi"""
+    counters = dict(db.query(UserCounter.key, UserCounter.value).all())
+    if any(key not in counters for key in COUNTER_KEYS):
+        return recompute_user_counters(db)
+    return counters
+
+
+def adjust_user_counters(db: Session, deltas: Dict[str, int]):
+    """
+    Hisoblagichlarni o'zgarish bilan bir tranzaksiyada oshirish/kamaytirish.
+
+    Faqat mavjud kalitlar yangilanadi: jadval hali to'ldirilmagan bo'lsa,
+    birinchi o'qishda users dan to'liq hisoblanadi.
+    """
+    for key, delta in deltas.items():
+        if not delta or key not in COUNTER_KEYS:
+            continue
+        db.execute(
+            update(UserCounter)
+            .where(UserCounter.key == key)
+            .values(value=UserCounter.value + delta)
+        )
+
+
+def transition_deltas(before: Optional[str], after: Optional[str]) -> Dict[str, int]:
+    """Qiymat o'zgarganda: eski kalit -1, yangi kalit +1 (o'zgarmasa - hech narsa)"""
+    if before == after:
+        return {}
+    deltas = {}
+    if before:
+        deltas[before] = -1
+    if after:
+        deltas[after] = deltas.get(after, 0) + 1
+    return deltas
+
+
+def created_user_deltas(user: User) -> Dict[str, int]:
+    """Yangi foydalanuvchi uchun (flush dan keyin - status/user_type default qiymatlari bilan)"""
+    deltas = {"total": 1}
+    for key in (user.status, user.user_type):
+        if key:
+            deltas[key] = deltas.get(key, 0) + 1
+    return deltas
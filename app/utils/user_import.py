@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models import User
+from app.schemas.user import UserCreate, UserImportResult
+from app.utils.search import normalize_phone
+
+# Bitta INSERT dagi qatorlar soni (Postgres parametr chegarasi: 65535 / ustunlar soni)
+IMPORT_BATCH_SIZE = 1000
+
+
+def read_rows(file: BinaryIO, filename: str) -> Iterator[dict]:
+    """CSV (sarlavha qatori bilan) yoki JSON (obyektlar ro'yxati) fayldan qatorlar"""
+    if filename.lower().endswith(".json"):
+        data = json.load(file)
+        if not isinstance(data, list):
+            raise ValueError("JSON fayl obyektlar ro'yxati bo'lishi kerak")
+        yield from data
+    else:
+        yield from csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+
+
+def parse_users(file: BinaryIO, filename: str) -> Tuple[List[Dict], int, List[str]]:
+    """
+    Fayldagi qatorlarni tekshirib, INSERT uchun tayyor lug'atlarga aylantirish.
+
+    Qaytaradi: (qatorlar, fayldagi jami qatorlar soni, xatolar). Faylda takrorlangan
+    telegram_id lar birinchisi qoldirilib tashlab yuboriladi.
+    """
+    rows, errors, seen = [], [], set()
+    received = 0
+    for number, raw in enumerate(read_rows(file, filename), start=1):
+        received += 1
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError("obyekt kutilgan")
+            fields = {k: (str(v).strip() if v is not None else None) for k, v in raw.items() if k}
+            if not fields.get("user_type"):
+                fields.pop("user_type", None)
+            user = UserCreate(**fields)
+        except (ValidationError, ValueError, TypeError) as e:
+            errors.append(f"{number}-qator: {e}")
+            continue
+
+        if user.telegram_id in seen:
+            continue
+        seen.add(user.telegram_id)
+        rows.append({**user.model_dump(), "phone_digits": normalize_phone(user.phone), "status": "active"})
+    return rows, received, errors
+
+
+def import_users(db: Session, rows: List[Dict]) -> int:
+    """
+    Partiyalab `INSERT ... ON CONFLICT (telegram_id) DO NOTHING RETURNING id`.
+
+    Bitta tranzaksiyada; bazada bor telegram_id lar o'zgarmaydi.
+    Qo'shilgan qatorlar sonini qaytaradi.
+    """
+    inserted = 0
+    for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+        batch = rows[start:start + IMPORT_BATCH_SIZE]
+        stmt = (
+            pg_insert(User)
+            .values(batch)
+            .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            .returning(User.id)
+        )
+        inserted += len(db.execute(stmt).all())
+    db.commit()
+    return inserted
+
+
+def run_import(db: Session, file: BinaryIO, filename: str) -> UserImportResult:
+    rows, received, errors = parse_users(file, filename)
+    inserted = import_users(db, rows) if rows else 0
+    return UserImportResult(
+        received=received,
+        inserted=inserted,
+        skipped_existing=received - len(errors) - inserted,
+        errors=errors
+    )
@@ -0,0 +1,61 @@
+"""
+POST /orders/ (create_order): savatdagi mahsulotlar soni oshganda round trip lar soni o'zgarmasligi.
+
+    BENCH_DATABASE_URL=... python -m benchmarks.bench_create_order
+"""
+import asyncio
+import time
+
+from benchmarks.common import count_statements, print_table, reset_database, run_sql, summary
+
+from app.database import AsyncSessionLocal, async_engine
+from app.routers.orders import create_order
+from app.schemas.order import OrderCreate, OrderItemCreate
+
+ITEM_COUNTS = [1, 5, 10, 25, 50]
+ORDERS_PER_SIZE = 30
+
+
+async def run():
+    reset_database()
+    run_sql("""
+        INSERT INTO products (name, buy_price, sell_price, stock, status)
+        SELECT 'Mahsulot ' || g, 1000, 1500, 1000000, 'active' FROM generate_series(1, :n) g;
+    """, n=max(ITEM_COUNTS))
+    # Har bir buyurtma yangi mijozdan: MAX_USER_PENDING_ORDERS chekloviga urilmaslik uchun
+    run_sql("""
+        INSERT INTO users (name, phone, address, telegram_id, status, user_type)
+        SELECT 'Mijoz ' || g, '+998' || g, 'Toshkent', 'bench-' || g, 'active', 'standard'
+        FROM generate_series(1, :n) g;
+    """, n=len(ITEM_COUNTS) * ORDERS_PER_SIZE)
+
+    rows = []
+    user_no = 0
+    for size in ITEM_COUNTS:
+        items = [OrderItemCreate(product_id=pid, quantity=1) for pid in range(1, size + 1)]
+        round_trips, timings = [], []
+        for _ in range(ORDERS_PER_SIZE):
+            user_no += 1
+            order_in = OrderCreate(telegram_id=f"bench-{user_no}", items=items)
+            async with AsyncSessionLocal() as db:
+                with count_statements(async_engine.sync_engine) as statements:
+                    started = time.perf_counter()
+                    await create_order(order_in, db)
+                    timings.append((time.perf_counter() - started) * 1000)
+            round_trips.append(len(statements))
+        stats = summary(timings)
+        rows.append([size, min(round_trips), max(round_trips), f"{stats['p50']:.1f}", f"{stats['p99']:.1f}"])
+
+    await async_engine.dispose()
+    print_table(
+        "create_order: round trip lar savat hajmiga bog'liq emas",
+        ["items", "round_trips_min", "round_trips_max", "p50_ms", "p99_ms"],
+        rows
+    )
+    flat = len({row[2] for row in rows}) == 1
+    print("\nRound trip lar soni o'zgarmas" if flat else "\nDIQQAT: round trip lar soni savat hajmi bilan o'zgaradi")
+    return flat
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if asyncio.run(run()) else 1)
@@ -0,0 +1,131 @@
+"""
+/finance/stats/: eski Python tsikli, orders ustidagi GROUP BY va kunlik yig'indilar (joriy yo'l).
+
+Uchala yo'l bir xil natija berishi tekshiriladi va vaqti o'lchanadi.
+
+    BENCH_DATABASE_URL=... python -m benchmarks.bench_finance_stats [order_items soni, default 1000000]
+"""
+import sys
+import time
+from typing import Dict
+
+from benchmarks.common import print_table, reset_database, run_sql
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from app.database import SessionLocal
+from app.models import Order, OrderItem, Product
+from app.routers.finance import compute_analytics
+from app.utils.dates import date_range
+from app.utils.rollups import rebuild_rollups
+
+TOTAL_ITEMS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+ITEMS_PER_ORDER = 3
+
+
+def seed():
+    reset_database()
+    orders = TOTAL_ITEMS // ITEMS_PER_ORDER
+    run_sql("""
+        INSERT INTO products (name, buy_price, sell_price, stock, status)
+        SELECT 'Mahsulot ' || g, 1000 + g, 1500 + g, 0, 'active' FROM generate_series(1, 200) g;
+        INSERT INTO users (name, phone, address, telegram_id, status, user_type)
+        SELECT 'Mijoz ' || g, '+998' || g, 'Toshkent', 'u-' || g, 'active', 'standard'
+        FROM generate_series(1, 1000) g;
+        INSERT INTO orders (user_id, status, created_at, delivered_at, total_amount, base_total_amount,
+                            final_total_amount, is_price_locked, rolled_up)
+        SELECT 1 + g % 1000, 'yetkazildi',
+               TIMESTAMP '2023-01-01' + g * INTERVAL '90 seconds',
+               TIMESTAMP '2023-01-01' + g * INTERVAL '90 seconds' + INTERVAL '1 hour',
+               0, 0, 0, TRUE, TRUE
+        FROM generate_series(1, :orders) g;
+        INSERT INTO order_items (order_id, product_id, quantity, buy_price, sell_price, is_bonus)
+        SELECT 1 + g % :orders, 1 + g % 200, 1 + g % 4, 1000 + g % 200, 1500 + g % 200, FALSE
+        FROM generate_series(1, :items) g;
+        UPDATE orders o SET final_total_amount = s.total, total_amount = s.total, base_total_amount = s.total
+        FROM (SELECT order_id, SUM(sell_price * quantity) AS total FROM order_items GROUP BY order_id) s
+        WHERE o.id = s.order_id;
+        ANALYZE orders, order_items, products;
+    """, orders=orders, items=TOTAL_ITEMS)
+    with SessionLocal() as db:
+        rebuild_rollups(db)
+
+
+def legacy_totals(db) -> Dict:
+    """Eski get_analytics: barcha buyurtmalar ORM obyektlari sifatida, yig'indilar Python da"""
+    orders = (
+        db.query(Order).filter(Order.status == "yetkazildi")
+        .options(joinedload(Order.items).joinedload(OrderItem.product)).all()
+    )
+    revenue, cogs, qty, products = 0.0, 0.0, 0, {}
+    for order in orders:
+        revenue += order.final_total_amount
+        for item in order.items:
+            cogs += item.buy_price * item.quantity
+            qty += item.quantity
+            stats = products.setdefault(item.product_id, [0, 0.0, 0.0])
+            stats[0] += item.quantity
+            stats[1] += item.sell_price * item.quantity
+            stats[2] += item.buy_price * item.quantity
+    return {"revenue": revenue, "cogs": cogs, "qty": qty, "products": products}
+
+
+def grouped_totals(db) -> Dict:
+    """GROUP BY orders/order_items ustida (rollup lardan oldingi yo'l)"""
+    delivered = [Order.status == "yetkazildi", *date_range(Order.delivered_at)]
+    revenue = db.query(func.coalesce(func.sum(Order.final_total_amount), 0.0)).filter(*delivered).scalar()
+    rows = db.query(
+        OrderItem.product_id,
+        func.sum(OrderItem.quantity),
+        func.sum(OrderItem.sell_price * OrderItem.quantity),
+        func.sum(OrderItem.buy_price * OrderItem.quantity)
+    ).join(Order, Order.id == OrderItem.order_id).filter(*delivered).group_by(OrderItem.product_id).all()
+    products = {pid: [q, r, c] for pid, q, r, c in rows}
+    return {
+        "revenue": revenue,
+        "cogs": sum(p[2] for p in products.values()),
+        "qty": sum(p[0] for p in products.values()),
+        "products": products
+    }
+
+
+def rollup_totals(db) -> Dict:
+    stats = compute_analytics(db, None, None)
+    return {
+        "revenue": stats.total_revenue,
+        "cogs": stats.total_cogs,
+        "qty": stats.sold_items_count,
+        "products": {
+            p.product_id: [p.sold_quantity, p.total_revenue, p.total_cogs] for p in stats.products_breakdown
+        }
+    }
+
+
+def normalized(totals: Dict) -> Dict:
+    return {
+        "revenue": round(totals["revenue"], 2),
+        "cogs": round(totals["cogs"], 2),
+        "qty": totals["qty"],
+        "products": {pid: [q, round(r, 2), round(c, 2)] for pid, (q, r, c) in totals["products"].items()}
+    }
+
+
+def run():
+    seed()
+    rows, results = [], {}
+    for name, fn in (("legacy python loop", legacy_totals), ("GROUP BY orders", grouped_totals), ("daily rollups", rollup_totals)):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            results[name] = normalized(fn(db))
+            rows.append([name, f"{(time.perf_counter() - started) * 1000:.0f}"])
+
+    print_table(f"/finance/stats/ (butun tarix), {TOTAL_ITEMS:,} order_items", ["path", "ms"], rows)
+    reference = results["legacy python loop"]
+    same = all(result == reference for result in results.values())
+    print("\nNatijalar bir xil" if same else "\nDIQQAT: natijalar farq qiladi")
+    return same
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if run() else 1)
@@ -0,0 +1,95 @@
+"""
+GET /orders/{id}/ kechikishi: faqat o'qish va parallel yozuvlar (POST /orders/) paytida.
+
+Ilova bitta event loop da (ASGITransport) ishlaydi - endpointlardan biri loop ni bloklasa,
+o'qishlarning p99 i yozuvlar paytida keskin o'sadi.
+
+    BENCH_DATABASE_URL=... python -m benchmarks.bench_order_reads_under_writes
+"""
+import asyncio
+import itertools
+import time
+
+import httpx
+
+from benchmarks.common import print_table, reset_database, run_sql, summary
+
+from app.database import async_engine
+from app.main import app
+
+READERS = 20
+WRITERS = 10
+DURATION_SECONDS = 15
+SEED_ORDERS = 1000
+
+
+def seed():
+    reset_database()
+    run_sql("""
+        INSERT INTO products (name, buy_price, sell_price, stock, status)
+        SELECT 'Mahsulot ' || g, 1000, 1500, 100000000, 'active' FROM generate_series(1, 20) g;
+        INSERT INTO users (name, phone, address, telegram_id, status, user_type)
+        SELECT 'Mijoz ' || g, '+998' || g, 'Toshkent', 'bench-' || g, 'active', 'standard'
+        FROM generate_series(1, 200000) g;
+        INSERT INTO orders (user_id, status, created_at, total_amount, base_total_amount, final_total_amount)
+        SELECT 1 + g % 1000, 'yetkazildi', NOW() - g * INTERVAL '1 minute', 3000, 3000, 3000
+        FROM generate_series(1, :n) g;
+        INSERT INTO order_items (order_id, product_id, quantity, buy_price, sell_price, is_bonus)
+        SELECT 1 + g % :n, 1 + g % 20, 1, 1000, 1500, FALSE FROM generate_series(1, :n * 3) g;
+    """, n=SEED_ORDERS)
+
+
+async def read_loop(client: httpx.AsyncClient, deadline: float, timings: list):
+    order_ids = itertools.cycle(range(1, SEED_ORDERS + 1))
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get(f"/orders/{next(order_ids)}/")
+        timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+
+
+async def write_loop(client: httpx.AsyncClient, deadline: float, users: itertools.count, written: list):
+    # Har bir buyurtma yangi mijozdan (faol buyurtmalar limiti)
+    while time.perf_counter() < deadline:
+        response = await client.post("/orders/", json={
+            "telegram_id": f"bench-{1000 + next(users)}",
+            "items": [{"product_id": pid, "quantity": 1} for pid in range(1, 11)]
+        })
+        response.raise_for_status()
+        written.append(1)
+
+
+async def phase(with_writes: bool):
+    timings, written = [], []
+    deadline = time.perf_counter() + DURATION_SECONDS
+    users = itertools.count(1)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tasks = [read_loop(client, deadline, timings) for _ in range(READERS)]
+        if with_writes:
+            tasks += [write_loop(client, deadline, users, written) for _ in range(WRITERS)]
+        await asyncio.gather(*tasks)
+    return timings, len(written)
+
+
+async def run():
+    seed()
+    rows = []
+    for with_writes in (False, True):
+        timings, written = await phase(with_writes)
+        stats = summary(timings)
+        rows.append([
+            "reads + writes" if with_writes else "reads only",
+            len(timings), written, f"{stats['p50']:.1f}", f"{stats['p99']:.1f}", f"{stats['max']:.1f}"
+        ])
+    await async_engine.dispose()
+
+    print_table(
+        f"GET /orders/{{id}}/, {READERS} o'quvchi, {WRITERS} yozuvchi, {DURATION_SECONDS}s",
+        ["phase", "reads", "writes", "p50_ms", "p99_ms", "max_ms"],
+        rows
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
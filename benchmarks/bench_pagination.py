@@ -0,0 +1,76 @@
+"""
+Buyurtmalar ro'yxati: 1M qatorli jadvalda OFFSET va cursor (keyset) sahifalash kechikishi.
+
+    BENCH_DATABASE_URL=... python -m benchmarks.bench_pagination
+"""
+from benchmarks.common import measure, print_table, reset_database, run_sql, summary
+
+from sqlalchemy.orm import joinedload
+
+from app.database import SessionLocal
+from app.models import Order
+from app.utils.pagination import encode_cursor, paginate_orders
+
+TOTAL_ORDERS = 1_000_000
+LIMIT = 20
+PAGES = [1, 10, 100, 1000]
+
+
+def seed():
+    reset_database()
+    run_sql("""
+        INSERT INTO users (name, phone, address, telegram_id, status, user_type)
+        SELECT 'Mijoz ' || g, '+998' || g, 'Toshkent', 'u-' || g, 'active', 'standard'
+        FROM generate_series(1, 10000) g;
+    """)
+    run_sql("""
+        INSERT INTO orders (user_id, status, created_at, total_amount, base_total_amount, final_total_amount)
+        SELECT 1 + g % 10000, (ARRAY['kutilmoqda', 'kuryerda', 'yetkazildi'])[1 + g % 3],
+               TIMESTAMP '2023-01-01' + g * INTERVAL '30 seconds', 10000, 10000, 10000
+        FROM generate_series(1, :n) g;
+    """, n=TOTAL_ORDERS)
+    run_sql("ANALYZE users, orders;")
+
+
+def admin_page(db, cursor=None, offset=0):
+    query = db.query(Order).options(joinedload(Order.user), joinedload(Order.courier))
+    return paginate_orders(query, cursor, LIMIT, offset).all()
+
+
+def cursor_before_page(db, page: int):
+    """page-sahifa uchun cursor = oldingi sahifaning oxirgi qatori"""
+    if page == 1:
+        return None
+    last = (
+        db.query(Order.created_at, Order.id)
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .offset((page - 1) * LIMIT - 1)
+        .first()
+    )
+    return encode_cursor(last.created_at.isoformat(), last.id)
+
+
+def run():
+    seed()
+    rows = []
+    with SessionLocal() as db:
+        for page in PAGES:
+            offset_ms = summary(measure(lambda: admin_page(db, offset=(page - 1) * LIMIT)))
+            cursor = cursor_before_page(db, page)
+            cursor_ms = summary(measure(lambda: admin_page(db, cursor=cursor)))
+            rows.append([
+                page,
+                f"{offset_ms['p50']:.2f}", f"{offset_ms['p99']:.2f}",
+                f"{cursor_ms['p50']:.2f}", f"{cursor_ms['p99']:.2f}"
+            ])
+            db.expunge_all()
+
+    print_table(
+        f"Admin ro'yxati, {TOTAL_ORDERS:,} buyurtma, limit={LIMIT}",
+        ["page", "offset_p50_ms", "offset_p99_ms", "cursor_p50_ms", "cursor_p99_ms"],
+        rows
+    )
+
+
+if __name__ == "__main__":
+    run()
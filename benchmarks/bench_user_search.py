@@ -0,0 +1,66 @@
+"""
+/users/search/: 500k foydalanuvchida qidiruv kechikishi (ism, telefon prefiksi, telefon qismi).
+
+Har bir so'rov turi uchun p50 TARGET_P50_MS dan oshsa, chiqish kodi 1.
+
+    BENCH_DATABASE_URL=... python -m benchmarks.bench_user_search
+"""
+from benchmarks.common import measure, print_table, reset_database, run_sql, summary
+
+from app.database import SessionLocal
+from app.utils.search import search_users, trgm_available
+
+TOTAL_USERS = 500_000
+TARGET_P50_MS = 10.0
+
+QUERIES = [
+    ("ism (to'liq so'z)", "Dilshod"),
+    ("ism (qism)", "shod"),
+    ("telefon prefiksi", "+998 90 12"),
+    ("telefon qismi", "4567"),
+    ("telefon, 2 raqam (boshidan)", "99"),
+    ("ism, 2 harf (boshidan)", "di"),
+    ("topilmaydigan", "zzzzqqq"),
+]
+
+
+def seed():
+    reset_database()
+    run_sql("""
+        INSERT INTO users (name, phone, phone_digits, address, telegram_id, status, user_type)
+        SELECT (ARRAY['Dilshod', 'Aziz', 'Malika', 'Nodira', 'Jasur', 'Sardor', 'Gulnora', 'Bekzod'])[1 + g % 8]
+                   || ' ' || md5(g::text),
+               '+998 ' || (90 + g % 9) || ' ' || lpad((g % 10000000)::text, 7, '0'),
+               '998' || (90 + g % 9) || lpad((g % 10000000)::text, 7, '0'),
+               'Toshkent', 'u-' || g, 'active', 'standard'
+        FROM generate_series(1, :n) g;
+        ANALYZE users;
+    """, n=TOTAL_USERS)
+
+
+def run():
+    seed()
+    rows = []
+    with SessionLocal() as db:
+        print("pg_trgm: bor" if trgm_available(db) else "pg_trgm: o'rnatilmagan")
+        for label, query in QUERIES:
+            stats = summary(measure(lambda: search_users(db, query, limit=10), repeat=50))
+            found = len(search_users(db, query, limit=10))
+            rows.append([
+                label, query, found, f"{stats['p50']:.2f}", f"{stats['p99']:.2f}",
+                "ok" if stats["p50"] <= TARGET_P50_MS else "SEKIN"
+            ])
+            db.expunge_all()
+
+    print_table(
+        f"search_users, {TOTAL_USERS:,} foydalanuvchi, limit=10",
+        ["so'rov turi", "query", "topildi", "p50_ms", "p99_ms", f"p50<={TARGET_P50_MS:g}ms"],
+        rows
+    )
+    slow = [row[0] for row in rows if row[-1] != "ok"]
+    print(f"\nDIQQAT: sekin so'rovlar: {', '.join(slow)}" if slow else "\nBarcha so'rovlar maqsad ichida")
+    return not slow
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if run() else 1)
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import Response
+
+from app.models import Courier, Order, User
+from app.routers.couriers import get_couriers_leaderboard
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.rollups import rebuild_rollups
+
+DELIVERED_AT = datetime(2024, 3, 1, 12, 0)
+
+# Kuryer -> [(baho, yetkazish daqiqasi)]: o'rtacha baho 13/3 va daqiqalar bir nechta kuryerda teng
+DELIVERIES = {
+    "Ali": [(5, 10), (4, 20), (4, 30)],
+    "Vali": [(4, 30), (5, 20), (4, 10)],
+    None: [(5, 20), (4, 10), (4, 30)],   # Nomi yo'q kuryer
+    "Sobir": [(3, 7)],
+    "Hali yetkazmagan": [],
+}
+
+
+def _seed(db) -> dict:
+    user = User(name="Mijoz", phone="+998901234567", address="Toshkent", telegram_id="u-1")
+    db.add(user)
+    expected = {}
+    for i, (name, deliveries) in enumerate(DELIVERIES.items()):
+        courier = Courier(name=name, tg_username=f"k{i}", telegram_id=f"c-{i}")
+        db.add(courier)
+        db.flush()
+        for rating, minutes in deliveries:
+            db.add(Order(
+                user_id=user.id, courier_id=courier.id, status="yetkazildi", rolled_up=True,
+                assigned_at=DELIVERED_AT - timedelta(minutes=minutes), delivered_at=DELIVERED_AT,
+                rating=rating, total_amount=1000, final_total_amount=1000
+            ))
+        expected[courier.id] = (
+            len(deliveries),
+            round(sum(m for _, m in deliveries) / len(deliveries), 1) if deliveries else None
+        )
+    db.commit()
+    rebuild_rollups(db)
+    return expected
+
+
+def _page(db, sort_by, limit, cursor=None):
+    response = Response()
+    rows = get_couriers_leaderboard(
+        response, start_date=None, end_date=None, sort_by=sort_by, order=None,
+        limit=limit, cursor=cursor, db=db, admin_id="1"
+    )
+    return rows, response.headers.get(NEXT_CURSOR_HEADER)
+
+
+@pytest.mark.parametrize("sort_by", ["delivered", "revenue", "rating", "delivery_time"])
+def test_cursor_pages_match_single_page_with_ties(db, sort_by):
+    expected = _seed(db)
+    full, _ = _page(db, sort_by, 200)
+
+    walked, cursor = [], None
+    while True:
+        rows, cursor = _page(db, sort_by, 1, cursor)
+        walked.extend(rows)
+        if not cursor:
+            break
+
+    assert [row.courier_id for row in walked] == [row.courier_id for row in full]
+    assert len({row.courier_id for row in walked}) == len(DELIVERIES)
+    # Barcha saralashlarda bir xil manba: jami va yetkazish vaqti buyurtmalardan hisoblangani bilan teng
+    assert {row.courier_id: (row.delivered_orders, row.avg_delivery_minutes) for row in full} == expected
+    assert "" in {row.courier_name for row in full}
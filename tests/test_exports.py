@@ -0,0 +1,129 @@
+import tracemalloc
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, text
+
+from app.routers import exports
+
+TOTAL_ROWS = 1_000_000
+COLUMNS = ["id", "amount", "note", "created_at"]
+
+
+class FakeStatement:
+    def __init__(self):
+        self.options = {}
+
+    def execution_options(self, **options):
+        self.options.update(options)
+        return self
+
+
+class FakeResult:
+    """Server tomonidagi cursor o'rnida: qatorlarni talab qilinganda yasaydi va nechtasi olinganini sanaydi"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.fetched = 0
+
+    def __iter__(self):
+        created_at = datetime(2024, 1, 1)
+        for i in range(self.total):
+            self.fetched += 1
+            yield (i, 5000.0, f"xarajat {i}", created_at)
+
+
+class FakeSession:
+    def __init__(self, result: FakeResult):
+        self.result = result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, stmt):
+        return self.result
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_stream_holds_at_most_one_flush_batch(monkeypatch, fmt):
+    result = FakeResult(TOTAL_ROWS)
+    monkeypatch.setattr(exports, "SessionLocal", lambda: FakeSession(result))
+    stmt = FakeStatement()
+
+    emitted = 0
+    chunk_sizes = []
+    tracemalloc.start()
+    try:
+        for chunk in exports.stream_rows(stmt, COLUMNS, fmt):
+            # Birinchi CSV bo'lagida sarlavha qatori ham bor
+            rows = chunk.count("\n") - (1 if fmt == "csv" and not chunk_sizes else 0)
+            chunk_sizes.append(rows)
+            emitted += rows
+            # Har bir bo'lakdan keyin olingan qatorlar = yuborilganlar: generator bitta partiyadan ortig'ini ushlamaydi
+            assert result.fetched == emitted, (result.fetched, emitted)
+            assert rows <= exports.FLUSH_ROWS
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert stmt.options.get("yield_per") == exports.FETCH_SIZE
+    assert emitted == result.fetched == TOTAL_ROWS
+    assert len(chunk_sizes) >= TOTAL_ROWS // exports.FLUSH_ROWS
+    # 1M qator (~40 MB matn) - xotira cho'qqisi bir nechta partiya hajmida qoladi
+    assert peak < 5 * 1024 * 1024, peak
+
+
+def test_stream_is_lazy(monkeypatch):
+    result = FakeResult(TOTAL_ROWS)
+    monkeypatch.setattr(exports, "SessionLocal", lambda: FakeSession(result))
+
+    stream = exports.stream_rows(FakeStatement(), COLUMNS, "ndjson")
+    first = next(stream)
+    stream.close()
+
+    assert first.count("\n") == exports.FLUSH_ROWS
+    assert result.fetched == exports.FLUSH_ROWS
+
+
+DB_ROWS = 200_000
+
+
+def test_database_export_uses_server_side_cursor(db, database, monkeypatch):
+    """Haqiqiy baza: so'rov stream_results bilan nomli (server tomonidagi) cursor da ishlaydi va partiyalab o'qiladi"""
+    db.execute(text("""
+        INSERT INTO expenses (amount, note, created_at)
+        SELECT 5000, 'xarajat ' || g, TIMESTAMP '2024-01-01' + g * INTERVAL '1 second'
+        FROM generate_series(1, :n) g;
+    """), {"n": DB_ROWS})
+    db.commit()
+
+    executions = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM expenses" in statement:
+            executions.append((cursor, context.execution_options.get("stream_results")))
+
+    # Endpointning o'z so'rovi, StreamingResponse siz (generatorni to'g'ridan-to'g'ri o'qish uchun)
+    monkeypatch.setattr(exports, "export_response", lambda stmt, columns, fmt, name: exports.stream_rows(stmt, columns, fmt))
+    event.listen(database, "before_cursor_execute", capture)
+    try:
+        stream = exports.export_expenses(format="ndjson", admin_id="1")
+        first = next(stream)
+        cursor, stream_results = executions[0]
+        # Birinchi bo'lak yuborilganda serverdan faqat bitta FETCH_SIZE partiya olingan
+        fetched_after_first_chunk = cursor.rownumber
+
+        emitted = first.count("\n")
+        for chunk in stream:
+            emitted += chunk.count("\n")
+    finally:
+        event.remove(database, "before_cursor_execute", capture)
+
+    assert len(executions) == 1
+    assert stream_results is True
+    assert cursor.name  # psycopg2 nomli cursor = DECLARE ... CURSOR (server tomonida)
+    assert fetched_after_first_chunk <= exports.FETCH_SIZE
+    assert emitted == DB_ROWS
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import AsyncSessionLocal, async_engine
+from app.models import Order, OrderItem, Product, User
+from app.routers.finance import bucket_count, compute_analytics, get_finance_series
+from app.utils.dates import date_range
+from app.utils.rollups import apply_delivery, rebuild_rollups
+
+DAY_1 = datetime(2024, 3, 1, 12, 0)
+DAY_2 = datetime(2024, 3, 2, 12, 0)
+
+
+def _seed(db, rolled_up: bool):
+    """
+    Mahsulotlar id tartibida emas, birinchi sotuv tartibida chiqishi kerak: C, A, B, keyin O'chirilgan.
+    B birinchi buyurtmaga keyinroq (kattaroq item id bilan) bonus sifatida qo'shilgan.
+    """
+    a, b, c = (Product(name=name, buy_price=1000, sell_price=1500, stock=100) for name in ("A", "B", "C"))
+    user = User(name="Mijoz", phone="+998901234567", address="Toshkent", telegram_id="u-1")
+    db.add_all([a, b, c, user])
+    db.flush()
+
+    def add_order(delivered_at, items):
+        order = Order(
+            user_id=user.id, status="yetkazildi", delivered_at=delivered_at, rolled_up=rolled_up,
+            total_amount=0, final_total_amount=sum(price * qty for _, qty, price in items)
+        )
+        order.items = [
+            OrderItem(product_id=pid, quantity=qty, buy_price=1000, sell_price=price)
+            for pid, qty, price in items
+        ]
+        db.add(order)
+        db.flush()
+        return order
+
+    first = add_order(DAY_1, [(c.id, 2, 1500), (a.id, 1, 1500)])
+    add_order(DAY_2, [(b.id, 1, 1500), (None, 3, 2000), (a.id, 4, 1500)])
+    db.add(OrderItem(order_id=first.id, product_id=b.id, quantity=1, buy_price=1000, sell_price=0, is_bonus=True))
+    db.commit()
+
+
+def _live(db, start_date=None, end_date=None):
+    """Eski /finance/stats/: yetkazilgan buyurtmalar va mahsulotlari bo'yicha Python tsikli"""
+    query = db.query(Order).filter(
+        Order.status == "yetkazildi", *date_range(Order.delivered_at, start_date, end_date)
+    ).order_by(Order.id)
+
+    revenue, cogs, qty, products = 0.0, 0.0, 0, {}
+    for order in query.all():
+        revenue += order.final_total_amount
+        for item in sorted(order.items, key=lambda i: i.id):
+            cogs += item.buy_price * item.quantity
+            qty += item.quantity
+            stats = products.setdefault(item.product_id, {
+                "product_name": item.product.name if item.product else "O'chirilgan",
+                "sold_quantity": 0, "total_revenue": 0.0, "total_cogs": 0.0
+            })
+            stats["sold_quantity"] += item.quantity
+            stats["total_revenue"] += item.sell_price * item.quantity
+            stats["total_cogs"] += item.buy_price * item.quantity
+    breakdown = [{"product_id": pid, **stats} for pid, stats in products.items()]
+    return revenue, cogs, qty, breakdown
+
+
+def _rollup(db, start_date=None, end_date=None):
+    stats = compute_analytics(db, start_date, end_date)
+    breakdown = [
+        p.model_dump(include={"product_id", "product_name", "sold_quantity", "total_revenue", "total_cogs"})
+        for p in stats.products_breakdown
+    ]
+    return stats.total_revenue, stats.total_cogs, stats.sold_items_count, breakdown
+
+
+async def _deliver_all(order_ids):
+    try:
+        for order_id in order_ids:
+            async with AsyncSessionLocal() as session:
+                await apply_delivery(session, await session.get(Order, order_id))
+                await session.commit()
+    finally:
+        await async_engine.dispose()
+
+
+@pytest.mark.parametrize("path", ["rebuild", "apply_delivery"])
+@pytest.mark.parametrize("period", [(None, None), (date(2024, 3, 2), date(2024, 3, 2))])
+def test_rollup_stats_match_live_computation(db, path, period):
+    _seed(db, rolled_up=path == "rebuild")
+    if path == "rebuild":
+        rebuild_rollups(db)
+    else:
+        # Teskari tartibda: birinchi sotuv tartibi yetkazish tartibiga bog'liq emas
+        order_ids = [order_id for (order_id,) in db.query(Order.id).order_by(Order.id.desc())]
+        asyncio.run(_deliver_all(order_ids))
+
+    live = _live(db, *period)
+    assert _rollup(db, *period) == live
+    if period == (None, None):
+        assert [row["product_name"] for row in live[3]] == ["C", "A", "B", "O'chirilgan"]
+
+
+@pytest.mark.parametrize("bucket, start, end, count", [
+    ("day", date(2024, 1, 1), date(2024, 12, 31), 366),
+    ("week", date(2024, 3, 3), date(2024, 3, 4), 2),     # Yakshanba va dushanba - ikki hafta
+    ("month", date(2023, 11, 30), date(2024, 2, 1), 4),
+])
+def test_bucket_count_matches_series_points(bucket, start, end, count):
+    assert bucket_count(start, end, bucket) == count
+
+
+def test_series_rejects_too_many_buckets():
+    with pytest.raises(HTTPException) as error:
+        get_finance_series(date(2020, 1, 1), date(2024, 12, 31), bucket="day", db=None, admin_id="1")
+    assert error.value.status_code == 400
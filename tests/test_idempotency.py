@@ -0,0 +1,75 @@
+import asyncio
+
+from app.utils.idempotency import IdempotencyMiddleware, idempotency_store
+
+
+class SlowApp:
+    """Birinchi chaqiruv 500 qaytaradi, keyingilari 201; har biri o'z eventini kutadi"""
+
+    def __init__(self):
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.first_gate = asyncio.Event()
+        self.rest_gate = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        first = self.calls == 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await (self.first_gate if first else self.rest_gate).wait()
+        self.active -= 1
+        await send({"type": "http.response.start", "status": 500 if first else 201, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _request(middleware, statuses):
+    scope = {
+        "type": "http", "method": "POST", "path": "/orders/", "query_string": b"",
+        "headers": [(b"idempotency-key", b"k-1")]
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await middleware(scope, receive, send)
+
+
+async def _ticks(n: int = 5):
+    for _ in range(n):
+        await asyncio.sleep(0)
+
+
+def test_waiter_keeps_lock_after_failed_first_attempt():
+    idempotency_store._entries.clear()
+
+    async def scenario():
+        app = SlowApp()
+        middleware = IdempotencyMiddleware(app)
+        statuses = []
+
+        first = asyncio.create_task(_request(middleware, statuses))
+        await _ticks()
+        second = asyncio.create_task(_request(middleware, statuses))  # Navbatda kutadi
+        await _ticks()
+
+        app.first_gate.set()  # Birinchisi 500 bilan tugaydi - javob saqlanmaydi
+        await first
+        third = asyncio.create_task(_request(middleware, statuses))
+        await _ticks()
+
+        app.rest_gate.set()
+        await asyncio.gather(second, third)
+        return app, statuses
+
+    app, statuses = asyncio.run(scenario())
+
+    assert app.max_active == 1        # Ikkinchi va uchinchi parallel ishlamagan
+    assert app.calls == 2             # Uchinchisi ikkinchining javobini oldi
+    assert statuses == [500, 201, 201]
+    assert idempotency_store._locks == {}
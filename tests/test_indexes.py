@@ -0,0 +1,132 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select, text
+
+from app.models import Expense, Order, OrderItem, SalaryPayment
+from app.utils.dates import date_range
+from app.utils.search import search_users_query, trgm_available
+
+WEEK_START, WEEK_END = date(2024, 3, 4), date(2024, 3, 10)
+
+
+@pytest.fixture
+def seeded_db(db):
+    """Bir yillik tarix: planner kichik jadvalda Seq Scan ni tanlamasligi uchun yetarli hajm"""
+    db.execute(text("""
+        INSERT INTO users (name, phone, address, telegram_id, status, user_type)
+        SELECT 'Mijoz ' || g, '+998' || g, 'Toshkent', 'u-' || g, 'active', 'standard'
+        FROM generate_series(1, 500) g;
+        INSERT INTO couriers (name, tg_username, telegram_id, status)
+        SELECT 'Kuryer ' || g, 'k' || g, 'c-' || g, 'active'
+        FROM generate_series(1, 20) g;
+        INSERT INTO orders (user_id, courier_id, status, created_at, delivered_at, total_amount, final_total_amount)
+        SELECT 1 + g % 500, 1 + g % 20,
+               (ARRAY['kutilmoqda', 'kuryerda', 'yetkazildi'])[1 + g % 3],
+               TIMESTAMP '2024-01-01' + (g % 365) * INTERVAL '1 day' + (g % 1440) * INTERVAL '1 minute',
+               CASE WHEN g % 3 = 2 THEN TIMESTAMP '2024-01-01' + (g % 365) * INTERVAL '1 day' + INTERVAL '2 hours' END,
+               10000, 10000
+        FROM generate_series(1, 60000) g;
+        INSERT INTO order_items (order_id, product_id, quantity, buy_price, sell_price, is_bonus)
+        SELECT 1 + g % 60000, NULL, 1, 1000, 1500, FALSE
+        FROM generate_series(1, 120000) g;
+        INSERT INTO salary_payments (courier_id, amount, paid_at)
+        SELECT 1 + g % 20, 100000, TIMESTAMP '2024-01-01' + (g % 365) * INTERVAL '1 day'
+        FROM generate_series(1, 20000) g;
+        INSERT INTO expenses (amount, note, created_at)
+        SELECT 5000, 'xarajat', TIMESTAMP '2024-01-01' + (g % 365) * INTERVAL '1 day'
+        FROM generate_series(1, 20000) g;
+    """))
+    db.commit()
+    db.execute(text("ANALYZE users, couriers, orders, order_items, salary_payments, expenses;"))
+    db.commit()
+    return db
+
+
+def explain(db, stmt) -> str:
+    compiled = stmt.compile(bind=db.get_bind())
+    rows = db.connection().exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).all()
+    return "\n".join(row[0] for row in rows)
+
+
+def assert_uses_index(db, stmt, index_name: str):
+    plan = explain(db, stmt)
+    assert index_name in plan, plan
+
+
+def test_admin_status_and_date_filter_uses_status_created_at(seeded_db):
+    stmt = select(Order.id).where(
+        Order.status == "yetkazildi",
+        *date_range(Order.created_at, WEEK_START, WEEK_END)
+    )
+    assert_uses_index(seeded_db, stmt, "ix_orders_status_created_at")
+
+
+def test_courier_delivered_range_uses_courier_status_delivered_at(seeded_db):
+    stmt = select(func.count(Order.id), func.sum(Order.final_total_amount)).where(
+        Order.courier_id == 7,
+        Order.status == "yetkazildi",
+        *date_range(Order.delivered_at, WEEK_START, WEEK_END)
+    )
+    assert_uses_index(seeded_db, stmt, "ix_orders_courier_id_status_delivered_at")
+
+
+def test_user_pending_count_uses_user_status(seeded_db):
+    stmt = select(func.count(Order.id)).where(Order.user_id == 42, Order.status == "kutilmoqda")
+    assert_uses_index(seeded_db, stmt, "ix_orders_user_id_status")
+
+
+def test_order_items_lookup_uses_order_id(seeded_db):
+    stmt = select(OrderItem.id).where(OrderItem.order_id == 1234)
+    assert_uses_index(seeded_db, stmt, "ix_order_items_order_id")
+
+
+def test_salary_payments_range_uses_paid_at(seeded_db):
+    stmt = select(func.sum(SalaryPayment.amount)).where(*date_range(SalaryPayment.paid_at, WEEK_START, WEEK_END))
+    assert_uses_index(seeded_db, stmt, "ix_salary_payments_paid_at")
+
+
+def test_expenses_range_uses_created_at(seeded_db):
+    stmt = select(func.sum(Expense.amount)).where(*date_range(Expense.created_at, WEEK_START, WEEK_END))
+    assert_uses_index(seeded_db, stmt, "ix_expenses_created_at")
+
+
+def test_wrapped_date_filter_cannot_use_the_index(seeded_db):
+    """Eski `func.date(...)` shakli indeksni ishlatolmasligini ko'rsatadi (yarim ochiq oraliq nega kerakligi)"""
+    stmt = select(func.sum(Expense.amount)).where(
+        func.date(Expense.created_at) >= WEEK_START,
+        func.date(Expense.created_at) <= WEEK_END
+    )
+    assert "ix_expenses_created_at" not in explain(seeded_db, stmt)
+
+
+@pytest.fixture
+def seeded_users(db):
+    db.execute(text("""
+        INSERT INTO users (name, phone, phone_digits, address, telegram_id, status, user_type)
+        SELECT md5(g::text), '+998 90 ' || lpad(g::text, 7, '0'), '99890' || lpad(g::text, 7, '0'),
+               'Toshkent', 'u-' || g, 'active', 'standard'
+        FROM generate_series(1, 50000) g;
+    """))
+    db.commit()
+    db.execute(text("ANALYZE users;"))
+    db.commit()
+    return db
+
+
+@pytest.mark.parametrize("query", ["45", "zq"])
+def test_short_user_search_uses_prefix_indexes(seeded_users, query):
+    """1-2 belgili so'rov '%q%' emas, boshidan qidiradi - butun jadval o'qilmaydi"""
+    plan = explain(seeded_users, search_users_query(seeded_users, query).statement)
+    assert "ix_users_name_lower_prefix" in plan, plan
+    if query.isdigit():
+        assert "ix_users_phone_digits_prefix" in plan, plan
+    assert "Seq Scan on users" not in plan, plan
+
+
+def test_long_user_search_uses_trigram_index(seeded_users):
+    if not trgm_available(seeded_users):
+        pytest.skip("pg_trgm o'rnatilmagan")
+    plan = explain(seeded_users, search_users_query(seeded_users, "4567").statement)
+    assert "ix_users_phone_digits_trgm" in plan, plan
+    assert "Seq Scan on users" not in plan, plan
@@ -0,0 +1,25 @@
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.models import Order
+from app.utils.pagination import encode_cursor, paginate_orders
+
+
+def compiled(query) -> str:
+    return " ".join(str(query.statement.compile(dialect=postgresql.dialect())).split())
+
+
+def test_offset_mode_orders_before_offset():
+    """Cursorsiz (admin panel) chaqiruv: ORDER BY OFFSET dan oldin qo'yiladi, xato bermaydi"""
+    for offset in (0, 5):
+        sql = compiled(paginate_orders(Session().query(Order), None, 10, offset))
+        assert "ORDER BY orders.created_at DESC, orders.id DESC LIMIT" in sql
+        assert "OFFSET" in sql
+
+
+def test_cursor_mode_uses_keyset_without_offset():
+    cursor = encode_cursor("2024-01-01T00:00:00", 5)
+    sql = compiled(paginate_orders(Session().query(Order), cursor, 10, 40))
+    assert "WHERE (orders.created_at, orders.id) <" in sql
+    assert "ORDER BY orders.created_at DESC, orders.id DESC LIMIT" in sql
+    assert "OFFSET" not in sql
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from fastapi import Response
+
+from app.models import Courier, Order, OrderItem, Product, User
+from app.routers.orders import get_orders_admin
+
+
+def _seed_orders(db, count: int):
+    """Har bir buyurtmada alohida mijoz, oddiy va bonus mahsulotlar; yarmida kuryer bor"""
+    product = Product(name="Suv", buy_price=1000, sell_price=1500, stock=1000)
+    bonus = Product(name="Non", buy_price=500, sell_price=800, stock=1000)
+    courier = Courier(name="Ali", tg_username="ali", telegram_id="c-1")
+    db.add_all([product, bonus, courier])
+    db.flush()
+
+    now = datetime.utcnow()
+    for i in range(count):
+        user = User(name=f"Mijoz {i}", phone=f"+99890000{i:04d}", address="Toshkent", telegram_id=f"u-{i}")
+        order = Order(
+            user=user,
+            courier_id=courier.id if i % 2 else None,
+            created_at=now - timedelta(minutes=i),
+            total_amount=3000,
+            has_bonus=True,
+            bonus_description="Non (1)"
+        )
+        order.items = [
+            OrderItem(product_id=product.id, quantity=2, buy_price=1000, sell_price=1500),
+            OrderItem(product_id=bonus.id, quantity=1, buy_price=500, sell_price=0, is_bonus=True),
+        ]
+        db.add(order)
+    db.commit()
+
+
+def _list_admin_orders(db, limit: int):
+    db.expunge_all()  # Identity map dagi obyektlar so'rovlarni yashirmasligi uchun
+    return get_orders_admin(response=Response(), limit=limit, offset=0, db=db, admin_id="1")
+
+
+def test_admin_order_list_query_count_is_constant(db, query_counter):
+    _seed_orders(db, 40)
+
+    query_counter.clear()
+    _list_admin_orders(db, limit=5)
+    small_page = len(query_counter)
+
+    query_counter.clear()
+    rows = _list_admin_orders(db, limit=40)
+    full_page = len(query_counter)
+
+    assert len(rows) == 40
+    # Sahifa hajmidan qat'i nazar bir xil (user/courier joinedload bilan bitta SELECT); items/products yuklanmaydi
+    assert full_page == small_page, query_counter
+    assert full_page <= 2, query_counter
+    assert all(row.has_bonus and row.bonus_description == "Non (1)" for row in rows)
+    assert not any("order_items" in statement for statement in query_counter)
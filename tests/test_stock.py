@@ -0,0 +1,113 @@
+import asyncio
+import random
+import threading
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.database import ASYNC_DATABASE_URL, AsyncSessionLocal, async_engine
+from app.models import Product
+from app.utils.stock import reserve_stock
+
+PARALLEL_ORDERS = 300
+
+
+def _create_product(db, stock: int) -> int:
+    product = Product(name="Suv", buy_price=1000, sell_price=1500, stock=stock)
+    db.add(product)
+    db.commit()
+    return product.id
+
+
+def _stock(db, product_id: int) -> int:
+    db.expire_all()
+    return db.get(Product, product_id).stock
+
+
+async def _race(lines_per_order):
+    """Har bir savat alohida sessiya/tranzaksiyada, hammasi bir vaqtda"""
+    start = asyncio.Event()
+
+    async def place(lines):
+        async with AsyncSessionLocal() as session:
+            await start.wait()
+            reservation = await reserve_stock(session, lines)
+            if not reservation.ok:
+                await session.rollback()
+                return 0
+            await session.commit()
+            return sum(quantity for _, quantity in lines)
+
+    tasks = [asyncio.create_task(place(lines)) for lines in lines_per_order]
+    await asyncio.sleep(0)
+    start.set()
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        await async_engine.dispose()
+
+
+def test_parallel_orders_never_oversell(db):
+    initial = 200
+    product_id = _create_product(db, initial)
+    rng = random.Random(42)
+    baskets = [[(product_id, rng.randint(1, 3))] for _ in range(PARALLEL_ORDERS)]
+
+    accepted = asyncio.run(_race(baskets))
+
+    final = _stock(db, product_id)
+    assert final >= 0
+    assert final == initial - sum(accepted)
+    # Talab zaxiradan ancha ko'p: oxirida qolgan qoldiq eng kichik savatdan ham kam bo'lishi kerak
+    assert final < 3
+
+
+def test_basket_is_all_or_nothing_under_contention(db):
+    first = _create_product(db, 50)
+    second = _create_product(db, 1000)
+    baskets = [[(first, 1), (second, 2)] for _ in range(PARALLEL_ORDERS)]
+
+    accepted = asyncio.run(_race(baskets))
+
+    accepted_orders = sum(1 for total in accepted if total)
+    assert accepted_orders == 50
+    assert _stock(db, first) == 0
+    assert _stock(db, second) == 1000 - 2 * accepted_orders
+
+
+def test_parallel_threads_keep_stock_exact(db):
+    """Xuddi shu poyga alohida oqimlarda: har bir oqimning o'z event loop va ulanishi bor"""
+    initial = 100
+    product_id = _create_product(db, initial)
+    results = []
+    barrier = threading.Barrier(8)
+
+    async def take_one_by_one() -> int:
+        # Ulanishlar event loop ga bog'langan - umumiy pul o'rniga NullPool
+        engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        taken = 0
+        try:
+            async with async_sessionmaker(bind=engine, expire_on_commit=False)() as session:
+                for _ in range(25):
+                    reservation = await reserve_stock(session, [(product_id, 1)])
+                    if reservation.ok:
+                        await session.commit()
+                        taken += 1
+                    else:
+                        await session.rollback()
+        finally:
+            await engine.dispose()
+        return taken
+
+    def worker():
+        barrier.wait()
+        results.append(asyncio.run(take_one_by_one()))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(results) == initial
+    assert _stock(db, product_id) == 0
@@ -0,0 +1,32 @@
+from sqlalchemy import text
+
+from app.models import User
+from app.routers.users import create_user
+from app.schemas.user import UserCreate
+
+
+def _start(db, telegram_id: str = "u-1", name: str = "Ali"):
+    return create_user(UserCreate(telegram_id=telegram_id, name=name, phone="+998901234567", address="Toshkent"), db)
+
+
+def test_create_user_inserts_once(db):
+    created = _start(db)
+    again = _start(db, name="Boshqa ism")
+
+    assert again["id"] == created["id"]
+    assert again["name"] == "Ali"  # Mavjud qator o'zgarmaydi
+    assert db.query(User).count() == 1
+
+
+def test_repeat_start_is_single_statement_without_write(db, query_counter):
+    _start(db)
+    row_version = db.execute(text("SELECT xmin::text FROM users")).scalar()
+    db.rollback()
+    query_counter.clear()
+
+    _start(db)
+
+    assert len(query_counter) == 1
+    assert query_counter[0].lstrip().startswith("WITH ins AS")
+    # Qator qayta yozilmagan: xmin (yozgan tranzaksiya) o'zgarmaydi
+    assert db.execute(text("SELECT xmin::text FROM users")).scalar() == row_version